@@ -0,0 +1,25 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django() -> None:
+    """
+    Configure Django for an offline benchmark run: caches and the bar store
+    live in a throwaway directory so runs never touch each other's data.
+    """
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+    scratch = tempfile.mkdtemp(prefix='stock-bench-')
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'my_django_project.settings')
+    os.environ['STOCK_BAR_STORE_DIR'] = os.path.join(scratch, 'bars')
+    os.environ['STOCK_FRAME_CACHE_DIR'] = os.path.join(scratch, 'frames')
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    settings.ALLOWED_HOSTS = ['testserver']
@@ -0,0 +1,133 @@
+"""
+Cross-asset analytics at watchlist sizes of 50, 200 and 500 tickers.
+
+    python -m benchmarks.analytics
+    python -m benchmarks.analytics --sizes 50,200 --save benchmarks/baselines/analytics.json
+    python -m benchmarks.analytics --compare benchmarks/baselines/analytics.json
+
+Histories are deterministic fake bars (benchmarks.fake_yahoo), loaded into
+the frame cache before timing, so every case starts from cache hits as an
+interactive page would. For each size:
+  * pandas_per_frame: the previous approach, one StockData frame at a time
+    concatenated into a DataFrame, then log returns, DataFrame.cov(),
+    DataFrame.corr() and a rolling standard deviation
+  * endpoint_cold: GET /analytics/ with the memo cleared: alignment into
+    one matrix, the statistics and the JSON payload
+  * endpoint_memoized: the same request again, answered from the memo
+  * endpoint_304: the same request with the ETag of the previous response
+Payload sizes are reported as sent with gzip. --compare uses the regression
+rules of benchmarks.suite.
+"""
+import argparse
+import itertools
+import json
+import os
+import string
+import sys
+from pathlib import Path
+from typing import List
+
+SIZES = (50, 200, 500)
+
+
+def synthetic_tickers(count: int) -> List[str]:
+    """Letter-only symbols outside the bundled directory"""
+    letters = itertools.product(string.ascii_uppercase, repeat=3)
+    return ['Z' + ''.join(chars) for chars in itertools.islice(letters, count)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)), help="Comma-separated ticker counts")
+    parser.add_argument('--period', default='1y')
+    parser.add_argument('--interval', default='1d')
+    parser.add_argument('--repeat-scale', type=float, default=1.0, help="Multiply each case's run count")
+    parser.add_argument('--save', type=Path, help="Write the results as a baseline file")
+    parser.add_argument('--compare', type=Path, help="Baseline file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="Allowed growth as a fraction (default: %(default)s)")
+    args = parser.parse_args()
+
+    # The synthetic tickers are not in the symbol directory
+    os.environ['STOCK_SYMBOLS_REJECT_UNKNOWN'] = 'false'
+    from benchmarks._setup import setup_django
+    setup_django()
+
+    import logging
+    logging.getLogger('stock_app').setLevel(logging.WARNING)
+
+    import numpy as np
+    import pandas as pd
+    from django.test import Client
+
+    from benchmarks.fake_yahoo import FakeYahoo, install
+    from benchmarks.suite import Case, compare, measure
+    from src.services import fetch_scheduler
+    from src.services.analytics import default_analytics
+    from src.services.fetch_scheduler import FetchScheduler
+    from src.services.yfinance_service import StockData
+
+    install(FakeYahoo(latency=0))
+    fetch_scheduler._scheduler = FetchScheduler(rate=1e6, burst=1e6, max_concurrency=4)
+    client = Client()
+
+    results = {}
+    print(f"{'case':28} {'median ms':>10} {'p95 ms':>10} {'peak KiB':>10} {'gzip B':>10}")
+    for size in (int(value) for value in args.sizes.split(',')):
+        tickers = synthetic_tickers(size)
+        loaded = StockData.fetch_many(tickers, args.period, args.interval)
+        assert not loaded.errors, loaded.errors
+        query = {'tickers': ','.join(tickers), 'period': args.period, 'interval': args.interval}
+        etag = {}
+
+        def pandas_per_frame() -> None:
+            closes = pd.concat({
+                ticker: StockData(ticker, args.period, args.interval).get_historical_data()['Close']
+                for ticker in tickers
+            }, axis=1, sort=True)
+            returns = np.log(closes).diff()
+            returns.cov() * 252, returns.corr(), returns.rolling(20).std().iloc[-1]
+
+        def endpoint() -> int:
+            response = client.get('/analytics/', query, HTTP_ACCEPT_ENCODING='gzip')
+            assert response.status_code == 200, response.content[:200]
+            etag['value'] = response['ETag']
+            return len(response.content)
+
+        def endpoint_304() -> None:
+            response = client.get('/analytics/', query, HTTP_ACCEPT_ENCODING='gzip',
+                                  HTTP_IF_NONE_MATCH=etag['value'])
+            assert response.status_code == 304, response.status_code
+
+        repeat = 10 if size < 500 else 5
+        cases = [
+            Case(f'pandas_per_frame_{size}', pandas_per_frame, repeat=repeat),
+            Case(f'endpoint_cold_{size}', endpoint, setup=default_analytics.clear, repeat=repeat),
+            Case(f'endpoint_memoized_{size}', endpoint, repeat=repeat * 2),
+            Case(f'endpoint_304_{size}', endpoint_304, repeat=repeat * 2),
+        ]
+        for case in cases:
+            result = measure(case, args.repeat_scale)
+            results[case.name] = result
+            payload = result['payload_bytes'] if result['payload_bytes'] is not None else '-'
+            print(f"{case.name:28} {result['median_ms']:10.3f} {result['p95_ms']:10.3f} "
+                  f"{result['peak_kib']:10.1f} {payload:>10}")
+
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps({'results': results}, indent=2) + '\n')
+        print(f"Saved baseline to {args.save}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regressions against {args.compare} (threshold {args.threshold:.0%}):")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.compare} (threshold {args.threshold:.0%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Load test of the chart data path under WSGI and ASGI with a fake, delayed upstream.
+
+    python -m benchmarks.async_load --requests 400 --tickers 200 --delay 0.5
+
+The WSGI run sends the requests from a fixed pool of request threads, as a
+threaded WSGI server would. The ASGI run sends them all from one event loop.
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks._setup import setup_django
+
+setup_django()
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.test import AsyncClient, Client  # noqa: E402
+
+from src.services.frame_cache import get_frame_cache  # noqa: E402
+from src.services.symbols import get_symbol_index  # noqa: E402
+from src.services.yfinance_service import StockData  # noqa: E402
+
+
+def install_fake_upstream(delay: float) -> None:
+    """Replace the yfinance download with one that sleeps for `delay` seconds"""
+    def download(self, priority=None, **kwargs) -> pd.DataFrame:
+        time.sleep(delay)
+        index = pd.date_range(end=pd.Timestamp.now(tz='America/New_York').floor('h'), periods=7, freq='h')
+        close = np.linspace(100, 101, len(index))
+        return pd.DataFrame({'Open': close, 'High': close, 'Low': close, 'Close': close, 'Volume': 1000}, index=index)
+
+    StockData._download = download
+
+
+def reset_caches() -> None:
+    get_frame_cache().clear()
+    cache.clear()
+
+
+def request_params(count: int, tickers: int):
+    # Listed symbols, since chart_data rejects tickers missing from the symbol directory
+    symbols = get_symbol_index().symbols[:tickers]
+    return [{'ticker': symbols[i % len(symbols)], 'period': '1d', 'interval': '60m'} for i in range(count)]
+
+
+def run_wsgi(params, threads: int) -> float:
+    client = Client()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        statuses = list(pool.map(lambda p: client.get('/chart_data/', p).status_code, params))
+    elapsed = time.perf_counter() - start
+    assert all(status == 200 for status in statuses), statuses
+    return elapsed
+
+
+async def run_asgi(params) -> float:
+    client = AsyncClient()
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(client.get('/chart_data/', p) for p in params))
+    elapsed = time.perf_counter() - start
+    assert all(response.status_code == 200 for response in responses)
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--tickers', type=int, default=200, help='Distinct tickers among the requests')
+    parser.add_argument('--delay', type=float, default=0.5, help='Fake upstream latency in seconds')
+    parser.add_argument('--wsgi-threads', type=int, default=16, help='Request threads of the WSGI server')
+    args = parser.parse_args()
+
+    install_fake_upstream(args.delay)
+    params = request_params(args.requests, args.tickers)
+
+    reset_caches()
+    wsgi = run_wsgi(params, args.wsgi_threads)
+    reset_caches()
+    asgi = asyncio.run(run_asgi(params))
+
+    print(f"{args.requests} requests, {args.tickers} tickers, {args.delay:.2f}s upstream delay")
+    print(f"WSGI ({args.wsgi_threads} threads): {wsgi:7.2f}s  {args.requests / wsgi:8.1f} req/s")
+    print(f"ASGI (1 event loop):  {asgi:7.2f}s  {args.requests / asgi:8.1f} req/s")
+    print(f"Speedup: {wsgi / asgi:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Parameter sweep of the SMA crossover over 10 years of daily bars.
+
+    python -m benchmarks.backtest
+    python -m benchmarks.backtest --combinations 1000 --workers 1,2,4
+
+Prices are a seeded geometric random walk of 2,520 bars. Cases:
+  * per_bar_loop: the strategy simulated bar by bar in Python, timed on a
+    sample of combinations and scaled to the full sweep
+  * vectorized_w<N>: src.services.backtest.run_backtest with N processes;
+    1 runs in-process, more use the spawned pool with the closes in shared
+    memory (timed after a warm-up sweep has started the workers)
+The Sharpe ratios of the sampled combinations are checked to agree.
+Worker counts above the machine's CPU count cannot speed anything up and
+are reported for reference only.
+"""
+import argparse
+import math
+import os
+import time
+
+
+def per_bar_loop(close, fast: int, slow: int, cost: float) -> float:
+    """Reference simulation: one Python iteration per bar, returning the Sharpe ratio"""
+    fast_sum = slow_sum = 0.0
+    held = 0.0
+    returns = []
+    for t in range(1, len(close)):
+        fast_sum += close[t - 1] - (close[t - 1 - fast] if t - 1 >= fast else 0.0)
+        slow_sum += close[t - 1] - (close[t - 1 - slow] if t - 1 >= slow else 0.0)
+        target = 1.0 if t >= slow and fast_sum / fast > slow_sum / slow else 0.0
+        returns.append(target * (close[t] / close[t - 1] - 1.0) - abs(target - held) * cost)
+        held = target
+    mean = sum(returns) / len(returns)
+    std = math.sqrt(sum((r - mean) ** 2 for r in returns) / (len(returns) - 1))
+    return mean / std * math.sqrt(252) if std else float('nan')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bars', type=int, default=2520, help="Daily bars (default: %(default)s, 10 years)")
+    parser.add_argument('--combinations', type=int, default=1000, help="Combinations swept (default: %(default)s)")
+    parser.add_argument('--workers', default=f"1,2,{os.cpu_count() or 1}", help="Comma-separated worker counts")
+    parser.add_argument('--loop-sample', type=int, default=20, help="Combinations timed with the per-bar loop")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    import numpy as np
+
+    from src.services.backtest import expand_grid, run_backtest
+
+    close = 100 * np.exp(np.cumsum(np.random.default_rng(7).normal(0.0003, 0.015, args.bars)))
+    timestamps = np.arange(args.bars, dtype=np.int64) * 86_400_000
+    # Fast windows 5-200 x slow windows 20-1010 with fast < slow, in grid order
+    grid = expand_grid('sma_crossover', {'fast': range(5, 205, 5), 'slow': range(20, 1020, 10)})
+    combos = grid[:args.combinations]
+    cost = 5 / 10_000
+    print(f"{args.bars} bars, {len(combos)} combinations, {os.cpu_count()} CPUs")
+    print(f"{'case':20} {'median s':>10} {'combos/s':>12}")
+
+    sample = combos[:args.loop_sample]
+    started = time.perf_counter()
+    reference = [per_bar_loop(close.tolist(), combo['fast'], combo['slow'], cost) for combo in sample]
+    loop = (time.perf_counter() - started) / len(sample) * len(combos)
+    checked = run_backtest(close, timestamps, 'sma_crossover', sample, '1d', cost, top=len(sample))
+    by_params = {tuple(result.params.values()): result.stats['sharpe'] for result in checked.results}
+    assert np.allclose(reference, [by_params[tuple(combo.values())] for combo in sample]), "Results differ"
+    print(f"{'per_bar_loop':20} {loop:10.3f} {len(combos) / loop:12.0f}  (scaled from {len(sample)})")
+
+    for workers in sorted({int(value) for value in args.workers.split(',')}):
+        if workers > 1:
+            run_backtest(close, timestamps, 'sma_crossover', combos, '1d', cost, workers=workers)
+        times = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            report = run_backtest(close, timestamps, 'sma_crossover', combos, '1d', cost, workers=workers)
+            times.append(time.perf_counter() - started)
+        median = sorted(times)[len(times) // 2]
+        print(f"{'vectorized_w' + str(workers):20} {median:10.3f} {len(combos) / median:12.0f}  "
+              f"best {report.results[0].params}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Admission control, retries and timeouts of the async Mistral client, against a local fake model server.
+
+    python -m benchmarks.chat_limits --burst 40 --max-concurrency 4 --max-waiting 8
+
+Scenarios:
+  * burst: many concurrent questions; at most --max-concurrency reach the
+    server, --max-waiting queue, and the rest are rejected immediately.
+    Also times a trivial asyncio.to_thread() call during the burst, compared
+    with the old path that ran the synchronous client on the default executor.
+  * rate limit: the server answers 429 to the first requests, which are retried.
+  * timeout: the server is slower than the per-call timeout.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.fake_mistral import FakeMistralServer
+
+
+async def probe_executor(duration: float) -> float:
+    """Return the worst latency of a no-op asyncio.to_thread() call over `duration` seconds"""
+    worst = 0.0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await asyncio.to_thread(lambda: None)
+        worst = max(worst, time.perf_counter() - start)
+        await asyncio.sleep(0.02)
+    return worst
+
+
+async def timed(coro):
+    """Await a coroutine, returning (elapsed seconds, result or exception)"""
+    start = time.perf_counter()
+    try:
+        result = await coro
+    except Exception as e:
+        result = e
+    return time.perf_counter() - start, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--burst', type=int, default=40)
+    parser.add_argument('--latency', type=float, default=0.5, help='Seconds the fake model takes to answer')
+    parser.add_argument('--max-concurrency', type=int, default=4)
+    parser.add_argument('--max-waiting', type=int, default=8)
+    args = parser.parse_args()
+
+    server = FakeMistralServer(first_token_delay=args.latency, token_delay=0).start()
+    os.environ['MISTRAL_SERVER_URL'] = server.url
+    os.environ['MISTRAL_MAX_CONCURRENCY'] = str(args.max_concurrency)
+    os.environ['MISTRAL_MAX_WAITING'] = str(args.max_waiting)
+    os.environ.setdefault('MISTRAL_API_KEY', 'offline')
+
+    from benchmarks._setup import setup_django
+    setup_django()
+    from src.services.limiter import LimiterFullError
+    from stock_app.mistral_ai import MistralAIClient
+
+    client = MistralAIClient()
+    client.limits = dict(client.limits, RETRY_BACKOFF=0.05, QUEUE_TIMEOUT=args.latency * 10)
+    selection = ('AAPL', '1mo', '1d')
+
+    # Every call asks a different question so the response cache does not answer it
+    async def burst(old_path: bool):
+        prefix = 'threaded' if old_path else 'async'
+        if old_path:
+            calls = [asyncio.to_thread(client.get_response, f"{prefix} question {i}", *selection)
+                     for i in range(args.burst)]
+        else:
+            calls = [client.aget_response(f"{prefix} question {i}", *selection) for i in range(args.burst)]
+        probe = asyncio.ensure_future(probe_executor(args.latency * 2))
+        results = await asyncio.gather(*(timed(call) for call in calls))
+        return results, await probe
+
+    async def run():
+        await client.aget_response('Warm up', *selection)
+
+        for old_path in (True, False):
+            server.max_in_flight = 0
+            results, probe = await burst(old_path)
+            served = [elapsed for elapsed, result in results if isinstance(result, str)]
+            rejected = [elapsed for elapsed, result in results if isinstance(result, LimiterFullError)]
+            label = 'to_thread(get_response)' if old_path else 'aget_response'
+            print(f"{label}: {len(served)} served, {len(rejected)} rejected "
+                  f"(slowest rejection {max(rejected, default=0) * 1000:.0f} ms), "
+                  f"server saw at most {server.max_in_flight} at once; "
+                  f"worst to_thread() latency during burst {probe * 1000:.0f} ms")
+        print(f"Limiter counters: {client.concurrency_stats()}")
+
+        server.status, server.retry_after = 429, 0.1
+        server.error_count = server.requests + 2
+        elapsed, result = await timed(client.aget_response('Rate limited question', *selection))
+        outcome = 'answered' if isinstance(result, str) else repr(result)
+        print(f"Rate limited twice: {outcome} after {elapsed * 1000:.0f} ms")
+
+        server.status, server.first_token_delay = 200, 2.0
+        client.limits = dict(client.limits, TIMEOUT=0.3)
+        elapsed, result = await timed(client.aget_response('Slow question', *selection))
+        print(f"Slow upstream: {type(result).__name__} after {elapsed * 1000:.0f} ms")
+
+    asyncio.run(run())
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
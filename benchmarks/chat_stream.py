@@ -0,0 +1,72 @@
+"""
+Time to first token of chat_with_ai, buffered vs streamed, against a local fake model server.
+
+    python -m benchmarks.chat_stream --first-token-delay 0.8 --token-delay 0.05
+
+Also checks that a client disconnecting mid-stream closes the upstream stream.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.fake_mistral import FakeMistralServer
+
+
+async def first_chunk_time(client, fields) -> float:
+    start = time.perf_counter()
+    first = None
+    response = await client.post('/chat/', fields)
+    if response.streaming:
+        async for _ in response.streaming_content:
+            first = first or time.perf_counter()
+    return (first or time.perf_counter()) - start
+
+
+async def abandon_stream(client, fields, tokens: int) -> None:
+    """Read a few tokens, then drop the stream as a disconnecting browser would"""
+    response = await client.post('/chat/', fields)
+    stream = response.streaming_content
+    for _ in range(tokens):
+        await stream.__anext__()
+    await stream.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--first-token-delay', type=float, default=0.8)
+    parser.add_argument('--token-delay', type=float, default=0.05)
+    args = parser.parse_args()
+
+    server = FakeMistralServer(args.first_token_delay, args.token_delay).start()
+    os.environ['MISTRAL_SERVER_URL'] = server.url
+    os.environ.setdefault('MISTRAL_API_KEY', 'offline')
+
+    from benchmarks._setup import setup_django
+    setup_django()
+    from django.test import AsyncClient
+
+    client = AsyncClient(enforce_csrf_checks=False)
+    fields = {'message': 'Should I buy?', 'ticker': 'AAPL', 'period': '1mo', 'interval': '1d'}
+
+    # Each phase asks a different question so the response cache does not answer it
+    async def run():
+        await first_chunk_time(client, dict(fields, message='Warm up'))  # Warm up the SDK's HTTP clients
+        buffered = await first_chunk_time(client, fields)
+        streamed = await first_chunk_time(client, dict(fields, message='Should I sell?', stream='1'))
+        cached = await first_chunk_time(client, dict(fields, message='should i SELL', stream='1'))
+        await abandon_stream(client, dict(fields, message='Should I hold?', stream='1'), tokens=3)
+        return buffered, streamed, cached
+
+    buffered, streamed, cached = asyncio.run(run())
+    time.sleep(args.token_delay * 3)  # Let the fake server notice the closed connection
+
+    print(f"Buffered response, first byte: {buffered * 1000:7.0f} ms")
+    print(f"Streamed response, first token: {streamed * 1000:7.0f} ms")
+    print(f"Cached response, first token:   {cached * 1000:7.0f} ms")
+    print(f"Abandoned upstream streams detected by the server: {server.abandoned_streams}")
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
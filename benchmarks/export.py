@@ -0,0 +1,87 @@
+"""
+Peak memory and throughput of bulk export, streamed vs built in one go.
+
+    python -m benchmarks.export
+    python -m benchmarks.export --sizes 10,50,100 --format parquet
+
+Histories are deterministic fake bars (benchmarks.fake_yahoo) for max/1d,
+loaded into the frame cache first, so both cases read cached frames as a
+download would. For each ticker count:
+  * naive: every frame concatenated into one DataFrame, serialized whole
+  * streamed: src.services.export, as served by /export/, drained piece by piece
+Peak is the memory allocated during the case (tracemalloc), beyond the
+cached frames both read.
+"""
+import argparse
+import io
+import os
+import time
+import tracemalloc
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10,50,100', help="Comma-separated ticker counts")
+    parser.add_argument('--format', choices=('csv', 'parquet'), default='csv')
+    parser.add_argument('--period', default='max')
+    parser.add_argument('--interval', default='1d')
+    args = parser.parse_args()
+
+    # The synthetic tickers are not in the symbol directory
+    os.environ['STOCK_SYMBOLS_REJECT_UNKNOWN'] = 'false'
+    from benchmarks._setup import setup_django
+    setup_django()
+
+    import logging
+    logging.getLogger('stock_app').setLevel(logging.WARNING)
+
+    import pandas as pd
+
+    from benchmarks.analytics import synthetic_tickers
+    from benchmarks.fake_yahoo import FakeYahoo, install
+    from src.services import fetch_scheduler
+    from src.services.export import plan_export
+    from src.services.fetch_scheduler import FetchScheduler
+    from src.services.yfinance_service import StockData
+
+    install(FakeYahoo(latency=0))
+    fetch_scheduler._scheduler = FetchScheduler(rate=1e6, burst=1e6, max_concurrency=4)
+
+    def measure(fn):
+        # Timed and traced in separate runs; tracing slows allocation-heavy code several times over
+        started = time.perf_counter()
+        size = fn()
+        elapsed = time.perf_counter() - started
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return size, elapsed, peak / 2 ** 20
+
+    print(f"{'tickers':>8} {'rows':>9} {'case':>9} {'MiB out':>9} {'peak MiB':>9} {'seconds':>8} {'MB/s':>7}")
+    for count in (int(value) for value in args.sizes.split(',')):
+        tickers = synthetic_tickers(count)
+        plan = plan_export(tickers, args.period, args.interval, args.format)
+        rows = sum(len(StockData(ticker, args.period, args.interval).get_historical_data()) for ticker in tickers)
+
+        def naive() -> int:
+            frames = {ticker: StockData(ticker, args.period, args.interval).get_historical_data()
+                      for ticker in tickers}
+            df = pd.concat(frames, names=['ticker', 'timestamp']).reset_index()
+            if args.format == 'parquet':
+                buffer = io.BytesIO()
+                df.to_parquet(buffer, compression='zstd')
+                return len(buffer.getvalue())
+            return len(df.to_csv(index=False).encode())
+
+        def streamed() -> int:
+            return sum(len(piece) for piece in plan.chunks())
+
+        for name, fn in (('naive', naive), ('streamed', streamed)):
+            size, elapsed, peak = measure(fn)
+            print(f"{count:8d} {rows:9d} {name:>9} {size / 2 ** 20:9.1f} {peak:9.1f} {elapsed:8.2f} "
+                  f"{size / elapsed / 1e6:7.1f}")
+
+
+if __name__ == '__main__':
+    main()
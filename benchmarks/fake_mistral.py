@@ -0,0 +1,142 @@
+"""
+Local stand-in for the Mistral chat completions API, for offline benchmarks.
+
+Streams a canned answer as server-sent events with a configurable delay
+before the first token and between tokens, and counts how many streams
+were abandoned by the client before completion. It can also fail the
+first requests with an error status, or answer 429 while more than
+`rate_limit` requests are in flight.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+ANSWER = (
+    "Given the recent trend, a long-term position looks reasonable, but consider "
+    "scaling in gradually and keeping a stop loss below the last support level."
+)
+
+
+class FakeMistralServer:
+    """Threaded HTTP server answering /v1/chat/completions like Mistral AI"""
+
+    def __init__(self, first_token_delay: float = 0.8, token_delay: float = 0.05,
+                 answer: str = ANSWER, status: int = 200, retry_after: Optional[float] = None,
+                 error_count: Optional[int] = None, rate_limit: Optional[int] = None):
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.tokens = [word + ' ' for word in answer.split()]
+        self.status = status
+        self.retry_after = retry_after
+        # Requests answered with `status` before answering normally; None fails every request
+        self.error_count = error_count
+        self.rate_limit = rate_limit
+        self.rate_limited = 0
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.abandoned_streams = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeMistralServer':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                with server._lock:
+                    server.requests += 1
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                    failing = server.status != 200 and (
+                        server.error_count is None or server.requests <= server.error_count)
+                    limited = server.rate_limit is not None and server.in_flight > server.rate_limit
+                    if limited:
+                        server.rate_limited += 1
+                try:
+                    if limited:
+                        self._reply_error(429)
+                    elif failing:
+                        self._reply_error(server.status)
+                    elif body.get('stream'):
+                        self._reply_stream(body)
+                    else:
+                        self._reply_complete(body)
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+            def _reply_error(self, status: int):
+                payload = json.dumps({'object': 'error', 'message': 'Simulated error'}).encode()
+                self.send_response(status)
+                if server.retry_after is not None:
+                    self.send_header('Retry-After', str(server.retry_after))
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _reply_complete(self, body):
+                time.sleep(server.first_token_delay + server.token_delay * len(server.tokens))
+                payload = json.dumps({
+                    'id': 'fake', 'object': 'chat.completion', 'created': int(time.time()),
+                    'model': body.get('model', 'fake'),
+                    'usage': {'prompt_tokens': 10, 'completion_tokens': len(server.tokens),
+                              'total_tokens': 10 + len(server.tokens)},
+                    'choices': [{'index': 0, 'finish_reason': 'stop',
+                                 'message': {'role': 'assistant', 'content': ''.join(server.tokens)}}],
+                }).encode()
+                try:
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client timed out
+
+            def _reply_stream(self, body):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.end_headers()
+                time.sleep(server.first_token_delay)
+                try:
+                    for i, token in enumerate(server.tokens):
+                        if i:
+                            time.sleep(server.token_delay)
+                        chunk = {
+                            'id': 'fake', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                            'model': body.get('model', 'fake'),
+                            'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': token},
+                                         'finish_reason': None}],
+                        }
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                        self.wfile.flush()
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    with server._lock:
+                        server.abandoned_streams += 1
+
+        return Handler
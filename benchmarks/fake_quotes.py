@@ -0,0 +1,73 @@
+"""
+Offline quote source for the live updates hub.
+
+    STOCK_LIVE_SOURCE=benchmarks.fake_quotes.FakeQuotes python -m uvicorn my_django_project.asgi:application
+
+Each fetch of a (ticker, interval) pair revises the close of its last bar,
+and every `bars_per_new` fetches a new bar starts, like a market in session
+polled faster than its bar length. Prices are a seeded random walk.
+"""
+import asyncio
+import time
+import zlib
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.services.live import QuoteSource
+from src.services.resample import INTRADAY_STEPS
+
+HISTORY_BARS = 390
+
+
+class FakeQuotes(QuoteSource):
+    """QuoteSource returning a random walk that moves on every fetch"""
+
+    def __init__(self, latency: float = 0.0, bars_per_new: int = 4):
+        """
+        Args:
+            latency (float): Seconds each fetch takes
+            bars_per_new (int): Fetches per new bar; the ones in between revise the last bar
+        """
+        self.latency = latency
+        self.bars_per_new = bars_per_new
+        self.fetches: Dict[Tuple[str, str], int] = {}
+        self.last_fetch = 0.0  # time.monotonic() when the latest fetch returned
+        self._frames: Dict[Tuple[str, str], pd.DataFrame] = {}
+        self._rngs: Dict[Tuple[str, str], np.random.Generator] = {}
+
+    def _history(self, ticker: str, interval: str) -> pd.DataFrame:
+        step = INTRADAY_STEPS.get(interval, pd.Timedelta(days=1))
+        end = pd.Timestamp.now(tz='UTC').floor(step)
+        index = pd.date_range(end=end, periods=HISTORY_BARS, freq=step, name='Date')
+        rng = self._rngs[(ticker, interval)] = np.random.default_rng(zlib.crc32(f"{ticker}:{interval}".encode()))
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, HISTORY_BARS)))
+        return pd.DataFrame({'Open': close, 'High': close, 'Low': close, 'Close': close,
+                             'Volume': np.full(HISTORY_BARS, 1000.0)}, index=index)
+
+    async def fetch(self, ticker: str, interval: str) -> pd.DataFrame:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        key = (ticker, interval)
+        count = self.fetches[key] = self.fetches.get(key, 0) + 1
+        frame = self._frames.get(key)
+        if frame is None:
+            frame = self._history(ticker, interval)
+        else:
+            price = frame['Close'].iloc[-1] * np.exp(self._rngs[key].normal(0, 0.001))
+            if count % self.bars_per_new == 0:
+                step = frame.index[-1] - frame.index[-2]
+                bar = pd.DataFrame({'Open': price, 'High': price, 'Low': price, 'Close': price, 'Volume': 0.0},
+                                   index=pd.DatetimeIndex([frame.index[-1] + step], name='Date'))
+                frame = pd.concat([frame.iloc[1:], bar])
+            else:
+                frame = frame.copy()
+                last = frame.index[-1]
+                frame.loc[last, 'Close'] = price
+                frame.loc[last, 'High'] = max(frame.loc[last, 'High'], price)
+                frame.loc[last, 'Low'] = min(frame.loc[last, 'Low'], price)
+                frame.loc[last, 'Volume'] += 100.0
+        self._frames[key] = frame
+        self.last_fetch = time.monotonic()
+        return frame
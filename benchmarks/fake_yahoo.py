@@ -0,0 +1,107 @@
+"""
+Offline stand-in for the parts of the yfinance module StockData uses.
+
+Install it with `install(FakeYahoo(...))`; StockData then downloads
+deterministic random-walk bars after a configurable latency, and calls
+beyond `rate_limit` per second fail with YFRateLimitError like a
+throttled Yahoo Finance.
+"""
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from yfinance.exceptions import YFRateLimitError
+
+from src.services.resample import INTRADAY_STEPS
+from src.services.yfinance_service import PERIOD_OFFSETS
+
+DAILY_FREQ = {"1d": "B", "5d": "5B", "1wk": "W-MON", "1mo": "MS"}
+
+
+def fake_bars(ticker: str, interval: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+    """Deterministic OHLCV bars for a ticker; the same timestamp always gets the same prices"""
+    freq = INTRADAY_STEPS.get(interval) or DAILY_FREQ[interval]
+    if interval in INTRADAY_STEPS:
+        start = start.floor(freq)
+    index = pd.date_range(start, end, freq=freq, name='Date')
+    if interval in INTRADAY_STEPS:
+        local = index.tz_convert('America/New_York')
+        minutes = local.hour * 60 + local.minute
+        index = index[(local.dayofweek < 5) & (minutes >= 570) & (minutes < 960)]
+    seed = zlib.crc32(f"{ticker}:{interval}".encode())
+    steps = np.random.default_rng(seed).normal(0, 0.01, 4096)
+    # Index prices by position in time so overlapping windows agree
+    slot = (index.values.astype('datetime64[ns]').view('int64') // 60_000_000_000) % len(steps)
+    close = 100 * np.exp(np.cumsum(steps)[slot] / 4)
+    return pd.DataFrame({
+        'Open': close * 0.999, 'High': close * 1.004, 'Low': close * 0.996, 'Close': close,
+        'Volume': np.full(len(index), 1000.0), 'Dividends': 0.0, 'Stock Splits': 0.0,
+    }, index=index)
+
+
+class FakeYahoo:
+    """Replacement for the yfinance module: Ticker(...).history()"""
+
+    def __init__(self, latency: float = 0.05, rate_limit: Optional[float] = None):
+        """
+        Args:
+            latency (float): Seconds each call takes
+            rate_limit (Optional[float]): Calls accepted per second before throttling
+        """
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.calls = 0
+        self.throttled = 0
+        self.sessions = set()
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def _hit(self, session) -> None:
+        with self._lock:
+            self.calls += 1
+            self.sessions.add(id(session))
+            now = time.monotonic()
+            while self._recent and self._recent[0] <= now - 1:
+                self._recent.popleft()
+            if self.rate_limit is not None and len(self._recent) >= self.rate_limit:
+                self.throttled += 1
+                raise YFRateLimitError()
+            self._recent.append(now)
+        time.sleep(self.latency)
+
+    def _window(self, interval: str, period: Optional[str] = None, start=None):
+        end = pd.Timestamp.now(tz='UTC')
+        if start is not None:
+            begin = pd.Timestamp(start, tz='UTC')
+        elif period in PERIOD_OFFSETS:
+            begin = end - PERIOD_OFFSETS[period]
+        else:
+            begin = end - pd.DateOffset(years=20)
+        if interval not in INTRADAY_STEPS:
+            begin, end = begin.normalize(), end.normalize()
+        return begin, end
+
+    def Ticker(self, ticker: str, session=None) -> '_FakeTicker':
+        return _FakeTicker(self, ticker, session)
+
+
+class _FakeTicker:
+    def __init__(self, yahoo: FakeYahoo, ticker: str, session):
+        self.yahoo = yahoo
+        self.ticker = ticker
+        self.session = session
+
+    def history(self, interval: str = "1d", period: str = None, start=None, **kwargs) -> pd.DataFrame:
+        self.yahoo._hit(self.session)
+        begin, end = self.yahoo._window(interval, period, start)
+        return fake_bars(self.ticker, interval, begin, end)
+
+
+def install(yahoo: FakeYahoo) -> None:
+    """Route StockData's upstream calls to a fake"""
+    from src.services import yfinance_service
+    yfinance_service.yf = yahoo
@@ -0,0 +1,201 @@
+"""
+Recorded upstream responses for offline benchmarks.
+
+    python -m benchmarks.fixtures record            # Yahoo Finance and, with MISTRAL_API_KEY, Mistral AI
+    python -m benchmarks.fixtures record --no-mistral
+
+Recording needs network access. Each Yahoo Finance response is stored as
+benchmarks/fixtures/yahoo_<TICKER>_<period>_<interval>.csv.gz and the Mistral
+answer as mistral.json; manifest.json keeps how long each call took, so
+replays can reproduce the upstream latency. Anything not recorded is
+replaced by deterministic synthetic bars ending on SYNTHETIC_END, so the
+suite also runs on a fresh checkout.
+"""
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+from benchmarks.fake_mistral import ANSWER
+from benchmarks.fake_yahoo import FakeYahoo, fake_bars
+from src.services.resample import INTRADAY_STEPS
+from src.services.yfinance_service import PERIOD_OFFSETS
+
+FIXTURE_DIR = Path(__file__).resolve().parent / 'fixtures'
+MANIFEST = FIXTURE_DIR / 'manifest.json'
+
+# (ticker, period, interval) responses recorded by `record`
+YAHOO_SPECS = [
+    ("AAPL", "1d", "1m"),
+    ("AAPL", "5d", "5m"),
+    ("AAPL", "1mo", "30m"),
+    ("AAPL", "1y", "1d"),
+    ("AAPL", "5y", "1d"),
+    ("AAPL", "max", "1d"),
+]
+
+MISTRAL_QUESTION = "Given the recent trend, should I buy, hold or sell?"
+
+# Synthetic stand-ins for missing fixtures are anchored here so runs are comparable
+SYNTHETIC_END = pd.Timestamp('2024-12-31 21:00', tz='UTC')
+SYNTHETIC_LATENCY = 0.3  # seconds
+SYNTHETIC_MISTRAL = {'first_token_delay': 0.8, 'token_delay': 0.05, 'answer': ANSWER}
+
+
+def _manifest() -> Dict:
+    if MANIFEST.exists():
+        return json.loads(MANIFEST.read_text())
+    return {'yahoo': {}, 'mistral': None}
+
+
+def _fixture_name(ticker: str, period: str, interval: str) -> str:
+    return f"{ticker}_{period}_{interval}"
+
+
+def load_yahoo(ticker: str, period: str, interval: str) -> Tuple[pd.DataFrame, float, bool]:
+    """
+    Return the bars for a request, how long the upstream took, and whether they were recorded.
+    """
+    entry = _manifest()['yahoo'].get(_fixture_name(ticker, period, interval))
+    if entry is not None:
+        df = pd.read_csv(FIXTURE_DIR / entry['file'], index_col=0)
+        df.index = pd.to_datetime(df.index, utc=True).tz_convert(entry['tz'])
+        df.index.name = 'Date'
+        return df, entry['latency'], True
+
+    if period == 'max':
+        start = SYNTHETIC_END - pd.DateOffset(years=40)
+    elif period == 'ytd':
+        start = pd.Timestamp(year=SYNTHETIC_END.year, month=1, day=1, tz='UTC')
+    else:
+        start = SYNTHETIC_END - PERIOD_OFFSETS[period]
+    if interval not in INTRADAY_STEPS:
+        start = start.normalize()
+    df = fake_bars(ticker, interval, start, SYNTHETIC_END)
+    return df.tz_convert('America/New_York'), SYNTHETIC_LATENCY, False
+
+
+def load_mistral() -> Tuple[Dict, bool]:
+    """Return the Mistral answer and its timing, and whether it was recorded"""
+    entry = _manifest()['mistral']
+    if entry is not None:
+        return entry, True
+    return SYNTHETIC_MISTRAL, False
+
+
+def fixture_summary() -> str:
+    manifest = _manifest()
+    return f"{len(manifest['yahoo'])} recorded Yahoo responses, Mistral {'recorded' if manifest['mistral'] else 'synthetic'}"
+
+
+class ReplayYahoo(FakeYahoo):
+    """
+    FakeYahoo serving recorded responses, with their recorded latency times
+    `latency_scale`. Bars are moved forward by whole weeks to end within the
+    last week, since the application selects windows relative to now.
+    """
+
+    def __init__(self, latency_scale: float = 0.0):
+        super().__init__(latency=0.0)
+        self.latency_scale = latency_scale
+        self._loaded: Dict[Tuple[str, str, str], Tuple[pd.DataFrame, float]] = {}
+
+    def _load(self, ticker: str, period: str, interval: str) -> Tuple[pd.DataFrame, float]:
+        key = (ticker, period, interval)
+        if key not in self._loaded:
+            df, latency, _ = load_yahoo(ticker, period, interval)
+            weeks = (pd.Timestamp.now(tz='UTC') - df.index[-1]) // pd.Timedelta(weeks=1)
+            df.index = df.index + pd.Timedelta(weeks=max(0, weeks))
+            self._loaded[key] = (df, latency)
+        return self._loaded[key]
+
+    def _replay(self, ticker: str, period: Optional[str], interval: str, start=None) -> pd.DataFrame:
+        df, latency = self._load(ticker, period or 'max', interval)
+        self._hit(None)
+        time.sleep(latency * self.latency_scale)
+        if start is not None:
+            df = df[df.index >= pd.Timestamp(start, tz=df.index.tz)]
+        return df.copy()
+
+    def Ticker(self, ticker: str, session=None) -> '_ReplayTicker':
+        return _ReplayTicker(self, ticker)
+
+
+class _ReplayTicker:
+    def __init__(self, yahoo: ReplayYahoo, ticker: str):
+        self.yahoo = yahoo
+        self.ticker = ticker
+
+    def history(self, interval: str = "1d", period: str = None, start=None, **kwargs) -> pd.DataFrame:
+        return self.yahoo._replay(self.ticker, period, interval, start)
+
+
+def record(mistral: bool = True) -> None:
+    """Record live responses into FIXTURE_DIR"""
+    import yfinance as yf
+
+    FIXTURE_DIR.mkdir(exist_ok=True)
+    manifest = _manifest()
+    for ticker, period, interval in YAHOO_SPECS:
+        started = time.perf_counter()
+        df = yf.Ticker(ticker).history(period=period, interval=interval)
+        latency = time.perf_counter() - started
+        if df.empty:
+            print(f"No data for {ticker} {period}/{interval}; skipped")
+            continue
+        name = _fixture_name(ticker, period, interval)
+        df.to_csv(FIXTURE_DIR / f"yahoo_{name}.csv.gz")
+        manifest['yahoo'][name] = {
+            'file': f"yahoo_{name}.csv.gz", 'tz': str(df.index.tz), 'rows': len(df),
+            'latency': round(latency, 3), 'recorded_at': pd.Timestamp.now(tz='UTC').isoformat(),
+        }
+        print(f"Recorded {ticker} {period}/{interval}: {len(df)} rows in {latency:.2f}s")
+
+    if mistral:
+        manifest['mistral'] = _record_mistral()
+        print(f"Recorded Mistral answer: first token after {manifest['mistral']['first_token_delay']:.2f}s")
+
+    MANIFEST.write_text(json.dumps(manifest, indent=2) + '\n')
+
+
+def _record_mistral() -> Dict:
+    from mistralai import Mistral
+
+    client = Mistral(api_key=os.environ['MISTRAL_API_KEY'])
+    started = time.perf_counter()
+    first = None
+    parts = []
+    for event in client.chat.stream(
+        model=os.getenv('MISTRAL_MODEL_NAME', 'mistral-large-latest'),
+        messages=[{'role': 'user', 'content': MISTRAL_QUESTION}],
+    ):
+        delta = event.data.choices[0].delta.content if event.data.choices else None
+        if isinstance(delta, str) and delta:
+            first = first or time.perf_counter()
+            parts.append(delta)
+    finished = time.perf_counter()
+    return {
+        'first_token_delay': round(first - started, 3),
+        'token_delay': round((finished - first) / max(1, len(parts) - 1), 4),
+        'answer': ''.join(parts),
+        'recorded_at': pd.Timestamp.now(tz='UTC').isoformat(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('action', choices=['record', 'show'])
+    parser.add_argument('--no-mistral', action='store_true', help="Only record Yahoo Finance responses")
+    args = parser.parse_args()
+    if args.action == 'record':
+        record(mistral=not args.no_mistral)
+    else:
+        print(fixture_summary())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Fan-out of live bar updates to many viewers of one symbol.
+
+    python -m benchmarks.live_fanout --viewers 1000 --polls 20
+
+Viewers subscribe to AAPL/1m on one hub fed by benchmarks.fake_quotes; a
+few of them go through the /live/ view, the rest subscribe to the hub
+directly. Reported:
+  * upstream fetches for all viewers, against one per viewer per poll
+  * delay from a poll returning to each viewer receiving its update
+  * slow viewers (never reading) being asked to resync, while the others
+    keep receiving every update
+  * the poller stopping once the last viewer disconnects
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+
+async def main_async(args) -> None:
+    from django.conf import settings
+    from django.test import AsyncClient
+
+    from src.services.live import get_live_hub
+
+    hub = get_live_hub()
+    source = hub.source
+    delays = []
+    received = []
+
+    async def viewer(stream) -> None:
+        counts = [0]
+        done = asyncio.Event()
+
+        async def read() -> None:
+            async for chunk in stream:
+                chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+                if 'event: bars' in chunk:
+                    delays.append(time.monotonic() - source.last_fetch)
+                    counts[0] += 1
+                if counts[0] > args.polls:
+                    done.set()
+
+        reader = asyncio.create_task(read())
+        await done.wait()
+        # Disconnect the way the ASGI handler does when the browser goes away
+        reader.cancel()
+        received.append(counts[0])
+
+    async def slow_viewer(stream) -> str:
+        await stream.__anext__()  # Connect, then stop reading for longer than the queue lasts
+        await asyncio.sleep((settings.STOCK_LIVE['QUEUE_SIZE'] + args.polls) * settings.STOCK_LIVE['POLL_SECONDS'])
+        chunks = [chunk async for chunk in stream]
+        return chunks[-1]
+
+    client = AsyncClient()
+    streams = []
+    for _ in range(args.http_viewers):
+        response = await client.get('/live/', {'ticker': 'AAPL', 'interval': '1m'})
+        assert response.status_code == 200, response.status_code
+        streams.append(response.streaming_content)
+    streams += [hub.stream('AAPL', '1m') for _ in range(args.viewers - args.http_viewers)]
+
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(viewer(stream)) for stream in streams]
+    slow = [asyncio.create_task(slow_viewer(hub.stream('AAPL', '1m'))) for _ in range(args.slow)]
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    last_events = await asyncio.gather(*slow)
+    stats = hub.stats()
+
+    fetches = sum(source.fetches.values())
+    print(f"{args.viewers} viewers, {len(received)} finished, {elapsed:.2f}s")
+    print(f"upstream fetches: {fetches} (one poller), vs {args.viewers * fetches} polling per viewer")
+    print(f"updates per viewer: min {min(received)}, max {max(received)}")
+    delays.sort()
+    print(f"delivery delay ms: p50 {statistics.median(delays) * 1000:.2f}, "
+          f"p95 {delays[int(len(delays) * 0.95)] * 1000:.2f}, max {delays[-1] * 1000:.2f}")
+    print(f"slow viewers asked to resync: {stats['resyncs']} of {args.slow}; "
+          f"last events: {sorted({event.split(chr(10))[0] for event in last_events})}")
+
+    await asyncio.sleep(settings.STOCK_LIVE['LINGER_SECONDS'] + settings.STOCK_LIVE['POLL_SECONDS'] * 2)
+    print(f"after disconnects: {hub.stats()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--viewers', type=int, default=1000)
+    parser.add_argument('--http-viewers', type=int, default=10, help="Viewers connected through the view")
+    parser.add_argument('--slow', type=int, default=5, help="Viewers that stop reading")
+    parser.add_argument('--polls', type=int, default=20, help="Updates each viewer waits for")
+    parser.add_argument('--poll-seconds', type=float, default=0.1)
+    args = parser.parse_args()
+
+    os.environ['STOCK_LIVE_SOURCE'] = 'benchmarks.fake_quotes.FakeQuotes'
+    os.environ['STOCK_LIVE_POLL_SECONDS'] = str(args.poll_seconds)
+    os.environ['STOCK_LIVE_LINGER_SECONDS'] = str(args.poll_seconds * 2)
+    from benchmarks._setup import setup_django
+    setup_django()
+
+    import logging
+    logging.getLogger('stock_app').setLevel(logging.WARNING)
+
+    asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    main()
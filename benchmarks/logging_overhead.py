@@ -0,0 +1,168 @@
+"""
+Request-path cost of the stock_app log, before and after the queued pipeline.
+
+    python -m benchmarks.logging_overhead --requests 300 --stall-ms 20 --stall-every 50
+
+"before" is the previous setup: a synchronous FileHandler writing every
+record at DEBUG on the request thread. "after" is settings.LOGGING:
+records are queued for a background thread, formatted there, and cache
+hits are sampled.
+
+Each setup serves warm stock_view POSTs and get_intervals GETs (upstream
+calls are replayed from benchmarks.fixtures), first on a normal disk and
+then with a simulated slow disk whose flush stalls for --stall-ms every
+--stall-every writes, as during writeback or on a busy volume. A single
+log call is also timed on its own, with its previous f-string message for
+"before".
+"""
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+
+class SlowStream:
+    """File stream whose flush stalls periodically"""
+
+    def __init__(self, stream, stall: float, every: int):
+        self.stream = stream
+        self.stall = stall
+        self.every = every
+        self.flushes = 0
+
+    def __getattr__(self, name: str):
+        return getattr(self.stream, name)
+
+    def write(self, text: str) -> int:
+        return self.stream.write(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+        self.flushes += 1
+        if self.stall and self.flushes % self.every == 0:
+            time.sleep(self.stall)
+
+    def close(self) -> None:
+        self.stream.close()
+
+
+def before_handler(path: str, formatter: logging.Formatter, stall: float, every: int) -> logging.Handler:
+    handler = logging.FileHandler(path, encoding='utf-8')
+    handler.setFormatter(formatter)
+    handler.stream = SlowStream(handler.stream, stall, every)
+    return handler
+
+
+def after_handler(path: str, formatter: logging.Formatter, stall: float, every: int) -> logging.Handler:
+    from django.conf import settings
+    from src.services.log_pipeline import QueuedRotatingFileHandler, SamplingFilter
+
+    handler = QueuedRotatingFileHandler(path, max_bytes=1024 ** 3)
+    handler.setFormatter(formatter)
+    handler.target.stream = SlowStream(handler.target._open(), stall, every)
+    handler.addFilter(SamplingFilter(settings.LOGGING['filters']['sampling']['every']))
+    return handler
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        'p50': statistics.median(ordered) * 1000,
+        'p99': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+        'max': ordered[-1] * 1000,
+    }
+
+
+def run_requests(requests: int) -> Dict[str, Dict[str, float]]:
+    from django.test import Client
+
+    client = Client()
+    form = {'ticker': 'AAPL', 'period': '1y', 'interval': '1d'}
+    client.post('/stock/', form)  # Fill the caches
+    calls: Dict[str, Callable[[], object]] = {
+        'stock_view': lambda: client.post('/stock/', form),
+        'get_intervals': lambda: client.get('/get_intervals/', {'period': '1mo'}),
+    }
+    results = {}
+    for name, call in calls.items():
+        samples = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            call()
+            samples.append(time.perf_counter() - started)
+        results[name] = percentiles(samples)
+    return results
+
+
+def time_log_call(logger: logging.Logger, lazy: bool, calls: int = 2000) -> float:
+    """Microseconds the request thread spends in the get_intervals debug call"""
+    from src.services.log_pipeline import sampled
+    from src.services.yfinance_service import PERIOD_INTERVAL_MAP
+
+    period, intervals = '1mo', PERIOD_INTERVAL_MAP['1mo']
+    started = time.perf_counter()
+    for _ in range(calls):
+        if lazy:
+            logger.debug("Fetched intervals for period '%s': %s", period, intervals, extra=sampled('intervals'))
+        else:
+            logger.debug(f"Fetched intervals for period '{period}': {intervals}")
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=300, help="Requests per view and setup")
+    parser.add_argument('--stall-ms', type=float, default=20.0, help="Duration of a simulated disk stall")
+    parser.add_argument('--stall-every', type=int, default=50, help="Writes between simulated stalls")
+    args = parser.parse_args()
+
+    from benchmarks._setup import setup_django
+    setup_django()
+
+    from benchmarks.fake_yahoo import install
+    from benchmarks.fixtures import ReplayYahoo
+    from src.services import fetch_scheduler
+    from src.services.fetch_scheduler import FetchScheduler
+    install(ReplayYahoo())
+    fetch_scheduler._scheduler = FetchScheduler(rate=1e6, burst=1e6, max_concurrency=4)
+
+    logger = logging.getLogger('stock_app')
+    logger.setLevel(logging.DEBUG)
+    configured = list(logger.handlers)
+    formatter = configured[0].formatter
+    for handler in configured:
+        logger.removeHandler(handler)
+    scratch = tempfile.mkdtemp(prefix='stock-log-bench-')
+
+    print(f"{'setup':8} {'disk':6} {'view':14} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'lines':>7}")
+    for disk, stall in (('normal', 0.0), ('slow', args.stall_ms / 1000)):
+        for setup, factory in (('before', before_handler), ('after', after_handler)):
+            path = os.path.join(scratch, f"{setup}-{disk}.log")
+            handler = factory(path, formatter, stall, args.stall_every)
+            logger.addHandler(handler)
+            try:
+                results = run_requests(args.requests)
+            finally:
+                logger.removeHandler(handler)
+                handler.close()
+            with open(path, encoding='utf-8') as f:
+                lines = sum(1 for _ in f)
+            for view, stats in results.items():
+                print(f"{setup:8} {disk:6} {view:14} {stats['p50']:8.2f} {stats['p99']:8.2f} {stats['max']:8.2f} {lines:7d}")
+
+    print("\nOne get_intervals debug call on the request thread (normal disk):")
+    for setup, factory, lazy in (('before', before_handler, False), ('after', after_handler, True)):
+        handler = factory(os.path.join(scratch, f"{setup}-call.log"), formatter, 0.0, args.stall_every)
+        logger.addHandler(handler)
+        try:
+            print(f"  {setup:8} {time_log_call(logger, lazy):7.2f} us")
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+
+
+if __name__ == '__main__':
+    main()
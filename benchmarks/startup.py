@@ -0,0 +1,141 @@
+"""
+Worker cold start: boot time, memory and what gets imported.
+
+    python -m benchmarks.startup                      # median of 5 fresh processes per scenario
+    python -m benchmarks.startup --save benchmarks/baselines/startup.json
+    python -m benchmarks.startup --compare benchmarks/baselines/startup.json
+
+Each run is a new interpreter, like a freshly started worker:
+  * boot: django.setup() and the WSGI application, as the server does
+  * first_get_intervals: boot, then the first get_intervals request
+  * first_stock_view: boot, then the first chart request; upstream calls
+    are replayed from benchmarks.fixtures, so this is the full import cost
+
+Times are measured inside the child from before `import django`, so
+interpreter startup is excluded; memory is the child's peak RSS. One extra
+run per scenario under `python -X importtime` lists the slowest top-level
+imports. --compare uses the regression rules of benchmarks.suite.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+SCENARIOS = ('boot', 'first_get_intervals', 'first_stock_view')
+HEAVY_MODULES = ('pandas', 'numpy', 'plotly', 'yfinance', 'mistralai', 'httpx', 'curl_cffi', 'pyarrow')
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def child(scenario: str) -> None:
+    """Run one scenario in this fresh process and print its measurements as JSON"""
+    import resource
+    import time
+
+    started = time.perf_counter()
+    from benchmarks._setup import setup_django
+    setup_django()
+    from my_django_project.wsgi import application  # noqa: F401
+    booted = time.perf_counter()
+
+    if scenario != 'boot':
+        from django.test import Client
+        client = Client()
+        if scenario == 'first_get_intervals':
+            response = client.get('/get_intervals/', {'period': '1mo'})
+        else:
+            import src.services.yfinance_service  # noqa: F401 (as the view would, before the fake's own imports)
+            from benchmarks.fake_yahoo import install
+            from benchmarks.fixtures import ReplayYahoo
+            install(ReplayYahoo())
+            response = client.post('/stock/', {'ticker': 'AAPL', 'period': '1y', 'interval': '1d'})
+        assert response.status_code == 200, response.status_code
+    finished = time.perf_counter()
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_kib = peak / 1024 if sys.platform == 'darwin' else peak  # bytes on macOS, KiB elsewhere
+    print(json.dumps({
+        'boot_ms': (booted - started) * 1000,
+        'total_ms': (finished - started) * 1000,
+        'peak_rss_mib': peak_kib / 1024,
+        'modules': len(sys.modules),
+        'heavy': [name for name in HEAVY_MODULES if name in sys.modules],
+    }))
+
+
+def run_child(scenario: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + \
+        ['-m', 'benchmarks.startup', '--child', scenario]
+    return subprocess.run(command, cwd=BASE_DIR, capture_output=True, text=True, check=True)
+
+
+def slowest_imports(stderr: str, count: int) -> List[tuple]:
+    """Top-level packages with the largest cumulative import time, from -X importtime output"""
+    totals: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented; the outermost ones include everything they import
+        if len(name) - len(name.lstrip()) == 1:
+            package = name.strip().split('.')[0]
+            totals[package] = totals.get(package, 0) + int(cumulative)
+    return sorted(totals.items(), key=lambda item: -item[1])[:count]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--child', choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument('--runs', type=int, default=5, help="Fresh processes per scenario")
+    parser.add_argument('--top', type=int, default=8, help="Slowest imports listed per scenario")
+    parser.add_argument('--save', type=Path, help="Write the results as a baseline file")
+    parser.add_argument('--compare', type=Path, help="Baseline file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="Allowed growth as a fraction (default: %(default)s)")
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    results = {}
+    print(f"{'scenario':22} {'boot ms':>9} {'total ms':>9} {'peak MiB':>9} {'modules':>8}  heavy modules loaded")
+    for scenario in SCENARIOS:
+        runs = [json.loads(run_child(scenario).stdout.strip().splitlines()[-1]) for _ in range(args.runs)]
+        result = {
+            'median_ms': round(statistics.median(run['total_ms'] for run in runs), 1),
+            'boot_ms': round(statistics.median(run['boot_ms'] for run in runs), 1),
+            'peak_kib': round(statistics.median(run['peak_rss_mib'] for run in runs) * 1024),
+            'modules': runs[0]['modules'],
+            'heavy': runs[0]['heavy'],
+        }
+        results[scenario] = result
+        print(f"{scenario:22} {result['boot_ms']:9.1f} {result['median_ms']:9.1f} {result['peak_kib'] / 1024:9.1f} "
+              f"{result['modules']:8d}  {', '.join(result['heavy']) or '-'}")
+
+    print("\nSlowest top-level imports (cumulative ms, one -X importtime run):")
+    for scenario in SCENARIOS:
+        top = slowest_imports(run_child(scenario, importtime=True).stderr, args.top)
+        print(f"  {scenario}: " + ", ".join(f"{name} {micros / 1000:.0f}" for name, micros in top))
+
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps({'results': results}, indent=2) + '\n')
+        print(f"Saved baseline to {args.save}")
+
+    if args.compare:
+        from benchmarks.suite import compare
+        baseline = json.loads(args.compare.read_text())['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regressions against {args.compare} (threshold {args.threshold:.0%}):")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.compare} (threshold {args.threshold:.0%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+"""
+Offline benchmark suite for the request hot paths.
+
+    python -m benchmarks.suite                                   # run and print
+    python -m benchmarks.suite --save benchmarks/baselines/local.json
+    python -m benchmarks.suite --compare benchmarks/baselines/local.json --threshold 0.25
+
+Upstream calls are replayed from benchmarks/fixtures (see benchmarks.fixtures)
+with their latency scaled by --latency-scale, 0 by default, so timings
+measure this application rather than the network. Each case reports the
+median, p95 and minimum wall time, the peak memory allocated by one run
+(tracemalloc), and the size of what it produces.
+
+With --compare, a case regresses when its median time, peak allocation or
+payload size exceeds the baseline by more than --threshold (a fraction);
+the exit status is 1 if any case regressed.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.fake_mistral import FakeMistralServer
+
+BASELINE_DIR = Path(__file__).resolve().parent / 'baselines'
+CHART_SIZES = (1_000, 10_000, 50_000)
+
+
+@dataclass
+class Case:
+    """A benchmarked operation; `run` returns the payload size in bytes, if any"""
+    name: str
+    run: Callable[[], Optional[int]]
+    setup: Callable[[], None] = lambda: None  # Untimed, before every run
+    repeat: int = 20
+
+
+def measure(case: Case, repeat_scale: float) -> Dict[str, float]:
+    """Time a case, then measure the peak allocation of one more run"""
+    case.setup()
+    payload = case.run()  # Warm-up
+
+    timings = []
+    for _ in range(max(3, int(case.repeat * repeat_scale))):
+        case.setup()
+        started = time.perf_counter()
+        case.run()
+        timings.append(time.perf_counter() - started)
+
+    case.setup()
+    gc.collect()  # Garbage from the timed runs would otherwise count towards the peak
+    tracemalloc.start()
+    case.run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'median_ms': round(statistics.median(timings) * 1000, 3),
+        'p95_ms': round(timings[int(len(timings) * 0.95) - 1 if len(timings) > 1 else 0] * 1000, 3),
+        'min_ms': round(timings[0] * 1000, 3),
+        'runs': len(timings),
+        'peak_kib': round(peak / 1024, 1),
+        'payload_bytes': payload,
+    }
+
+
+def build_cases(mistral_server: FakeMistralServer) -> List[Case]:
+    import numpy as np
+    import pandas as pd
+    from django.core.cache import cache
+    from django.test import Client
+
+    from benchmarks.fixtures import load_yahoo
+    from src.services.bar_store import get_bar_store
+    from src.services.frame_cache import get_frame_cache
+    from src.services.yfinance_service import StockData
+    from stock_app import charts
+    from stock_app.charts import build_chart_html
+
+    client = Client()
+    stock = StockData('AAPL', '1y', '1d')
+
+    def clear_all() -> None:
+        get_frame_cache().clear()
+        cache.clear()
+        charts._chart_cache.clear()
+        shutil.rmtree(get_bar_store().root, ignore_errors=True)
+
+    def prime() -> None:
+        stock.get_historical_data()
+
+    def historical_data() -> Optional[int]:
+        stock.get_historical_data()
+        return None
+
+    cases = [
+        Case('stockdata_cache_hit', historical_data, setup=prime, repeat=200),
+        Case('stockdata_cache_miss', historical_data, setup=clear_all, repeat=20),
+    ]
+
+    long_series, _, _ = load_yahoo('AAPL', 'max', '1d')
+    for size in CHART_SIZES:
+        # Tile the longest fixture to reach the size, on a regular daily index
+        frame = long_series.iloc[np.arange(size) % len(long_series)].copy()
+        frame.index = pd.date_range(end=long_series.index[-1], periods=size, freq='D', name='Date')
+        cases.append(Case(
+            f'chart_build_{size}',
+            lambda frame=frame: len(build_chart_html(frame, 'AAPL').encode()),
+            repeat=10 if size < 50_000 else 3,
+        ))
+
+    form = {'ticker': 'AAPL', 'period': '1y', 'interval': '1d'}
+
+    def post_stock_view() -> int:
+        response = client.post('/stock/', form)
+        assert response.status_code == 200
+        return len(response.content)
+
+    def get_intervals() -> int:
+        response = client.get('/get_intervals/', {'period': '1mo'})
+        return len(response.content)
+
+    def symbol_search() -> int:
+        response = client.get('/symbols/', {'q': 'micro'})
+        return len(response.content)
+
+    questions = iter(range(10 ** 9))
+
+    def chat() -> int:
+        # A new question each time, so the response cache does not answer it
+        response = client.post('/chat/', dict(form, message=f"Should I buy? ({next(questions)})"))
+        assert response.status_code == 200, response.content
+        return len(response.content)
+
+    cases += [
+        Case('stock_view_post_cold', post_stock_view, setup=clear_all, repeat=10),
+        Case('stock_view_post_warm', post_stock_view, setup=prime, repeat=50),
+        Case('get_intervals', get_intervals, repeat=200),
+        Case('symbol_search', symbol_search, repeat=200),
+        Case('chat_with_ai', chat, setup=prime, repeat=20),
+    ]
+    return cases
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """Return one message per regression against a baseline"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in ('median_ms', 'peak_kib', 'payload_bytes'):
+            if previous.get(metric) and current.get(metric) and current[metric] > previous[metric] * (1 + threshold):
+                regressions.append(
+                    f"{name}: {metric} {previous[metric]:g} -> {current[metric]:g} "
+                    f"(+{(current[metric] / previous[metric] - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filter', help="Only run cases whose name contains this text")
+    parser.add_argument('--latency-scale', type=float, default=0.0,
+                        help="Multiply recorded upstream latencies by this factor (default: %(default)s)")
+    parser.add_argument('--repeat-scale', type=float, default=1.0, help="Multiply each case's run count")
+    parser.add_argument('--save', type=Path, help="Write the results as a baseline file")
+    parser.add_argument('--compare', type=Path, help="Baseline file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="Allowed slowdown or allocation growth as a fraction (default: %(default)s)")
+    args = parser.parse_args()
+
+    from benchmarks.fixtures import fixture_summary, load_mistral
+    mistral, _ = load_mistral()
+    mistral_server = FakeMistralServer(
+        first_token_delay=mistral['first_token_delay'] * args.latency_scale,
+        token_delay=mistral['token_delay'] * args.latency_scale,
+        answer=mistral['answer'],
+    ).start()
+    os.environ['MISTRAL_SERVER_URL'] = mistral_server.url
+    os.environ.setdefault('MISTRAL_API_KEY', 'offline')
+
+    from benchmarks._setup import setup_django
+    setup_django()
+
+    import logging
+    logging.getLogger('stock_app').setLevel(logging.WARNING)
+
+    from benchmarks.fixtures import ReplayYahoo
+    from benchmarks.fake_yahoo import install
+    from src.services import fetch_scheduler
+    from src.services.fetch_scheduler import FetchScheduler
+    install(ReplayYahoo(latency_scale=args.latency_scale))
+    # Rate limiting is for the real upstream; replays go straight through
+    fetch_scheduler._scheduler = FetchScheduler(rate=1e6, burst=1e6, max_concurrency=4)
+
+    results = {}
+    print(f"Fixtures: {fixture_summary()}; upstream latency x{args.latency_scale:g}")
+    print(f"{'case':28} {'median ms':>10} {'p95 ms':>10} {'min ms':>10} {'peak KiB':>10} {'payload B':>10}")
+    for case in build_cases(mistral_server):
+        if args.filter and args.filter not in case.name:
+            continue
+        result = measure(case, args.repeat_scale)
+        results[case.name] = result
+        payload = result['payload_bytes'] if result['payload_bytes'] is not None else '-'
+        print(f"{case.name:28} {result['median_ms']:10.3f} {result['p95_ms']:10.3f} {result['min_ms']:10.3f} "
+              f"{result['peak_kib']:10.1f} {payload:>10}")
+    mistral_server.stop()
+
+    if args.save:
+        import django
+        import pandas
+        import plotly
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps({
+            'meta': {
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'django': django.get_version(),
+                'pandas': pandas.__version__,
+                'plotly': plotly.__version__,
+                'fixtures': fixture_summary(),
+                'latency_scale': args.latency_scale,
+            },
+            'results': results,
+        }, indent=2) + '\n')
+        print(f"Saved baseline to {args.save}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regressions against {args.compare} (threshold {args.threshold:.0%}):")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.compare} (threshold {args.threshold:.0%})")
+
+
+if __name__ == '__main__':
+    main()
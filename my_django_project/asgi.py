@@ -0,0 +1,10 @@
+# asgi.py
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'my_django_project.settings')
+application = get_asgi_application()
+
+# Keep the watchlist warm when STOCK_WARMUP enables it; one server process on the host runs the passes
+from src.services.warmup import start_background_warmup  # noqa: E402
+start_background_warmup()
\ No newline at end of file
@@ -26,6 +26,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'stock_app.middleware.RequestTimingMiddleware',  # First, so its timings cover the other middleware
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -53,14 +54,28 @@ TEMPLATES = [
 ]
 
 
+# The stock_app log is written by a background thread (see src/services/log_pipeline.py),
+# so requests never wait on disk I/O; high-volume events are sampled
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'sampling': {
+            '()': 'src.services.log_pipeline.SamplingFilter',
+            'every': {  # keep one record in this many
+                'cache_hit': int(os.getenv('STOCK_LOG_SAMPLE_CACHE_HITS', '20')),
+                'intervals': int(os.getenv('STOCK_LOG_SAMPLE_INTERVALS', '20')),
+            },
+        },
+    },
     'handlers': {
         'file': {
             'level': 'DEBUG',  # Changed to DEBUG for more detailed logs
-            'class': 'logging.FileHandler',
+            'class': 'src.services.log_pipeline.QueuedRotatingFileHandler',
             'filename': os.path.join(BASE_DIR, 'debug.log'),
+            'max_bytes': 10 * 1024 * 1024,
+            'backup_count': 5,
+            'filters': ['sampling'],
             'formatter': 'verbose',
         },
     },
@@ -73,13 +88,15 @@ LOGGING = {
     'loggers': {
         'stock_app': {
             'handlers': ['file'],
-            'level': 'DEBUG',  # Changed to DEBUG
+            'level': os.getenv('STOCK_LOG_LEVEL', 'DEBUG'),  # Changed to DEBUG
             'propagate': True,
         },
     },
 }
 
 # Caching Configuration
+# StockData coordinates fetches between worker processes through this cache,
+# which requires a backend shared by all workers (e.g. Redis or Memcached).
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
@@ -88,7 +105,75 @@ CACHES = {
     }
 }
 
+# Tiered cache for StockData frames (see src/services/frame_cache.py): a per-process
+# LRU bounded by bytes in front of a compressed on-disk tier shared by all workers
+STOCK_FRAME_CACHE = {
+    'L1_MAX_BYTES': 128 * 1024 * 1024,
+    'L2_DIR': os.getenv('STOCK_FRAME_CACHE_DIR', os.path.join(BASE_DIR, 'var', 'frames')),
+    'L2_MAX_BYTES': 1024 * 1024 * 1024,
+}
+
+# On-disk OHLCV store shared by all worker processes (see src/services/bar_store.py)
+STOCK_BAR_STORE_DIR = os.getenv('STOCK_BAR_STORE_DIR', os.path.join(BASE_DIR, 'var', 'bars'))
+
+# Every Yahoo Finance call goes through one scheduler per process (see src/services/fetch_scheduler.py)
+STOCK_FETCH_SCHEDULER = {
+    'RATE': float(os.getenv('STOCK_FETCH_RATE', '2')),  # calls started per second
+    'BURST': int(os.getenv('STOCK_FETCH_BURST', '10')),  # calls that may start back to back
+    'MAX_CONCURRENCY': 4,  # calls running at once
+    'MAX_RETRIES': 3,  # requeues of a rate-limited call
+    'BACKOFF': 2,  # seconds paused after the first rate-limit response, doubled per repeat
+    'BACKOFF_MAX': 60,  # seconds
+}
+
+# Keeps the watchlist's cache entries fresh (see src/services/warmup.py and `manage.py warmup`)
+STOCK_WARMUP = {
+    'BACKGROUND': os.getenv('STOCK_WARMUP_BACKGROUND', '').lower() in ('1', 'true', 'yes'),  # in-process worker
+    'EVERY': 30,  # seconds between background passes
+    'AHEAD': 60,  # refetch entries expiring within this many seconds; keep above EVERY
+    'RATE': 1.0,  # upstream calls per second a warmup pass may start
+    # Of the server processes started with BACKGROUND, only the one holding a lock on this file warms
+    'LOCK_FILE': os.getenv('STOCK_WARMUP_LOCK_FILE', os.path.join(BASE_DIR, 'var', 'warmup.lock')),
+}
+
+# Application settings shared with non-Django tooling: watchlist, trading strategy
+APP_CONFIG_FILE = os.getenv('APP_CONFIG_FILE', os.path.join(BASE_DIR, 'config.yaml'))
+
+# Directory of listed symbols behind ticker autocomplete and validation (see src/services/symbols.py);
+# `manage.py update_symbols` replaces the bundled file, a partial list, with the full US exchange listings.
+# Run `manage.py update_symbols --if-partial` on deploy so unknown tickers are rejected
+STOCK_SYMBOLS = {
+    'FILE': os.getenv('STOCK_SYMBOLS_FILE', os.path.join(BASE_DIR, 'src', 'data', 'symbols.csv')),
+    # Reject unknown tickers before any upstream call; only applies once the full directory is loaded,
+    # and never to exchange-suffixed symbols (VOD.L). Off: unknown tickers are logged and passed on
+    'REJECT_UNKNOWN': os.getenv('STOCK_SYMBOLS_REJECT_UNKNOWN', 'true').lower() in ('1', 'true', 'yes'),
+}
+
+# Strategy backtests and parameter sweeps (src/services/backtest.py)
+STOCK_BACKTEST = {
+    'WORKERS': int(os.getenv('STOCK_BACKTEST_WORKERS', str(os.cpu_count() or 1))),  # sweep processes; 1 runs in-process
+    'COST_BPS': float(os.getenv('STOCK_BACKTEST_COST_BPS', '5')),  # charged per unit traded, in basis points
+    'MAX_COMBINATIONS': int(os.getenv('STOCK_BACKTEST_MAX_COMBINATIONS', '5000')),  # per sweep
+}
+
+# Live bar updates pushed over server-sent events at /live/ (src/services/live.py); needs an ASGI server,
+# under WSGI (e.g. runserver) /live/ answers 501 and the chart page does not subscribe
+STOCK_LIVE = {
+    'SOURCE': os.getenv('STOCK_LIVE_SOURCE', 'src.services.live.StockDataQuoteSource'),  # QuoteSource class
+    'POLL_SECONDS': float(os.getenv('STOCK_LIVE_POLL_SECONDS', '15')),  # per (ticker, interval), shared by its viewers
+    'QUEUE_SIZE': int(os.getenv('STOCK_LIVE_QUEUE_SIZE', '32')),  # events a viewer may lag before it must resync
+    'LINGER_SECONDS': float(os.getenv('STOCK_LIVE_LINGER_SECONDS', '10')),  # poller lifetime after the last viewer
+    'HEARTBEAT_SECONDS': float(os.getenv('STOCK_LIVE_HEARTBEAT_SECONDS', '15')),  # keep-alive comment when idle
+}
+
+# Request timing histograms and service statistics served at /metrics (Prometheus text format)
+STOCK_METRICS = {
+    'SERVER_TIMING': os.getenv('STOCK_SERVER_TIMING', 'true').lower() in ('1', 'true', 'yes'),  # per-phase response header
+    'ALLOWED_IPS': [ip.strip() for ip in os.getenv('STOCK_METRICS_ALLOWED_IPS', '').split(',') if ip.strip()],  # empty: any
+}
+
 WSGI_APPLICATION = 'my_django_project.wsgi.application'
+ASGI_APPLICATION = 'my_django_project.asgi.application'
 
 DATABASES = {
     'default': {
@@ -108,4 +193,21 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Mistral AI Configuration
 MISTRAL_API_KEY = os.getenv('MISTRAL_API_KEY')
-MISTRAL_MODEL_NAME = os.getenv('MISTRAL_MODEL_NAME', 'mistral-large-latest')  # Default model name
\ No newline at end of file
+MISTRAL_MODEL_NAME = os.getenv('MISTRAL_MODEL_NAME', 'mistral-large-latest')  # Default model name
+MISTRAL_SERVER_URL = os.getenv('MISTRAL_SERVER_URL')  # Override the API endpoint, e.g. a local fake server
+# Reuse of answers to equivalent questions (same normalized text, chart selection and model)
+MISTRAL_RESPONSE_CACHE = {
+    'MAX_ENTRIES': 1024,
+    'TTL': 3600,  # seconds
+}
+# Outbound calls from the async chat path; limits apply per event loop, i.e. per ASGI worker process
+MISTRAL_CLIENT = {
+    'MAX_CONCURRENCY': int(os.getenv('MISTRAL_MAX_CONCURRENCY', '8')),  # requests in flight upstream
+    'MAX_WAITING': int(os.getenv('MISTRAL_MAX_WAITING', '32')),  # callers queued for a slot before failing fast
+    'QUEUE_TIMEOUT': 10,  # seconds a caller may wait for a slot
+    'TIMEOUT': 30,  # seconds per attempt, and between streamed tokens
+    'MAX_RETRIES': 3,  # on 429 and 5xx responses
+    'RETRY_BACKOFF': 0.5,  # seconds; doubled per attempt, with full jitter
+    'RETRY_BACKOFF_MAX': 8,  # seconds
+    'POOL_CONNECTIONS': 16,  # pooled keep-alive HTTP connections
+}
\ No newline at end of file
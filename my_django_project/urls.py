@@ -2,12 +2,22 @@
 
 from django.contrib import admin
 from django.urls import path
-from stock_app.views import stock_view, get_intervals, chat_with_ai
+from stock_app.views import (
+    stock_view, get_intervals, chat_with_ai, chart_data, metrics, symbol_search, analytics, backtest, live_prices,
+    export_data,
+)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('get_intervals/', get_intervals, name='get_intervals'),
     path('chat/', chat_with_ai, name='chat_with_ai'),
+    path('chart_data/', chart_data, name='chart_data'),
+    path('symbols/', symbol_search, name='symbol_search'),
+    path('analytics/', analytics, name='analytics'),
+    path('backtest/', backtest, name='backtest'),
+    path('live/', live_prices, name='live_prices'),
+    path('export/', export_data, name='export_data'),
+    path('metrics', metrics, name='metrics'),
     path('', stock_view, name='home'),
     path('stock/', stock_view, name='stock'),
 ]
\ No newline at end of file
@@ -3,4 +3,8 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'my_django_project.settings')
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+# Keep the watchlist warm when STOCK_WARMUP enables it; one server process on the host runs the passes
+from src.services.warmup import start_background_warmup  # noqa: E402
+start_background_warmup()
\ No newline at end of file
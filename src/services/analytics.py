@@ -0,0 +1,317 @@
+import gzip
+import hashlib
+import json
+import logging
+import math
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.services.fetch_scheduler import Priority
+from src.services.indicators import PERIODS_PER_YEAR, TRADING_DAYS, VOLATILITY_WINDOW
+from src.services.lru import LRUCache
+from src.services.metrics import cache_samples, registry, timed
+from src.services.single_flight import SingleFlight
+from src.services.yfinance_service import StockData
+
+logger = logging.getLogger('stock_app')
+
+# Returns two tickers must have on common timestamps for a covariance; fewer give null
+MIN_OVERLAP = 10
+
+# Decimal places in the payload
+CORRELATION_DECIMALS = 3
+VALUE_DECIMALS = 6
+
+# The compressed payload is kept with the statistics, so it is compressed once per result.
+# Level 1 is ten times faster than the default on these matrices for a ~15% larger body
+PAYLOAD_GZIP_LEVEL = 1
+# Encoded bodies kept per statistics, one per combination of covariance and failed tickers seen
+MAX_PAYLOADS = 8
+
+
+@dataclass
+class AlignedReturns:
+    """Log returns of many tickers on the union of their timestamps"""
+    tickers: List[str]
+    timestamps: np.ndarray  # Common index, int64 nanoseconds, ascending
+    returns: np.ndarray  # (timestamps, tickers); NaN where a ticker has no bar or at its first bar
+    total_return: np.ndarray  # Per ticker, first to last close
+
+
+@dataclass
+class CrossAssetStats:
+    """
+    Statistics across a set of tickers, computed on log returns of the
+    close. Vectors follow `tickers`, as do the rows and columns of the
+    matrices.
+    """
+    tickers: List[str]
+    period: str
+    interval: str
+    start: Optional[int]  # First and last timestamp of the common index, epoch milliseconds
+    end: Optional[int]
+    bars: int  # Timestamps on the common index
+    total_return: np.ndarray
+    volatility: np.ndarray  # Annualized, over the whole window
+    rolling_volatility: np.ndarray  # Annualized, over the last VOLATILITY_WINDOW returns
+    correlation: np.ndarray
+    covariance: np.ndarray  # Annualized
+    errors: Dict[str, str] = field(default_factory=dict)  # Tickers left out, with the reason
+    # Encoded bodies per (covariance, errors); shared by copies that only differ in `errors`
+    _payloads: Dict[Tuple, Tuple[bytes, str]] = field(default_factory=dict, repr=False)
+    _gzipped: Dict[Tuple, bytes] = field(default_factory=dict, repr=False)
+
+    def _payload_key(self, covariance: bool) -> Tuple:
+        return covariance, tuple(sorted(self.errors.items()))
+
+    def payload(self, covariance: bool = False) -> Tuple[bytes, str]:
+        """
+        Encode the statistics as compact JSON for a heatmap: ticker labels,
+        per-ticker vectors and the correlation matrix as nested rows, with
+        NaN as null. Encoded once per statistics and set of errors.
+        Args:
+            covariance (bool): Include the covariance matrix
+        Returns:
+            Tuple[bytes, str]: JSON body and a hex digest of it
+        """
+        key = self._payload_key(covariance)
+        cached = self._payloads.get(key)
+        if cached is not None:
+            return cached
+        data = {
+            'tickers': self.tickers,
+            'period': self.period,
+            'interval': self.interval,
+            'start': self.start,
+            'end': self.end,
+            'bars': self.bars,
+            'total_return': _rounded(self.total_return, VALUE_DECIMALS),
+            'volatility': _rounded(self.volatility, VALUE_DECIMALS),
+            'rolling_volatility': _rounded(self.rolling_volatility, VALUE_DECIMALS),
+            'correlation': _rounded(self.correlation, CORRELATION_DECIMALS),
+            'errors': self.errors,
+        }
+        if covariance:
+            data['covariance'] = _rounded(self.covariance, VALUE_DECIMALS)
+        body = json.dumps(data, separators=(',', ':')).encode()
+        if len(self._payloads) >= MAX_PAYLOADS:
+            self._payloads.clear()
+        cached = self._payloads[key] = (body, hashlib.sha1(body).hexdigest())
+        return cached
+
+    def gzipped_payload(self, covariance: bool = False) -> bytes:
+        """Return payload() compressed with gzip, compressed once per statistics and set of errors"""
+        key = self._payload_key(covariance)
+        compressed = self._gzipped.get(key)
+        if compressed is None:
+            body, _ = self.payload(covariance)
+            if len(self._gzipped) >= MAX_PAYLOADS:
+                self._gzipped.clear()
+            compressed = self._gzipped[key] = gzip.compress(body, PAYLOAD_GZIP_LEVEL, mtime=0)
+        return compressed
+
+
+def _rounded(values: np.ndarray, decimals: int) -> list:
+    """Round an array for JSON, mapping NaN to null"""
+    rounded = np.round(values, decimals)
+    missing = ~np.isfinite(rounded)
+    if missing.any():
+        rounded = rounded.astype(object)
+        rounded[missing] = None
+    return rounded.tolist()
+
+
+def _closes(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """Timestamps (int64 nanoseconds) and closes of a frame"""
+    return df.index.values.astype('datetime64[ns]').view('int64'), df['Close'].to_numpy(dtype=np.float64)
+
+
+def data_version(frames: Dict[str, pd.DataFrame]) -> str:
+    """
+    Return a short content hash of the tickers, timestamps and closes of
+    several frames, which changes whenever any of them does.
+    """
+    digest = hashlib.blake2b(digest_size=12)
+    for ticker, df in frames.items():
+        stamps, close = _closes(df)
+        digest.update(f"{ticker}:{len(df)}".encode())
+        digest.update(np.ascontiguousarray(stamps).tobytes())
+        digest.update(np.ascontiguousarray(close).tobytes())
+    return digest.hexdigest()
+
+
+def align_returns(frames: Dict[str, pd.DataFrame]) -> AlignedReturns:
+    """
+    Put the log returns of every frame into one matrix on the union of their
+    timestamps. Each return is taken between consecutive bars of its own
+    ticker, so a bar missing for one ticker does not create a return for the
+    others. Closes that are missing or not positive are skipped.
+    Args:
+        frames (Dict[str, pd.DataFrame]): Historical data per ticker, with a 'Close' column
+    Returns:
+        AlignedReturns: Returns matrix with its index and total returns
+    """
+    tickers = list(frames)
+    series = [_closes(frames[ticker]) for ticker in tickers]
+    stamps = np.concatenate([s for s, _ in series] or [np.empty(0, dtype=np.int64)])
+    close = np.concatenate([c for _, c in series] or [np.empty(0)])
+    columns = np.repeat(np.arange(len(tickers)), [len(c) for _, c in series])
+
+    valid = np.isfinite(close) & (close > 0)
+    stamps, close, columns = stamps[valid], close[valid], columns[valid]
+    lengths = np.bincount(columns, minlength=len(tickers))
+
+    # Log returns of the flattened closes; the first bar of each ticker has none
+    log_close = np.log(close)
+    returns = np.empty_like(log_close)
+    if len(returns):
+        returns[0] = np.nan
+        np.subtract(log_close[1:], log_close[:-1], out=returns[1:])
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    present = lengths > 0
+    returns[starts[present]] = np.nan
+
+    total_return = np.full(len(tickers), np.nan)
+    total_return[present] = np.expm1(log_close[ends[present] - 1] - log_close[starts[present]])
+
+    timestamps, rows = np.unique(stamps, return_inverse=True)
+    matrix = np.full((len(timestamps), len(tickers)), np.nan)
+    matrix[rows, columns] = returns
+    return AlignedReturns(tickers, timestamps, matrix, total_return)
+
+
+def pairwise_covariance(returns: np.ndarray, min_overlap: int = MIN_OVERLAP) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Covariance and correlation of every pair of columns over the rows where
+    both have a value, like DataFrame.cov() and DataFrame.corr(), computed
+    with four matrix products instead of a loop over pairs.
+    Args:
+        returns (np.ndarray): (rows, columns) matrix with NaN for missing values
+        min_overlap (int): Common values a pair needs; pairs with fewer are NaN
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Covariance and correlation matrices
+    """
+    present = np.isfinite(returns)
+    weights = present.astype(np.float64)
+    counts = present.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.where(present, returns, 0.0).sum(axis=0) / counts
+    # Centering first keeps the sums small, so the differences below do not cancel
+    x = np.where(present, returns - means, 0.0)
+
+    n = weights.T @ weights  # Common values per pair
+    sums = x.T @ weights  # sums[i, j]: sum of column i over the rows where j is present
+    squares = (x * x).T @ weights
+    products = x.T @ x
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        centered = products - sums * sums.T / n
+        covariance = centered / (n - 1)
+        variances = squares - sums * sums / n  # Of column i over the rows shared with j
+        correlation = np.clip(centered / np.sqrt(variances * variances.T), -1.0, 1.0)
+    too_few = n < max(min_overlap, 2)
+    covariance[too_few] = np.nan
+    correlation[too_few] = np.nan
+    return covariance, correlation
+
+
+def column_volatility(returns: np.ndarray, window: Optional[int] = None) -> np.ndarray:
+    """
+    Standard deviation of each column's values, over its last `window` values
+    if given; NaN for columns with fewer values than needed.
+    """
+    present = np.isfinite(returns)
+    if window is not None:
+        # Keep the last `window` values of each column: rank them from the end
+        rank_from_end = np.cumsum(present[::-1], axis=0)[::-1]
+        present &= rank_from_end <= window
+    counts = present.sum(axis=0)
+    values = np.where(present, returns, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = values.sum(axis=0) / counts
+        deviations = np.where(present, returns - means, 0.0)
+        std = np.sqrt((deviations * deviations).sum(axis=0) / (counts - 1))
+    std[counts < (window or 2)] = np.nan
+    return std
+
+
+def compute_stats(aligned: AlignedReturns, period: str, interval: str) -> CrossAssetStats:
+    """Compute the cross-asset statistics of aligned returns"""
+    periods_per_year = PERIODS_PER_YEAR.get(interval, TRADING_DAYS)
+    scale = math.sqrt(periods_per_year)
+    covariance, correlation = pairwise_covariance(aligned.returns)
+    timestamps = aligned.timestamps
+    return CrossAssetStats(
+        tickers=aligned.tickers,
+        period=period,
+        interval=interval,
+        start=int(timestamps[0] // 1_000_000) if len(timestamps) else None,
+        end=int(timestamps[-1] // 1_000_000) if len(timestamps) else None,
+        bars=len(timestamps),
+        total_return=aligned.total_return,
+        volatility=column_volatility(aligned.returns) * scale,
+        rolling_volatility=column_volatility(aligned.returns, VOLATILITY_WINDOW) * scale,
+        correlation=correlation,
+        covariance=covariance * periods_per_year,
+    )
+
+
+class CrossAssetAnalytics:
+    """
+    Returns, volatility and correlation across a watchlist.
+
+    Histories are loaded through StockData.fetch_many, so cached frames are
+    used as they are and the rest are downloaded together. Results are
+    memoized per (period, interval, data version of the frames): a repeated
+    request costs the cache reads and one hash of the closes, and
+    concurrent identical requests compute once.
+    """
+
+    def __init__(self, memo_entries: int = 32):
+        self._memo = LRUCache(max_entries=memo_entries)
+        self._inflight = SingleFlight()
+
+    def analyze(self, tickers: Sequence[str], period: str, interval: str) -> CrossAssetStats:
+        """
+        Compute statistics for a set of tickers.
+        Args:
+            tickers (Sequence[str]): Ticker symbols; duplicates are ignored and results are sorted by symbol
+            period (str): Time period
+            interval (str): Data interval
+        Returns:
+            CrossAssetStats: Statistics of the tickers with data; the others are listed in `errors`
+        """
+        tickers = sorted({ticker.strip().upper() for ticker in tickers if ticker.strip()})
+        with timed('fetch'):
+            result = StockData.fetch_many(tickers, period, interval, priority=Priority.INTERACTIVE)
+        frames = {ticker: result.data[ticker] for ticker in tickers if ticker in result.data}
+        errors = {ticker: str(error) for ticker, error in sorted(result.errors.items())}
+
+        with timed('analytics'):
+            key = f"{period}:{interval}:{data_version(frames)}"
+            stats = self._memo.get(key)
+            if stats is None:
+                stats = self._inflight.do(key, lambda: self._compute(key, frames, period, interval))
+        # The memo holds statistics of the frames only; which tickers failed is particular to this request
+        return replace(stats, errors=errors)
+
+    def _compute(self, key: str, frames: Dict[str, pd.DataFrame], period: str, interval: str) -> CrossAssetStats:
+        stats = compute_stats(align_returns(frames), period, interval)
+        self._memo.set(key, stats)
+        logger.info("Computed cross-asset statistics for %d tickers (%s/%s, %d bars)",
+                    len(stats.tickers), period, interval, stats.bars)
+        return stats
+
+    def clear(self) -> None:
+        self._memo.clear()
+
+    def cache_stats(self) -> Dict[str, float]:
+        return self._memo.stats()
+
+
+default_analytics = CrossAssetAnalytics()
+registry.add_collector(lambda: cache_samples('analytics', default_analytics.cache_stats()))
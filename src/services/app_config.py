@@ -0,0 +1,46 @@
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List
+
+import yaml
+from django.conf import settings
+
+logger = logging.getLogger('stock_app')
+
+
+@lru_cache(maxsize=1)
+def get_app_config() -> Dict[str, Any]:
+    """
+    Load the application settings from settings.APP_CONFIG_FILE (config.yaml).
+    Returns:
+        Dict[str, Any]: Parsed settings; empty if the file is missing or invalid
+    """
+    try:
+        with open(settings.APP_CONFIG_FILE, encoding='utf-8') as f:
+            config = yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        logger.warning(f"Config file not found: {settings.APP_CONFIG_FILE}")
+        return {}
+    except yaml.YAMLError as e:
+        logger.error(f"Invalid config file {settings.APP_CONFIG_FILE}: {e}")
+        return {}
+    if not isinstance(config, dict):
+        logger.error(f"Config file {settings.APP_CONFIG_FILE} must contain a mapping")
+        return {}
+    return config
+
+
+def get_watchlist() -> List[str]:
+    """
+    Return the tickers to keep warm: `watchlist` from config.yaml, or
+    `yfinance_ticker` when no watchlist is set. Either may be a list or a
+    comma-separated string.
+    Returns:
+        List[str]: Upper-cased ticker symbols, without duplicates
+    """
+    config = get_app_config()
+    value = config.get('watchlist') or config.get('yfinance_ticker') or []
+    if isinstance(value, str):
+        value = value.split(',')
+    tickers = [str(ticker).strip().upper() for ticker in value]
+    return list(dict.fromkeys(ticker for ticker in tickers if ticker))
@@ -0,0 +1,541 @@
+import itertools
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.services.indicators import PERIODS_PER_YEAR, TRADING_DAYS, ema_filter, sma
+
+# Sweep workers are spawned processes that import this module, so it must not
+# import Django models, yfinance_service or anything else that needs settings
+# at import time; those are imported inside the functions that load data.
+
+logger = logging.getLogger('stock_app')
+
+Params = Dict[str, int]
+
+# Summary statistics of a run, in the column order of sweep results
+STAT_NAMES = ('total_return', 'cagr', 'volatility', 'sharpe', 'max_drawdown', 'trades', 'exposure')
+
+# Sweeps smaller than this run in the calling process; starting work in the pool costs more
+PARALLEL_MIN_COMBINATIONS = 64
+# Combinations evaluated together as one matrix by a worker
+CHUNK_SIZE = 128
+# Values one parameter may take in a sweep, checked as the values are parsed
+MAX_PARAMETER_VALUES = 1000
+
+
+class BacktestError(Exception):
+    """Custom exception for backtest failures"""
+    pass
+
+
+def _sma_crossover(close: np.ndarray, combos: List[Params]) -> np.ndarray:
+    """Long while the fast moving average is above the slow one"""
+    windows = sorted({combo[key] for combo in combos for key in ('fast', 'slow')})
+    table = np.vstack([sma(close, window) for window in windows])
+    row = {window: i for i, window in enumerate(windows)}
+    fast = table[[row[combo['fast']] for combo in combos]]
+    slow = table[[row[combo['slow']] for combo in combos]]
+    with np.errstate(invalid='ignore'):
+        return (fast > slow).astype(np.float64)  # NaN before the slow window fills compares False: flat
+
+
+def _momentum(close: np.ndarray, combos: List[Params]) -> np.ndarray:
+    """Long while the close is above the close `lookback` bars earlier"""
+    positions = np.zeros((len(combos), len(close)))
+    for i, combo in enumerate(combos):
+        lookback = combo['lookback']
+        if lookback < len(close):
+            positions[i, lookback:] = close[lookback:] > close[:-lookback]
+    return positions
+
+
+def _rsi(close: np.ndarray, period: int) -> np.ndarray:
+    """Relative strength index with Wilder smoothing, NaN at the first bar"""
+    out = np.full(len(close), np.nan)
+    if len(close) < 2:
+        return out
+    delta = np.diff(close)
+    gains, losses = np.clip(delta, 0, None), np.clip(-delta, 0, None)
+    avg_gain = ema_filter(gains, 1.0 / period, gains[0])
+    avg_loss = ema_filter(losses, 1.0 / period, losses[0])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[1:] = np.where(avg_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + avg_gain / avg_loss))
+    return out
+
+
+def _rsi_reversion(close: np.ndarray, combos: List[Params]) -> np.ndarray:
+    """Enter when the RSI falls below `lower`, exit when it rises above `upper`"""
+    rsi = {period: _rsi(close, period) for period in sorted({combo['period'] for combo in combos})}
+    values = np.vstack([rsi[combo['period']] for combo in combos])
+    lower = np.array([combo['lower'] for combo in combos], dtype=np.float64)[:, None]
+    upper = np.array([combo['upper'] for combo in combos], dtype=np.float64)[:, None]
+
+    # 1 on entry bars, 0 on exit bars, carried forward in between: the position
+    # is the last signal, without a loop over bars
+    signal = np.full(values.shape, np.nan)
+    with np.errstate(invalid='ignore'):
+        signal[values < lower] = 1.0
+        signal[values > upper] = 0.0
+    last = np.where(np.isnan(signal), 0, np.arange(values.shape[1]))
+    np.maximum.accumulate(last, axis=1, out=last)
+    positions = np.take_along_axis(signal, last, axis=1)
+    return np.nan_to_num(positions, nan=0.0)
+
+
+def _buy_and_hold(close: np.ndarray, combos: List[Params]) -> np.ndarray:
+    return np.ones((len(combos), len(close)))
+
+
+@dataclass(frozen=True)
+class Strategy:
+    """A long/flat strategy: positions (0 or 1 per bar) for many parameter combinations at once"""
+    description: str
+    positions: Callable[[np.ndarray, List[Params]], np.ndarray]
+    defaults: Params
+    grid: Dict[str, Sequence[int]]  # Swept by default
+    valid: Callable[[Params], bool] = lambda params: True
+
+
+STRATEGIES: Dict[str, Strategy] = {
+    'sma_crossover': Strategy(
+        "Long while the fast SMA is above the slow SMA",
+        _sma_crossover, {'fast': 50, 'slow': 200},
+        {'fast': range(5, 105, 5), 'slow': range(20, 520, 10)},
+        lambda params: 0 < params['fast'] < params['slow'],
+    ),
+    'momentum': Strategy(
+        "Long while the close is above the close `lookback` bars ago",
+        _momentum, {'lookback': 126},
+        {'lookback': range(5, 505, 5)},
+        lambda params: params['lookback'] > 0,
+    ),
+    'rsi_reversion': Strategy(
+        "Buy when the RSI falls below `lower`, sell when it rises above `upper`",
+        _rsi_reversion, {'period': 14, 'lower': 30, 'upper': 70},
+        {'period': (7, 10, 14, 21, 28), 'lower': range(10, 45, 5), 'upper': range(55, 95, 5)},
+        lambda params: params['period'] > 1 and 0 <= params['lower'] < params['upper'] <= 100,
+    ),
+    'buy_and_hold': Strategy("Always long; the benchmark of every backtest", _buy_and_hold, {}, {}),
+}
+
+# Names accepted for config.yaml `trading_strategy`: (strategy, parameters)
+STRATEGY_PRESETS: Dict[str, Tuple[str, Params]] = {
+    'long_term': ('sma_crossover', {'fast': 50, 'slow': 200}),
+    'short_term': ('sma_crossover', {'fast': 10, 'slow': 30}),
+    'momentum': ('momentum', {'lookback': 126}),
+    'mean_reversion': ('rsi_reversion', {'period': 14, 'lower': 30, 'upper': 70}),
+}
+
+
+def resolve_strategy(name: str, params: Optional[Params] = None) -> Tuple[str, Params]:
+    """
+    Resolve a strategy or preset name and parameter overrides.
+    Args:
+        name (str): Key of STRATEGIES or STRATEGY_PRESETS
+        params (Optional[Params]): Parameters overriding the defaults
+    Returns:
+        Tuple[str, Params]: Strategy name and complete parameters
+    Raises:
+        BacktestError: If the name or a parameter is unknown
+    """
+    if name in STRATEGY_PRESETS:
+        name, defaults = STRATEGY_PRESETS[name]
+    elif name in STRATEGIES:
+        defaults = STRATEGIES[name].defaults
+    else:
+        raise BacktestError(
+            f"Unknown strategy '{name}'. Must be one of {sorted(STRATEGIES) + sorted(STRATEGY_PRESETS)}"
+        )
+    unknown = set(params or {}) - set(STRATEGIES[name].defaults)
+    if unknown:
+        raise BacktestError(f"Unknown parameters for '{name}': {', '.join(sorted(unknown))}")
+    return name, {**defaults, **(params or {})}
+
+
+def configured_strategy() -> Tuple[str, Params]:
+    """
+    Return the strategy of config.yaml `trading_strategy`: a preset or
+    strategy name, or a mapping with `name` and optional `params`.
+    Returns:
+        Tuple[str, Params]: Strategy name and parameters, 'long_term' if unset
+    Raises:
+        BacktestError: If the configured strategy is invalid
+    """
+    from src.services.app_config import get_app_config
+
+    value = get_app_config().get('trading_strategy') or 'long_term'
+    if isinstance(value, dict):
+        return resolve_strategy(str(value.get('name', '')), value.get('params'))
+    return resolve_strategy(str(value))
+
+
+def _grid_values(strategy: str, grid: Optional[Dict[str, Sequence[int]]]) -> Dict[str, Sequence[int]]:
+    spec = STRATEGIES[strategy]
+    values: Dict[str, Sequence[int]] = {name: [default] for name, default in spec.defaults.items()}
+    values.update(spec.grid)
+    values.update(grid or {})
+    return values
+
+
+def grid_size(strategy: str, grid: Optional[Dict[str, Sequence[int]]] = None) -> int:
+    """
+    Count the combinations of a sweep before any is built, invalid ones
+    included; an upper bound on len(expand_grid(strategy, grid)).
+    """
+    return math.prod(len(values) for values in _grid_values(strategy, grid).values())
+
+
+def expand_grid(strategy: str, grid: Optional[Dict[str, Sequence[int]]] = None) -> List[Params]:
+    """
+    List the valid parameter combinations of a sweep. Check grid_size()
+    first for grids from user input: every combination is built.
+    Args:
+        strategy (str): Key of STRATEGIES
+        grid (Optional[Dict[str, Sequence[int]]]): Values per parameter, overriding the
+            strategy's default grid; parameters missing from both keep their default
+    Returns:
+        List[Params]: Combinations in grid order
+    """
+    spec = STRATEGIES[strategy]
+    values = _grid_values(strategy, grid)
+    names = sorted(values)
+    combos = (dict(zip(names, combo)) for combo in itertools.product(*(values[name] for name in names)))
+    return [combo for combo in combos if spec.valid(combo)]
+
+
+def evaluate(close: np.ndarray, positions: np.ndarray, periods_per_year: float, cost: float,
+             keep_equity: bool = False) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Simulate positions over a price series, one row per combination.
+    A position decided on a bar's close earns the next bar's return, and
+    every change of position pays `cost` per unit traded.
+    Args:
+        close (np.ndarray): Closes, one per bar
+        positions (np.ndarray): (combinations, bars) target positions
+        periods_per_year (float): Bars per year, to annualize
+        cost (float): Cost of trading one unit, as a fraction of its value
+        keep_equity (bool): Also return the equity curves
+    Returns:
+        Tuple[np.ndarray, Optional[np.ndarray]]: (combinations, STAT_NAMES) statistics,
+            and the (combinations, bars) equity curves starting at 1 if requested
+    """
+    returns = np.zeros(len(close))
+    returns[1:] = close[1:] / close[:-1] - 1.0
+
+    held = np.zeros_like(positions)
+    held[:, 1:] = positions[:, :-1]
+    turnover = np.abs(np.diff(held, axis=1, prepend=0.0))
+    strategy_returns = held * returns - turnover * cost
+    equity = np.exp(np.cumsum(np.log1p(strategy_returns), axis=1))
+
+    bars = len(close) - 1
+    years = bars / periods_per_year if bars else math.nan
+    stats = np.empty((len(positions), len(STAT_NAMES)))
+    final = equity[:, -1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        period_returns = strategy_returns[:, 1:]
+        std = period_returns.std(axis=1, ddof=1) if bars > 1 else np.full(len(positions), np.nan)
+        stats[:, 0] = final - 1.0
+        stats[:, 1] = final ** (1.0 / years) - 1.0
+        stats[:, 2] = std * math.sqrt(periods_per_year)
+        stats[:, 3] = np.where(std > 0, period_returns.mean(axis=1) / std * math.sqrt(periods_per_year), np.nan)
+        stats[:, 4] = (1.0 - equity / np.maximum.accumulate(equity, axis=1)).max(axis=1)
+    stats[:, 5] = (turnover > 0).sum(axis=1)
+    stats[:, 6] = held[:, 1:].mean(axis=1) if bars else 0.0
+    return stats, (equity if keep_equity else None)
+
+
+def _sweep_chunk(close: np.ndarray, strategy: str, combos: List[Params], periods_per_year: float,
+                 cost: float) -> np.ndarray:
+    positions = STRATEGIES[strategy].positions(close, combos)
+    return evaluate(close, positions, periods_per_year, cost)[0]
+
+
+def _shared_sweep_chunk(shm_name: str, bars: int, strategy: str, combos: List[Params], periods_per_year: float,
+                        cost: float) -> np.ndarray:
+    """Worker side of a sweep: evaluate a chunk against the closes in shared memory"""
+    shm = SharedMemory(name=shm_name)
+    try:
+        close = np.ndarray((bars,), dtype=np.float64, buffer=shm.buf)
+        return _sweep_chunk(close, strategy, combos, periods_per_year, cost)
+    finally:
+        del close
+        shm.close()
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def get_backtest_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Return the process-wide sweep pool, started on first use. Workers are
+    spawned rather than forked, so they do not inherit the server's threads
+    and locks; each one imports numpy once and is reused by later sweeps.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'))
+            _pool_workers = workers
+        return _pool
+
+
+def sweep(close: np.ndarray, strategy: str, combos: List[Params], periods_per_year: float, cost: float,
+          workers: int = 1) -> np.ndarray:
+    """
+    Evaluate many parameter combinations of a strategy.
+    With more than one worker and at least PARALLEL_MIN_COMBINATIONS
+    combinations, chunks of CHUNK_SIZE combinations are evaluated on the
+    process pool. The closes are placed in shared memory once and every
+    worker maps them, instead of each task receiving a pickled copy.
+    Args:
+        close (np.ndarray): Closes, one per bar
+        strategy (str): Key of STRATEGIES
+        combos (List[Params]): Parameter combinations
+        periods_per_year (float): Bars per year, to annualize
+        cost (float): Cost of trading one unit, as a fraction of its value
+        workers (int): Processes to use
+    Returns:
+        np.ndarray: (combinations, STAT_NAMES) statistics in the order of `combos`
+    """
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    chunks = [combos[i:i + CHUNK_SIZE] for i in range(0, len(combos), CHUNK_SIZE)]
+    if workers <= 1 or len(combos) < PARALLEL_MIN_COMBINATIONS:
+        return np.vstack([_sweep_chunk(close, strategy, chunk, periods_per_year, cost) for chunk in chunks] or
+                         [np.empty((0, len(STAT_NAMES)))])
+
+    shm = SharedMemory(create=True, size=max(close.nbytes, 1))
+    try:
+        np.ndarray(close.shape, dtype=np.float64, buffer=shm.buf)[:] = close
+        pool = get_backtest_pool(workers)
+        futures = [
+            pool.submit(_shared_sweep_chunk, shm.name, len(close), strategy, chunk, periods_per_year, cost)
+            for chunk in chunks
+        ]
+        return np.vstack([future.result() for future in futures])
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+@dataclass
+class BacktestResult:
+    """One parameter combination of a strategy and how it did"""
+    params: Params
+    stats: Dict[str, float]
+    equity: Optional[np.ndarray] = None  # Value of 1 invested at the first bar, per bar
+
+
+@dataclass
+class BacktestReport:
+    """Results of a backtest or sweep over one price series"""
+    ticker: str
+    period: str
+    interval: str
+    strategy: str
+    timestamps: np.ndarray  # Epoch milliseconds, one per bar
+    results: List[BacktestResult]  # Best first; equity kept for the first
+    benchmark: BacktestResult  # Buy and hold, with equity
+    combinations: int
+    elapsed: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Summary statistics and equity curves as JSON-ready values; NaN becomes None"""
+        def clean(value: float) -> Optional[float]:
+            return round(float(value), 6) if np.isfinite(value) else None
+
+        def curve(equity: Optional[np.ndarray]) -> Optional[List[float]]:
+            return None if equity is None else np.round(equity, 6).tolist()
+
+        return {
+            'ticker': self.ticker,
+            'period': self.period,
+            'interval': self.interval,
+            'strategy': self.strategy,
+            'combinations': self.combinations,
+            'elapsed': round(self.elapsed, 3),
+            'results': [
+                {'params': result.params, 'stats': {k: clean(v) for k, v in result.stats.items()}}
+                for result in self.results
+            ],
+            'buy_and_hold': {k: clean(v) for k, v in self.benchmark.stats.items()},
+            'equity': {
+                't': self.timestamps.tolist(),
+                'strategy': curve(self.results[0].equity if self.results else None),
+                'buy_and_hold': curve(self.benchmark.equity),
+            },
+        }
+
+
+def _stats_dict(row: np.ndarray) -> Dict[str, float]:
+    return dict(zip(STAT_NAMES, row.tolist()))
+
+
+def run_backtest(close: np.ndarray, timestamps: np.ndarray, strategy: str, combos: List[Params],
+                 interval: str, cost: float, workers: int = 1, top: int = 10,
+                 ticker: str = '', period: str = '') -> BacktestReport:
+    """
+    Backtest parameter combinations of a strategy over a price series and
+    rank them by Sharpe ratio. The equity curve of the best one and of buy
+    and hold are included.
+    Args:
+        close (np.ndarray): Closes, one per bar
+        timestamps (np.ndarray): Epoch milliseconds, one per bar
+        strategy (str): Key of STRATEGIES
+        combos (List[Params]): Parameter combinations; one for a single backtest
+        interval (str): Data interval, to annualize
+        cost (float): Cost of trading one unit, as a fraction of its value
+        workers (int): Processes for the sweep, see sweep()
+        top (int): Results kept
+        ticker (str): Stock ticker symbol, for the report
+        period (str): Time period, for the report
+    Returns:
+        BacktestReport: Ranked results with equity curves
+    """
+    started = time.perf_counter()
+    periods_per_year = PERIODS_PER_YEAR.get(interval, TRADING_DAYS)
+    stats = sweep(close, strategy, combos, periods_per_year, cost, workers)
+    sharpe = stats[:, STAT_NAMES.index('sharpe')]
+    order = np.argsort(np.where(np.isnan(sharpe), -np.inf, -sharpe), kind='stable')[:top]
+
+    results = [BacktestResult(combos[i], _stats_dict(stats[i])) for i in order]
+    if results:
+        # Only the winner's curve is kept, so it is recomputed rather than collected from the workers
+        positions = STRATEGIES[strategy].positions(close, [results[0].params])
+        results[0].equity = evaluate(close, positions, periods_per_year, cost, keep_equity=True)[1][0]
+    hold_stats, hold_equity = evaluate(close, _buy_and_hold(close, [{}]), periods_per_year, cost, keep_equity=True)
+    return BacktestReport(
+        ticker=ticker, period=period, interval=interval, strategy=strategy,
+        timestamps=timestamps, results=results,
+        benchmark=BacktestResult({}, _stats_dict(hold_stats[0]), hold_equity[0]),
+        combinations=len(combos), elapsed=time.perf_counter() - started,
+    )
+
+
+def load_closes(ticker: str, period: str, interval: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Load closes through StockData, so the frame cache and bar store are used.
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Closes and their epoch-millisecond timestamps
+    Raises:
+        StockDataError: If data fetch fails
+    """
+    from src.services.yfinance_service import StockData
+
+    df = StockData(ticker, period, interval).get_historical_data()
+    close = df['Close'].to_numpy(dtype=np.float64)
+    timestamps = df.index.values.astype('datetime64[ms]').view('int64')
+    valid = np.isfinite(close) & (close > 0)
+    return close[valid], timestamps[valid]
+
+
+def backtest_ticker(ticker: str, period: str, interval: str, strategy: Optional[str] = None,
+                    params: Optional[Params] = None, grid: Optional[Dict[str, Sequence[int]]] = None,
+                    sweep_defaults: bool = False, top: int = 10) -> BacktestReport:
+    """
+    Backtest a strategy on a ticker with the settings of settings.STOCK_BACKTEST.
+    Parameters in `grid` are swept; with `sweep_defaults`, so are the
+    parameters of the strategy's default grid that `params` does not fix.
+    Without either this is a single backtest.
+    Args:
+        ticker (str): Stock ticker symbol
+        period (str): Time period
+        interval (str): Data interval
+        strategy (Optional[str]): Strategy or preset name, defaults to config.yaml `trading_strategy`
+        params (Optional[Params]): Parameter overrides
+        grid (Optional[Dict[str, Sequence[int]]]): Values to sweep per parameter
+        sweep_defaults (bool): Also sweep the strategy's default grid
+        top (int): Results kept
+    Returns:
+        BacktestReport: Ranked results with equity curves
+    Raises:
+        BacktestError: If the strategy, its parameters or the sweep size are invalid
+        StockDataError: If data fetch fails
+    """
+    from django.conf import settings
+
+    config = settings.STOCK_BACKTEST
+    params = params or {}
+    grid = grid or {}
+    if strategy:
+        name, resolved = resolve_strategy(strategy, params)
+    else:
+        name, resolved = configured_strategy()
+        resolved.update(params)
+    unknown = (set(params) | set(grid)) - set(STRATEGIES[name].defaults)
+    if unknown:
+        raise BacktestError(f"Unknown parameters for '{name}': {', '.join(sorted(unknown))}")
+
+    fixed = params if sweep_defaults else resolved
+    sweep_grid = {**{key: [value] for key, value in fixed.items()}, **grid}
+    size = grid_size(name, sweep_grid)
+    if size > config['MAX_COMBINATIONS']:
+        raise BacktestError(f"The sweep has {size} combinations; at most {config['MAX_COMBINATIONS']} are allowed")
+    combos = expand_grid(name, sweep_grid)
+    if not combos:
+        raise BacktestError(f"No valid parameter combinations for '{name}'")
+
+    close, timestamps = load_closes(ticker, period, interval)
+    if len(close) < 2:
+        raise BacktestError(f"Not enough data to backtest {ticker} ({period}/{interval})")
+    report = run_backtest(close, timestamps, name, combos, interval, config['COST_BPS'] / 10_000,
+                          workers=config['WORKERS'], top=top, ticker=ticker.upper(), period=period)
+    logger.info("Backtested %s on %s (%s/%s): %d combinations in %.2fs",
+                name, ticker, period, interval, len(combos), report.elapsed)
+    return report
+
+
+def parse_values(text: str) -> List[int]:
+    """
+    Parse parameter values: a comma-separated list ("10,20,50") or an
+    inclusive range with a step ("5:100:5").
+    Raises:
+        ValueError: If the text is not a list of integers or a range, or has
+            more than MAX_PARAMETER_VALUES values
+    """
+    if ':' in text:
+        start, stop, step = (int(part) for part in text.split(':'))
+        if step <= 0:
+            raise ValueError("The step of a range must be positive")
+        values = range(start, stop + 1, step)
+    else:
+        parts = [part for part in text.split(',') if part.strip()]
+        if not parts:
+            raise ValueError("No values given")
+        values = parts
+    if len(values) > MAX_PARAMETER_VALUES:
+        raise ValueError(f"'{text}' has {len(values)} values; at most {MAX_PARAMETER_VALUES} are allowed")
+    return [int(value) for value in values]
+
+
+def parse_params(items: Sequence[str]) -> Tuple[Params, Dict[str, List[int]]]:
+    """
+    Parse `name=values` items into fixed parameters (one value) and a sweep
+    grid (several values), e.g. ["fast=10:50:10", "slow=200"].
+    Raises:
+        ValueError: If an item is not `name=values`
+    """
+    params, grid = {}, {}
+    for item in items:
+        name, sep, text = item.partition('=')
+        if not sep or not name.strip():
+            raise ValueError(f"Expected name=values, got '{item}'")
+        values = parse_values(text)
+        if len(values) == 1:
+            params[name.strip()] = values[0]
+        else:
+            grid[name.strip()] = values
+    return params, grid
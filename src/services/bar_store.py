@@ -0,0 +1,224 @@
+import json
+import logging
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+logger = logging.getLogger('stock_app')
+
+
+@dataclass
+class StoreCoverage:
+    """Range of bars held in the store for one (ticker, interval)"""
+    covers_from: Optional[int]  # UTC nanoseconds, None when the store holds the full history
+    last: pd.Timestamp
+    rows: int
+
+    def covers(self, start: Optional[pd.Timestamp]) -> bool:
+        """Return True if every bar from `start` onwards is in the store"""
+        if self.covers_from is None:
+            return True
+        return start is not None and self.covers_from <= start.value
+
+
+class BarStore:
+    """
+    On-disk OHLCV store keyed by (ticker, interval).
+
+    Each key is a directory holding one `.npy` file per column plus the
+    timestamp index, so reads memory-map the files and only materialize the
+    rows that are requested. Writes replace files atomically under an
+    exclusive file lock, which makes the store safe to share between
+    worker processes on the same host.
+    """
+
+    INDEX_FILE = 'index.npy'
+    META_FILE = 'meta.json'
+    LOCK_FILE = '.lock'
+
+    def __init__(self, root: os.PathLike):
+        self.root = Path(root)
+
+    def _key_dir(self, ticker: str, interval: str) -> Path:
+        return self.root / interval / ticker.upper()
+
+    @contextmanager
+    def _lock(self, key_dir: Path, exclusive: bool) -> Iterator[None]:
+        """Hold a shared or exclusive lock on a key directory"""
+        key_dir.mkdir(parents=True, exist_ok=True)
+        with open(key_dir / self.LOCK_FILE, 'a+') as fh:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _read_meta(self, key_dir: Path) -> Optional[Dict]:
+        try:
+            with open(key_dir / self.META_FILE) as fh:
+                return json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _load_arrays(self, key_dir: Path, meta: Dict) -> Dict[str, np.ndarray]:
+        arrays = {'__index__': np.load(key_dir / self.INDEX_FILE, mmap_mode='r')}
+        for i, column in enumerate(meta['columns']):
+            arrays[column] = np.load(key_dir / f'col{i}.npy', mmap_mode='r')
+        return arrays
+
+    @staticmethod
+    def _index_ns(index: pd.DatetimeIndex) -> np.ndarray:
+        """Return timestamps as int64 UTC nanoseconds, whatever the index resolution"""
+        return index.values.astype('datetime64[ns]').view('int64')
+
+    @staticmethod
+    def _save_atomic(path: Path, array: np.ndarray) -> None:
+        tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        with open(tmp_path, 'wb') as fh:
+            np.save(fh, np.ascontiguousarray(array))
+        os.replace(tmp_path, path)
+
+    def _write_arrays(self, key_dir: Path, index: np.ndarray, values: List[np.ndarray], meta: Dict) -> None:
+        for i, column_values in enumerate(values):
+            self._save_atomic(key_dir / f'col{i}.npy', column_values)
+        self._save_atomic(key_dir / self.INDEX_FILE, index)
+
+        meta = dict(meta, rows=len(index))
+        tmp_meta = key_dir / f'{self.META_FILE}.{os.getpid()}.tmp'
+        with open(tmp_meta, 'w') as fh:
+            json.dump(meta, fh)
+        os.replace(tmp_meta, key_dir / self.META_FILE)
+
+    def coverage(self, ticker: str, interval: str) -> Optional[StoreCoverage]:
+        """
+        Describe what the store holds for a key.
+        Args:
+            ticker (str): Stock ticker symbol
+            interval (str): Data interval
+        Returns:
+            Optional[StoreCoverage]: Stored range, or None if nothing is stored
+        """
+        key_dir = self._key_dir(ticker, interval)
+        if not key_dir.exists():
+            return None
+        with self._lock(key_dir, exclusive=False):
+            meta = self._read_meta(key_dir)
+            if not meta or not meta['rows']:
+                return None
+            index = np.load(key_dir / self.INDEX_FILE, mmap_mode='r')
+            last = pd.Timestamp(int(index[-1]), tz='UTC')
+        if meta['tz']:
+            last = last.tz_convert(meta['tz'])
+        else:
+            last = last.tz_localize(None)
+        return StoreCoverage(covers_from=meta['covers_from'], last=last, rows=meta['rows'])
+
+    def read(self, ticker: str, interval: str, start: Optional[pd.Timestamp] = None) -> Optional[pd.DataFrame]:
+        """
+        Read stored bars, optionally only those at or after `start`.
+        Args:
+            ticker (str): Stock ticker symbol
+            interval (str): Data interval
+            start (Optional[pd.Timestamp]): First timestamp to return
+        Returns:
+            Optional[pd.DataFrame]: Stored bars, or None if nothing is stored
+        """
+        key_dir = self._key_dir(ticker, interval)
+        if not key_dir.exists():
+            return None
+        with self._lock(key_dir, exclusive=False):
+            meta = self._read_meta(key_dir)
+            if not meta:
+                return None
+            arrays = self._load_arrays(key_dir, meta)
+            index = arrays.pop('__index__')
+            offset = 0 if start is None else int(np.searchsorted(index, start.value, side='left'))
+            # Only the requested slice is copied out of the memory map
+            data = {column: np.array(values[offset:]) for column, values in arrays.items()}
+            timestamps = np.array(index[offset:])
+
+        dt_index = pd.DatetimeIndex(pd.to_datetime(timestamps, unit='ns', utc=meta['tz'] is not None))
+        if meta['tz']:
+            dt_index = dt_index.tz_convert(meta['tz'])
+        dt_index.name = meta.get('index_name')
+        return pd.DataFrame(data, index=dt_index, columns=meta['columns'])
+
+    def write(self, ticker: str, interval: str, df: pd.DataFrame, covers_from: Optional[pd.Timestamp]) -> None:
+        """
+        Replace the stored bars for a key.
+        Args:
+            ticker (str): Stock ticker symbol
+            interval (str): Data interval
+            df (pd.DataFrame): Bars to store, indexed by timestamp
+            covers_from (Optional[pd.Timestamp]): Start of the window `df` is complete for,
+                or None if it is the full history
+        """
+        if df.empty:
+            return
+        key_dir = self._key_dir(ticker, interval)
+        df = df[~df.index.duplicated(keep='last')].sort_index()
+        with self._lock(key_dir, exclusive=True):
+            meta = {
+                'columns': list(df.columns),
+                'tz': str(df.index.tz) if df.index.tz is not None else None,
+                'index_name': df.index.name,
+                'covers_from': None if covers_from is None else covers_from.value,
+            }
+            self._write_arrays(key_dir, self._index_ns(df.index), [df[column].to_numpy() for column in df.columns], meta)
+        logger.debug(f"Stored {len(df)} bars for {ticker} ({interval})")
+
+    def append(self, ticker: str, interval: str, tail: pd.DataFrame) -> None:
+        """
+        Merge newly fetched bars into the store. Stored bars at or after the
+        first timestamp of `tail` are replaced, since the last stored bar may
+        have been incomplete when it was fetched.
+        Args:
+            ticker (str): Stock ticker symbol
+            interval (str): Data interval
+            tail (pd.DataFrame): Newly fetched bars
+        """
+        if tail.empty:
+            return
+        key_dir = self._key_dir(ticker, interval)
+        tail = tail[~tail.index.duplicated(keep='last')].sort_index()
+        with self._lock(key_dir, exclusive=True):
+            meta = self._read_meta(key_dir)
+            if not meta:
+                raise FileNotFoundError(f"No stored bars for {ticker} ({interval})")
+            arrays = self._load_arrays(key_dir, meta)
+            index = arrays.pop('__index__')
+            tail_index = self._index_ns(tail.index)
+            keep = int(np.searchsorted(index, tail_index[0], side='left'))
+            tail = tail.reindex(columns=meta['columns'], fill_value=0)
+
+            values = [
+                np.concatenate([arrays[column][:keep], tail[column].to_numpy().astype(arrays[column].dtype)])
+                for column in meta['columns']
+            ]
+            merged_index = np.concatenate([index[:keep], tail_index])
+            self._write_arrays(key_dir, merged_index, values, meta)
+        logger.debug(f"Appended {len(tail)} bars for {ticker} ({interval})")
+
+
+_default_store: Optional[BarStore] = None
+
+
+def get_bar_store() -> BarStore:
+    """Return the process-wide bar store configured by STOCK_BAR_STORE_DIR"""
+    global _default_store
+    if _default_store is None:
+        from django.conf import settings
+        _default_store = BarStore(settings.STOCK_BAR_STORE_DIR)
+    return _default_store
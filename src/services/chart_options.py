@@ -0,0 +1,45 @@
+from typing import Dict, List, Literal, Tuple
+
+# What the chart form offers. This module has no third-party imports, so the
+# form and get_intervals can use it without loading pandas or yfinance.
+
+# Valid combinations of period and interval
+PERIOD_INTERVAL_MAP: Dict[str, List[str]] = {
+    "1d": ["1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h"],
+    "5d": ["5m", "15m", "30m", "60m", "90m", "1h"],
+    "1mo": ["30m", "60m", "90m", "1h", "1d"],
+    "3mo": ["60m", "1h", "1d"],
+    "6mo": ["1d"],
+    "1y": ["1d"],
+    "2y": ["1d", "5d", "1wk"],
+    "5y": ["1d", "1wk", "1mo"],
+    "10y": ["1d", "1wk", "1mo"],
+    "ytd": ["1d"],
+    "max": ["1d", "1wk", "1mo"]
+}
+
+VALID_PERIODS = Literal["1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "10y", "ytd", "max"]
+VALID_INTERVALS = Literal["1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h", "1d", "5d", "1wk", "1mo"]
+
+# Indicators drawn on the price axis of a chart: name -> (label, columns)
+CHART_OVERLAYS: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "sma": ("SMA 20/50", ("sma_20", "sma_50")),
+    "ema": ("EMA 12/26", ("ema_12", "ema_26")),
+    "bollinger": ("Bollinger Bands", ("bb_upper", "bb_mid", "bb_lower")),
+}
+
+
+def get_available_periods() -> List[str]:
+    """Return list of valid time periods"""
+    return list(PERIOD_INTERVAL_MAP.keys())
+
+
+def get_available_intervals(period: str) -> List[str]:
+    """
+    Return list of valid intervals for a given period.
+    Args:
+        period (str): Time period
+    Returns:
+        List[str]: Valid intervals for the period
+    """
+    return PERIOD_INTERVAL_MAP.get(period, [])
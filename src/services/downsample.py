@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+# Target point counts accepted for a chart, in points (about one per pixel)
+MIN_POINTS = 100
+MAX_POINTS = 4000
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Select `threshold` points that preserve the visual shape of a series,
+    using a vectorized variant of Largest-Triangle-Three-Buckets.
+
+    Classic LTTB anchors each bucket's triangle on the point chosen in the
+    previous bucket, which forces a sequential loop. Here the previous
+    bucket's mean is used instead, so every bucket is scored in one pass.
+    The first and last points are always kept.
+    Args:
+        x (np.ndarray): Monotonic x values
+        y (np.ndarray): y values
+        threshold (int): Number of points to keep
+    Returns:
+        np.ndarray: Sorted indices of the selected points
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n_buckets = threshold - 2
+
+    # Interior points 1..n-2 are split into n_buckets contiguous buckets
+    edges = np.linspace(1, n - 1, n_buckets + 1).astype(np.int64)
+    interior = np.arange(1, n - 1)
+    bucket = np.searchsorted(edges, interior, side='right') - 1
+    counts = np.bincount(bucket, minlength=n_buckets)
+    mean_x = np.bincount(bucket, weights=x[1:-1], minlength=n_buckets) / counts
+    mean_y = np.bincount(bucket, weights=y[1:-1], minlength=n_buckets) / counts
+
+    prev_x = np.concatenate([[x[0]], mean_x[:-1]])[bucket]
+    prev_y = np.concatenate([[y[0]], mean_y[:-1]])[bucket]
+    next_x = np.concatenate([mean_x[1:], [x[-1]]])[bucket]
+    next_y = np.concatenate([mean_y[1:], [y[-1]]])[bucket]
+
+    # Twice the area of the triangle (prev mean, point, next mean)
+    area = np.abs((prev_x - next_x) * (y[1:-1] - prev_y) - (prev_x - x[1:-1]) * (next_y - prev_y))
+    area = np.nan_to_num(area, nan=-1.0)
+
+    # Largest triangle per bucket: sort by bucket, then by area descending
+    order = np.lexsort((-area, bucket))
+    sorted_buckets = bucket[order]
+    first_in_bucket = np.concatenate([[True], sorted_buckets[1:] != sorted_buckets[:-1]])
+    chosen = interior[order[first_in_bucket]]
+    return np.concatenate([[0], chosen, [n - 1]])
+
+
+def downsample_frame(df: pd.DataFrame, column: str, threshold: int) -> pd.DataFrame:
+    """
+    Reduce a frame to about `threshold` rows, keeping the shape of `column`.
+    Args:
+        df (pd.DataFrame): Frame indexed by timestamp
+        column (str): Column whose shape is preserved
+        threshold (int): Target number of rows, clamped to [MIN_POINTS, MAX_POINTS]
+    Returns:
+        pd.DataFrame: The selected rows
+    """
+    threshold = max(MIN_POINTS, min(MAX_POINTS, threshold))
+    if len(df) <= threshold:
+        return df
+    if isinstance(df.index, pd.DatetimeIndex):
+        x = df.index.values.astype('datetime64[ns]').view('int64')
+    else:
+        x = np.arange(len(df))
+    return df.iloc[lttb_indices(x, df[column].to_numpy(), threshold)]
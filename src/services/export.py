@@ -0,0 +1,269 @@
+import hashlib
+import io
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from django.core.cache import cache
+
+from src.services.frame_cache import frame_version
+from src.services.yfinance_service import StockData, StockDataError
+
+logger = logging.getLogger('stock_app')
+
+# Exported columns after `ticker` and `timestamp`
+EXPORT_COLUMNS = ('Open', 'High', 'Low', 'Close', 'Volume')
+# Rows serialized at a time; also the Parquet row group size
+CHUNK_ROWS = 10_000
+# Media types of the export formats
+FORMATS = {'csv': 'text/csv; charset=utf-8', 'parquet': 'application/vnd.apache.parquet'}
+# Seconds the byte size of an export is remembered, for range requests and Content-Length
+SIZE_TIMEOUT = 3600
+
+
+class ExportError(Exception):
+    """Custom exception for export failures"""
+    pass
+
+
+def _csv_chunks(frames: Iterator[Tuple[str, pd.DataFrame]]) -> Iterator[bytes]:
+    yield ('ticker,timestamp,' + ','.join(column.lower() for column in EXPORT_COLUMNS) + '\n').encode()
+    for ticker, df in frames:
+        for start in range(0, len(df), CHUNK_ROWS):
+            chunk = df.iloc[start:start + CHUNK_ROWS]
+            timestamps = np.datetime_as_string(chunk.index.values.astype('datetime64[s]'), timezone='UTC')
+            out = pd.DataFrame({'ticker': ticker, 'timestamp': timestamps})
+            for column in EXPORT_COLUMNS:
+                out[column] = chunk[column].to_numpy() if column in chunk.columns else np.nan
+            yield out.to_csv(index=False, header=False, lineterminator='\n').encode()
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file that hands out what has been written since the last drain"""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _parquet_chunks(frames: Iterator[Tuple[str, pd.DataFrame]]) -> Iterator[bytes]:
+    """
+    Write row groups of CHUNK_ROWS rows, filled across tickers so short
+    histories still compress well, yielding the bytes of each; then the footer.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError("Parquet export requires pyarrow, which is not installed")
+
+    schema = pa.schema(
+        [('ticker', pa.string()), ('timestamp', pa.timestamp('ms', tz='UTC'))]
+        + [(column.lower(), pa.float64()) for column in EXPORT_COLUMNS[:-1]]
+        + [('volume', pa.int64())]
+    )
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    pending: List['pa.Table'] = []
+    pending_rows = 0
+    try:
+        for ticker, df in frames:
+            start = 0
+            while start < len(df):
+                chunk = df.iloc[start:start + CHUNK_ROWS - pending_rows]
+                start += len(chunk)
+                columns = [
+                    pa.array([ticker] * len(chunk), pa.string()),
+                    pa.array(chunk.index.values.astype('datetime64[ms]').view('int64'), pa.int64())
+                    .cast(pa.timestamp('ms', tz='UTC')),
+                ]
+                for column in EXPORT_COLUMNS:
+                    values = (chunk[column].to_numpy(dtype=float) if column in chunk.columns
+                              else np.full(len(chunk), np.nan))
+                    if column == 'Volume':
+                        columns.append(pa.array(np.nan_to_num(values).astype(np.int64), mask=np.isnan(values)))
+                    else:
+                        columns.append(pa.array(values, pa.float64(), mask=np.isnan(values)))
+                pending.append(pa.Table.from_arrays(columns, schema=schema))
+                pending_rows += len(chunk)
+                if pending_rows >= CHUNK_ROWS:
+                    writer.write_table(pa.concat_tables(pending))
+                    pending, pending_rows = [], 0
+                    yield sink.drain()
+        if pending:
+            writer.write_table(pa.concat_tables(pending))
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+@dataclass
+class ExportPlan:
+    """
+    An export of several tickers' bars, one ticker after the other, in CSV
+    or Parquet.
+
+    Frames are read and serialized one ticker at a time, CHUNK_ROWS rows at
+    a time, so memory holds at most one ticker's frame (already in the
+    frame cache) and one chunk of output, however many rows are exported.
+    The output is a pure function of the data, so its ETag is derived from
+    the version of every frame and a byte range of it can be produced again
+    by regenerating and skipping; that is what makes downloads resumable.
+    """
+    tickers: List[str]  # With data, in export order
+    period: str
+    interval: str
+    format: str
+    versions: Dict[str, str]  # frame_version() per ticker when planned
+    errors: Dict[str, str] = field(default_factory=dict)  # Tickers without data
+
+    @property
+    def etag(self) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{self.format}:{self.period}:{self.interval}".encode())
+        for ticker in self.tickers:
+            digest.update(f":{ticker}={self.versions[ticker]}".encode())
+        return digest.hexdigest()
+
+    @property
+    def filename(self) -> str:
+        label = self.tickers[0] if len(self.tickers) == 1 else f"{len(self.tickers)}-tickers"
+        return f"{label}_{self.period}_{self.interval}.{self.format}"
+
+    @property
+    def _size_key(self) -> str:
+        return f"export-size:{self.etag}"
+
+    def _frames(self, strict: bool) -> Iterator[Tuple[str, pd.DataFrame]]:
+        for ticker in self.tickers:
+            df = StockData(ticker, self.period, self.interval).get_historical_data()
+            if frame_version(df) != self.versions[ticker]:
+                if strict:
+                    # The bytes would not match the ETag the range was requested against
+                    raise ExportError(f"Data for {ticker} changed during the export")
+                logger.info(f"Data for {ticker} changed since the export of {self.filename} was planned")
+            yield ticker, df
+
+    def chunks(self, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """
+        Generate the export, or bytes [start, end) of it. The byte size is
+        recorded once serialization reaches the end; a consumer that stops
+        early (a download cut short) has the rest serialized, without being
+        kept, when it closes the generator, so the resume can be answered
+        with a range.
+        Args:
+            start (int): First byte
+            end (Optional[int]): Byte after the last, None for the end of the export
+        Yields:
+            bytes: Pieces of at most about CHUNK_ROWS rows
+        Raises:
+            ExportError: If a ranged export's data changed since planning, or the format is unavailable
+        """
+        serialize = _parquet_chunks if self.format == 'parquet' else _csv_chunks
+        ranged = start > 0 or end is not None
+        pieces = serialize(self._frames(strict=ranged))
+        position = 0
+        try:
+            for piece in pieces:
+                piece_start, position = position, position + len(piece)
+                if position <= start:
+                    continue
+                if end is not None and piece_start >= end:
+                    return
+                yield piece[max(start - piece_start, 0):None if end is None else end - piece_start]
+        except GeneratorExit:
+            if end is None and self.known_size() is None:
+                self._record_rest(pieces, position)
+            raise
+        if end is None:
+            cache.set(self._size_key, position, SIZE_TIMEOUT)
+
+    def _record_rest(self, pieces: Iterator[bytes], position: int) -> None:
+        try:
+            position += sum(len(piece) for piece in pieces)
+        except (ExportError, StockDataError) as e:
+            logger.info(f"Size of {self.filename} not recorded: {e}")
+            return
+        cache.set(self._size_key, position, SIZE_TIMEOUT)
+
+    def known_size(self) -> Optional[int]:
+        """Return the byte size if an earlier export of the same data recorded it"""
+        return cache.get(self._size_key)
+
+
+def plan_export(tickers: List[str], period: str, interval: str, format: str = 'csv') -> ExportPlan:
+    """
+    Load the tickers' history through StockData.fetch_many, cached frames
+    first, and fix the version of each frame without keeping the frames.
+    Args:
+        tickers (List[str]): Stock ticker symbols, in export order
+        period (str): Time period
+        interval (str): Data interval
+        format (str): Key of FORMATS
+    Returns:
+        ExportPlan: The export; tickers without data are left out and listed in `errors`
+    Raises:
+        ExportError: If the format is unknown or no ticker has data
+    """
+    if format not in FORMATS:
+        raise ExportError(f"Unknown format '{format}'. Must be one of {sorted(FORMATS)}")
+    # Only the version of each frame is kept; the frames are read again one at a time when serialized
+    result = StockData.fetch_many(tickers, period, interval, summarize=frame_version)
+    versions = result.data
+    errors = {ticker: str(e) for ticker, e in result.errors.items()}
+    exported = [ticker for ticker in tickers if ticker in versions]
+    if not exported:
+        raise ExportError("No data available for the requested tickers")
+    return ExportPlan(exported, period, interval, format, versions, errors)
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range Range header ("bytes=500-", "bytes=500-999" or "bytes=-500").
+    Args:
+        header (str): Range header value
+        size (int): Byte size of the representation
+    Returns:
+        Optional[Tuple[int, int]]: [start, end) to send, or None to send everything
+            (unsupported units or several ranges, which a server may ignore)
+    Raises:
+        ValueError: If the range cannot be satisfied
+    """
+    units, _, spec = header.partition('=')
+    if units.strip() != 'bytes' or ',' in spec:
+        return None
+    first, sep, last = spec.strip().partition('-')
+    if not sep:
+        return None
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                raise ValueError("Empty suffix range")
+            return max(size - suffix, 0), size
+        start = int(first)
+        end = min(int(last) + 1, size) if last else size
+    except ValueError:
+        raise ValueError(f"Invalid range '{header}'")
+    if start >= size or end <= start:
+        raise ValueError(f"Range '{header}' is outside the {size} bytes")
+    return start, end
@@ -0,0 +1,329 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from enum import IntEnum
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from django.conf import settings
+
+from src.services.metrics import Sample, registry
+
+logger = logging.getLogger('stock_app')
+
+
+class ThrottledError(Exception):
+    """Raised by a scheduled call when the upstream signals it is throttling us"""
+    pass
+
+
+class Priority(IntEnum):
+    """Scheduling class of an upstream call; lower values are served first"""
+    INTERACTIVE = 0  # A user is waiting on a page load
+    REFRESH = 1  # Background refresh of a stale cache entry
+    BATCH = 2  # Warmup and batch jobs
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Args:
+            rate (float): Tokens added per second
+            capacity (float): Maximum tokens held, i.e. the largest burst
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        """
+        Take a token if one is available.
+        Returns:
+            float: 0 if a token was taken, otherwise seconds until one will be available
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def set_rate(self, rate: float) -> None:
+        """Change the refill rate, keeping the tokens accrued so far"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def drain(self) -> None:
+        """Drop all available tokens, so no burst follows"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = 0.0
+
+    def available(self) -> float:
+        """Return the number of tokens currently available"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class _Job:
+    __slots__ = ('priority', 'seq', 'fn', 'label', 'future', 'submitted', 'attempts')
+
+    def __init__(self, priority: int, seq: int, fn: Callable[[], Any], label: str):
+        self.priority = priority
+        self.seq = seq
+        self.fn = fn
+        self.label = label
+        self.future: Future = Future()
+        self.submitted = time.monotonic()
+        self.attempts = 0
+
+    def __lt__(self, other: '_Job') -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class FetchScheduler:
+    """
+    Central gate for upstream data calls.
+
+    Calls are queued by priority and dispatched to at most `max_concurrency`
+    worker threads, each dispatch taking a token from a rate-limiting bucket.
+    The highest-priority call is chosen only once a worker and a token are
+    both available, so interactive requests overtake queued batch work.
+    A call raising ThrottledError pauses all dispatching for an exponentially
+    growing, jittered backoff and is requeued in its place; the dispatch rate
+    is also halved, and recovers by RATE_RECOVERY of the configured rate per
+    successful call.
+    """
+
+    WAIT_SAMPLES = 1024  # Recent queue waits kept per priority for percentiles
+    MIN_RATE_FRACTION = 0.05  # Lowest dispatch rate after repeated throttling, relative to the configured rate
+    RATE_RECOVERY = 0.05  # Rate regained per successful call, relative to the configured rate
+
+    def __init__(self, rate: float, burst: float, max_concurrency: int, max_retries: int = 3,
+                 backoff: float = 2.0, backoff_max: float = 60.0):
+        """
+        Args:
+            rate (float): Upstream calls started per second, on average
+            burst (float): Calls that may start back to back after an idle period
+            max_concurrency (int): Calls running at once
+            max_retries (int): Times a throttled call is requeued before its error is raised
+            backoff (float): First pause after a throttling error, in seconds
+            backoff_max (float): Longest pause, in seconds
+        """
+        self.rate = rate
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+
+        self._cond = threading.Condition()
+        self._queue: List[_Job] = []
+        self._seq = itertools.count()
+        self._idle_workers = 0
+        self._handoff: Deque[_Job] = deque()
+        self._running = 0
+        self._paused_until = 0.0
+        self._consecutive_throttles = 0
+        self._waits: Dict[int, Deque[float]] = {p: deque(maxlen=self.WAIT_SAMPLES) for p in Priority}
+        self._stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'throttled': 0, 'retried': 0}
+
+        self._workers = [
+            threading.Thread(target=self._work, name=f'upstream-fetch-{i}', daemon=True)
+            for i in range(max_concurrency)
+        ]
+        self._dispatcher = threading.Thread(target=self._dispatch, name='upstream-dispatch', daemon=True)
+        for thread in self._workers + [self._dispatcher]:
+            thread.start()
+
+    def submit(self, fn: Callable[[], Any], priority: int = Priority.INTERACTIVE, label: str = '') -> Future:
+        """
+        Queue an upstream call.
+        Args:
+            fn (Callable[[], Any]): Blocking call to run
+            priority (int): Scheduling class, see Priority
+            label (str): Description used in logs
+        Returns:
+            Future: Resolves to the call's result or exception
+        """
+        with self._cond:
+            job = _Job(int(priority), next(self._seq), fn, label)
+            heapq.heappush(self._queue, job)
+            self._stats['submitted'] += 1
+            self._cond.notify_all()
+        return job.future
+
+    def run(self, fn: Callable[[], Any], priority: int = Priority.INTERACTIVE, label: str = '') -> Any:
+        """Queue an upstream call and wait for its result; see submit()"""
+        return self.submit(fn, priority, label).result()
+
+    def _dispatch(self) -> None:
+        """Hand the highest-priority queued call to an idle worker whenever a token is available"""
+        while True:
+            with self._cond:
+                while not self._queue or self._idle_workers == len(self._handoff):
+                    self._cond.wait()
+                pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                time.sleep(pause)
+                continue
+            wait = self.bucket.try_acquire()
+            if wait > 0:
+                time.sleep(wait)
+                continue
+            with self._cond:
+                job = heapq.heappop(self._queue)
+                self._waits[job.priority].append(time.monotonic() - job.submitted)
+                self._handoff.append(job)
+                self._cond.notify_all()
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                self._idle_workers += 1
+                self._cond.notify_all()
+                while not self._handoff:
+                    self._cond.wait()
+                job = self._handoff.popleft()
+                self._idle_workers -= 1
+                self._running += 1
+            try:
+                self._execute(job)
+            finally:
+                with self._cond:
+                    self._running -= 1
+
+    def _execute(self, job: _Job) -> None:
+        job.attempts += 1
+        try:
+            result = job.fn()
+        except ThrottledError as e:
+            self._throttled(job, e)
+            return
+        except BaseException as e:
+            with self._cond:
+                self._stats['failed'] += 1
+            job.future.set_exception(e)
+            return
+        with self._cond:
+            self._stats['completed'] += 1
+            self._consecutive_throttles = 0
+            if self.bucket.rate < self.rate:
+                self.bucket.set_rate(min(self.rate, self.bucket.rate + self.rate * self.RATE_RECOVERY))
+        job.future.set_result(result)
+
+    def _throttled(self, job: _Job, error: ThrottledError) -> None:
+        """Pause dispatching, and requeue the call in its original place unless it ran out of retries"""
+        with self._cond:
+            self._stats['throttled'] += 1
+            self._consecutive_throttles += 1
+            ceiling = min(self.backoff_max, self.backoff * 2 ** (self._consecutive_throttles - 1))
+            delay = random.uniform(ceiling / 2, ceiling)
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self.bucket.set_rate(max(self.rate * self.MIN_RATE_FRACTION, self.bucket.rate / 2))
+            self.bucket.drain()
+            retry = job.attempts <= self.max_retries
+            if retry:
+                self._stats['retried'] += 1
+                heapq.heappush(self._queue, job)
+                self._cond.notify_all()
+            else:
+                self._stats['failed'] += 1
+        logger.warning(f"Upstream throttled {job.label or 'call'}; pausing fetches for {delay:.1f}s"
+                       + ("" if retry else ", giving up"))
+        if not retry:
+            job.future.set_exception(error)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report scheduler metrics.
+        Returns:
+            Dict[str, Any]: Counters, queue depth per priority, running calls,
+                remaining backoff, available tokens, current dispatch rate, and
+                queue wait times per priority
+        """
+        with self._cond:
+            depth = {p.name.lower(): 0 for p in Priority}
+            for job in self._queue:
+                depth[Priority(job.priority).name.lower()] += 1
+            waits = {}
+            for priority, samples in self._waits.items():
+                ordered = sorted(samples)
+                waits[Priority(priority).name.lower()] = {
+                    'count': len(ordered),
+                    'p50': ordered[len(ordered) // 2] if ordered else 0.0,
+                    'p95': ordered[int(len(ordered) * 0.95)] if ordered else 0.0,
+                    'max': ordered[-1] if ordered else 0.0,
+                }
+            return {
+                **self._stats,
+                'queue_depth': depth,
+                'running': self._running,
+                'backoff_remaining': max(0.0, self._paused_until - time.monotonic()),
+                'tokens': self.bucket.available(),
+                'rate': self.bucket.rate,
+                'wait_seconds': waits,
+            }
+
+    def metric_samples(self) -> List[Sample]:
+        """Report stats() as samples for /metrics"""
+        stats = self.stats()
+        samples = [
+            Sample('stock_app_fetch_jobs_total', 'counter', "Upstream fetch jobs by outcome",
+                   stats[outcome], {'outcome': outcome})
+            for outcome in ('submitted', 'completed', 'failed', 'throttled', 'retried')
+        ]
+        for priority, depth in stats['queue_depth'].items():
+            samples.append(Sample('stock_app_fetch_queue_depth', 'gauge', "Upstream fetch jobs waiting to start",
+                                  depth, {'priority': priority}))
+        for priority, waits in stats['wait_seconds'].items():
+            for quantile in ('p50', 'p95'):
+                samples.append(Sample('stock_app_fetch_queue_wait_seconds', 'gauge',
+                                      "Recent queue wait of upstream fetch jobs",
+                                      waits[quantile], {'priority': priority, 'quantile': quantile}))
+        samples += [
+            Sample('stock_app_fetch_running', 'gauge', "Upstream fetch jobs running", stats['running']),
+            Sample('stock_app_fetch_rate', 'gauge', "Upstream calls the scheduler may start per second",
+                   stats['rate']),
+            Sample('stock_app_fetch_backoff_seconds', 'gauge', "Remaining pause after upstream rate limiting",
+                   stats['backoff_remaining']),
+        ]
+        return samples
+
+
+_scheduler: Optional[FetchScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_fetch_scheduler() -> FetchScheduler:
+    """Return the process-wide scheduler configured by settings.STOCK_FETCH_SCHEDULER"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                config = settings.STOCK_FETCH_SCHEDULER
+                _scheduler = FetchScheduler(
+                    rate=config['RATE'],
+                    burst=config['BURST'],
+                    max_concurrency=config['MAX_CONCURRENCY'],
+                    max_retries=config['MAX_RETRIES'],
+                    backoff=config['BACKOFF'],
+                    backoff_max=config['BACKOFF_MAX'],
+                )
+                registry.add_collector(_scheduler.metric_samples)
+    return _scheduler
@@ -0,0 +1,413 @@
+import asyncio
+import hashlib
+import json
+import logging
+import io
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.services.metrics import Sample, registry
+
+logger = logging.getLogger('stock_app')
+
+# Columns yfinance always returns that are zero for almost every bar
+SPARSE_COLUMNS = ('Dividends', 'Stock Splits', 'Capital Gains')
+# Largest absolute error accepted when storing a float column as float32
+FLOAT32_TOLERANCE = 1e-4
+COMPRESSION_LEVEL = 3
+
+FORMAT_COLUMNAR = b'C'
+# Frames with non-numeric columns or another index. Never pickle: the L2 directory is
+# shared, and unpickling a file written there would run whatever code it names
+FORMAT_PARQUET = b'Q'
+
+
+def _float32_is_safe(values: np.ndarray) -> bool:
+    narrowed = values.astype(np.float32).astype(np.float64)
+    with np.errstate(invalid='ignore'):
+        error = np.abs(narrowed - values)
+    error = error[~np.isnan(values)]
+    return error.size == 0 or float(error.max()) <= FLOAT32_TOLERANCE
+
+
+def _narrow_int(values: np.ndarray) -> np.ndarray:
+    if values.size == 0:
+        return values
+    for dtype in (np.uint8, np.uint16, np.uint32, np.int32):
+        info = np.iinfo(dtype)
+        if values.min() >= info.min and values.max() <= info.max:
+            return values.astype(dtype)
+    return values
+
+
+def frame_version(df: pd.DataFrame) -> str:
+    """
+    Return a short content hash of a frame, used to key values derived from it.
+    Args:
+        df (pd.DataFrame): Frame indexed by timestamp
+    Returns:
+        str: Hex digest that changes whenever the index or any value changes
+    """
+    digest = hashlib.blake2b(digest_size=12)
+    digest.update(np.ascontiguousarray(df.index.values).tobytes())
+    for column in df.columns:
+        digest.update(str(column).encode())
+        digest.update(np.ascontiguousarray(df[column].to_numpy()).tobytes())
+    return digest.hexdigest()
+
+
+def encode_frame(df: pd.DataFrame) -> bytes:
+    """
+    Serialize an OHLCV frame into a compact, compressed columnar payload.
+    Float columns are stored as float32 when that loses less than
+    FLOAT32_TOLERANCE, integer columns use the narrowest type that fits,
+    all-zero sparse columns are dropped and timestamps are delta-encoded.
+    Any other frame is written as Parquet.
+    Args:
+        df (pd.DataFrame): Frame indexed by timestamp
+    Returns:
+        bytes: Encoded frame
+    Raises:
+        ValueError: If the frame is not numeric and timestamp-indexed, and cannot be written as Parquet
+    """
+    numeric = all(pd.api.types.is_numeric_dtype(dtype) for dtype in df.dtypes)
+    if not numeric or not isinstance(df.index, pd.DatetimeIndex):
+        buffer = io.BytesIO()
+        try:
+            df.to_parquet(buffer, engine='pyarrow', compression=None)
+        except (ImportError, TypeError, ValueError) as e:
+            raise ValueError(f"Frame cannot be encoded: {e}")
+        return FORMAT_PARQUET + zlib.compress(buffer.getvalue(), COMPRESSION_LEVEL)
+
+    index = df.index.values.astype('datetime64[ns]').view('int64')
+    buffers = [np.diff(index, prepend=np.int64(0)).tobytes()]
+    columns, dropped = [], []
+    for column in df.columns:
+        values = df[column].to_numpy()
+        if column in SPARSE_COLUMNS and not values.any():
+            dropped.append([column, values.dtype.str])
+            continue
+        stored = values
+        if values.dtype.kind == 'f' and values.dtype.itemsize > 4 and _float32_is_safe(values):
+            stored = values.astype(np.float32)
+        elif values.dtype.kind in 'iu':
+            stored = _narrow_int(values)
+        columns.append([column, values.dtype.str, stored.dtype.str])
+        buffers.append(np.ascontiguousarray(stored).tobytes())
+
+    header = json.dumps({
+        'rows': len(df),
+        'tz': str(df.index.tz) if df.index.tz is not None else None,
+        'index_name': df.index.name,
+        'order': [str(column) for column in df.columns],
+        'columns': columns,
+        'dropped': dropped,
+    }).encode()
+    raw = struct.pack('<I', len(header)) + header + b''.join(buffers)
+    return FORMAT_COLUMNAR + zlib.compress(raw, COMPRESSION_LEVEL)
+
+
+def decode_frame(payload: bytes) -> pd.DataFrame:
+    """
+    Rebuild a frame produced by encode_frame(), restoring the original dtypes.
+    Args:
+        payload (bytes): Encoded frame
+    Returns:
+        pd.DataFrame: Decoded frame
+    Raises:
+        ValueError: If the payload is not in a known format
+        zlib.error, struct.error: If the payload is truncated or corrupt
+    """
+    if payload[:1] not in (FORMAT_COLUMNAR, FORMAT_PARQUET):
+        raise ValueError(f"Unknown frame format {payload[:1]!r}")
+    raw = zlib.decompress(payload[1:])
+    if payload[:1] == FORMAT_PARQUET:
+        return pd.read_parquet(io.BytesIO(raw), engine='pyarrow')
+
+    (header_len,) = struct.unpack_from('<I', raw)
+    header = json.loads(raw[4:4 + header_len])
+    rows = header['rows']
+    offset = 4 + header_len
+
+    index = np.cumsum(np.frombuffer(raw, dtype=np.int64, count=rows, offset=offset))
+    offset += rows * 8
+    data = {}
+    for column, original, stored in header['columns']:
+        stored_dtype = np.dtype(stored)
+        values = np.frombuffer(raw, dtype=stored_dtype, count=rows, offset=offset)
+        offset += rows * stored_dtype.itemsize
+        data[column] = values.astype(np.dtype(original))
+    for column, original in header['dropped']:
+        data[column] = np.zeros(rows, dtype=np.dtype(original))
+
+    dt_index = pd.DatetimeIndex(pd.to_datetime(index, unit='ns', utc=header['tz'] is not None))
+    if header['tz']:
+        dt_index = dt_index.tz_convert(header['tz'])
+    dt_index.name = header['index_name']
+    return pd.DataFrame(data, index=dt_index, columns=header['order'])
+
+
+class TieredFrameCache:
+    """
+    Two-tier cache for DataFrames.
+
+    L1 is an in-process LRU bounded by the in-memory size of the frames.
+    L2 is a directory of compressed frames shared by every worker on the
+    host, bounded by its size on disk. Entries carry a hard expiry and a
+    `fresh_until` deadline that callers use for stale-while-revalidate.
+    """
+
+    ENTRY_HEADER = struct.Struct('<dd')  # fresh_until, expires_at
+    L2_PRUNE_EVERY = 100  # Writes between L2 size checks
+
+    def __init__(self, l1_max_bytes: int, l2_dir: Optional[os.PathLike], l2_max_bytes: int):
+        self.l1_max_bytes = l1_max_bytes
+        self.l2_dir = Path(l2_dir) if l2_dir else None
+        self.l2_max_bytes = l2_max_bytes
+        self._lock = threading.Lock()
+        self._l1: 'OrderedDict[str, Tuple[pd.DataFrame, float, float, int]]' = OrderedDict()
+        self._l1_bytes = 0
+        self._l2_writes = 0
+        self._stats = {'l1_hits': 0, 'l2_hits': 0, 'misses': 0}
+
+    def _l2_path(self, key: str) -> Path:
+        return self.l2_dir / f"{hashlib.sha1(key.encode()).hexdigest()}.frame"
+
+    def _l1_put(self, key: str, df: pd.DataFrame, fresh_until: float, expires_at: float) -> None:
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        with self._lock:
+            self._l1_remove(key)
+            if nbytes > self.l1_max_bytes:
+                return
+            self._l1[key] = (df, fresh_until, expires_at, nbytes)
+            self._l1_bytes += nbytes
+            while self._l1_bytes > self.l1_max_bytes:
+                _, (_, _, _, evicted_bytes) = self._l1.popitem(last=False)
+                self._l1_bytes -= evicted_bytes
+
+    def _l1_remove(self, key: str) -> None:
+        entry = self._l1.pop(key, None)
+        if entry is not None:
+            self._l1_bytes -= entry[3]
+
+    def _l2_get(self, key: str) -> Optional[Tuple[pd.DataFrame, float, float]]:
+        try:
+            with open(self._l2_path(key), 'rb') as fh:
+                blob = fh.read()
+        except FileNotFoundError:
+            return None
+        try:
+            fresh_until, expires_at = self.ENTRY_HEADER.unpack_from(blob)
+            if time.time() >= expires_at:
+                return None
+            return decode_frame(blob[self.ENTRY_HEADER.size:]), fresh_until, expires_at
+        except (ValueError, zlib.error, struct.error) as e:
+            # Truncated or left by an older version; a miss, overwritten by the next set()
+            logger.warning("Discarding unreadable cache file for key %s: %s", key, e)
+            return None
+
+    def _l2_put(self, key: str, payload: bytes, fresh_until: float, expires_at: float) -> None:
+        self.l2_dir.mkdir(parents=True, exist_ok=True)
+        path = self._l2_path(key)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'wb') as fh:
+            fh.write(self.ENTRY_HEADER.pack(fresh_until, expires_at))
+            fh.write(payload)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._l2_writes += 1
+            prune = self._l2_writes % self.L2_PRUNE_EVERY == 0
+        if prune:
+            self._prune_l2()
+
+    def _l2_files(self):
+        if self.l2_dir is None or not self.l2_dir.exists():
+            return []
+        files = []
+        for entry in os.scandir(self.l2_dir):
+            if entry.name.endswith('.frame'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def _prune_l2(self) -> None:
+        """Delete the oldest L2 files until the tier fits in l2_max_bytes"""
+        files = sorted(self._l2_files())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.l2_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def get(self, key: str) -> Optional[Tuple[pd.DataFrame, float]]:
+        """
+        Look up a frame, promoting L2 hits into L1.
+        Args:
+            key (str): Cache key
+        Returns:
+            Optional[Tuple[pd.DataFrame, float]]: The frame and its fresh-until
+                epoch time, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is not None and now < entry[2]:
+                self._l1.move_to_end(key)
+                self._stats['l1_hits'] += 1
+                return entry[0], entry[1]
+            if entry is not None:
+                self._l1_remove(key)
+
+        if self.l2_dir is not None:
+            found = self._l2_get(key)
+            if found is not None:
+                df, fresh_until, expires_at = found
+                self._l1_put(key, df, fresh_until, expires_at)
+                with self._lock:
+                    self._stats['l2_hits'] += 1
+                return df, fresh_until
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    async def aget(self, key: str) -> Optional[Tuple[pd.DataFrame, float]]:
+        """
+        Async variant of get(). L1 is checked on the event loop; only an L1
+        miss, which reads from disk, is moved to a worker thread.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is not None and now < entry[2]:
+                self._l1.move_to_end(key)
+                self._stats['l1_hits'] += 1
+                return entry[0], entry[1]
+        return await asyncio.to_thread(self.get, key)
+
+    def set(self, key: str, df: pd.DataFrame, fresh_until: float, timeout: float) -> pd.DataFrame:
+        """
+        Store a frame in both tiers.
+        With L2 enabled, L1 holds the frame as decoded from its L2 encoding
+        rather than the original, so both tiers (and every worker) serve the
+        same values and the same frame_version() for a key.
+        Args:
+            key (str): Cache key
+            df (pd.DataFrame): Frame to cache
+            fresh_until (float): Epoch time after which the entry is stale
+            timeout (float): Seconds until the entry is dropped entirely
+        Returns:
+            pd.DataFrame: The frame as the cache will serve it; callers should use it in place of `df`
+        """
+        expires_at = time.time() + timeout
+        if self.l2_dir is None:
+            self._l1_put(key, df, fresh_until, expires_at)
+            return df
+
+        try:
+            payload = encode_frame(df)
+        except ValueError as e:
+            logger.warning("Caching %s in memory only: %s", key, e)
+            self._l1_put(key, df, fresh_until, expires_at)
+            return df
+        df = decode_frame(payload)
+        self._l1_put(key, df, fresh_until, expires_at)
+        try:
+            self._l2_put(key, payload, fresh_until, expires_at)
+        except OSError as e:
+            logger.warning("Could not write L2 cache entry for key %s: %s", key, e)
+        return df
+
+    def delete(self, key: str) -> None:
+        """Remove a key from both tiers"""
+        with self._lock:
+            self._l1_remove(key)
+        if self.l2_dir is not None:
+            try:
+                os.remove(self._l2_path(key))
+            except FileNotFoundError:
+                pass
+
+    def clear(self) -> None:
+        """Remove every entry from both tiers"""
+        with self._lock:
+            self._l1.clear()
+            self._l1_bytes = 0
+        for _, _, path in self._l2_files():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Report hit ratios and the size of each tier.
+        Returns:
+            Dict[str, float]: Hit counts and ratios, entry counts and bytes per tier
+        """
+        l2_files = self._l2_files()
+        with self._lock:
+            lookups = self._stats['l1_hits'] + self._stats['l2_hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'lookups': lookups,
+                'l1_hit_ratio': self._stats['l1_hits'] / lookups if lookups else 0.0,
+                'l2_hit_ratio': self._stats['l2_hits'] / lookups if lookups else 0.0,
+                'hit_ratio': (self._stats['l1_hits'] + self._stats['l2_hits']) / lookups if lookups else 0.0,
+                'l1_entries': len(self._l1),
+                'l1_bytes': self._l1_bytes,
+                'l2_entries': len(l2_files),
+                'l2_bytes': sum(size for _, size, _ in l2_files),
+            }
+
+    def metric_samples(self) -> List[Sample]:
+        """Report stats() as samples for /metrics"""
+        stats = self.stats()
+        samples = [
+            Sample('stock_app_cache_lookups_total', 'counter', "Cache lookups by result",
+                   stats[key], {'cache': 'frame', 'result': result})
+            for key, result in (('l1_hits', 'l1_hit'), ('l2_hits', 'l2_hit'), ('misses', 'miss'))
+        ]
+        samples.append(Sample('stock_app_cache_hit_ratio', 'gauge', "Share of cache lookups that were hits",
+                              stats['hit_ratio'], {'cache': 'frame'}))
+        for tier in ('l1', 'l2'):
+            samples.append(Sample('stock_app_cache_entries', 'gauge', "Entries held by a cache",
+                                  stats[f'{tier}_entries'], {'cache': 'frame', 'tier': tier}))
+            samples.append(Sample('stock_app_cache_bytes', 'gauge', "Bytes held by a cache",
+                                  stats[f'{tier}_bytes'], {'cache': 'frame', 'tier': tier}))
+        return samples
+
+
+_default_cache: Optional[TieredFrameCache] = None
+
+
+def get_frame_cache() -> TieredFrameCache:
+    """Return the process-wide frame cache configured by STOCK_FRAME_CACHE"""
+    global _default_cache
+    if _default_cache is None:
+        from django.conf import settings
+        config = settings.STOCK_FRAME_CACHE
+        _default_cache = TieredFrameCache(
+            l1_max_bytes=config['L1_MAX_BYTES'],
+            l2_dir=config.get('L2_DIR'),
+            l2_max_bytes=config['L2_MAX_BYTES'],
+        )
+        registry.add_collector(_default_cache.metric_samples)
+    return _default_cache
@@ -0,0 +1,255 @@
+import logging
+import math
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from src.services.frame_cache import frame_version
+from src.services.lru import LRUCache
+from src.services.resample import INTRADAY_STEPS
+
+logger = logging.getLogger('stock_app')
+
+SMA_WINDOWS = (20, 50)
+EMA_SPANS = (12, 26)
+RSI_PERIOD = 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+BOLLINGER_WINDOW, BOLLINGER_STDS = 20, 2.0
+VOLATILITY_WINDOW = 20
+
+TRADING_DAYS = 252
+SESSION_MINUTES = 390
+# Bars per year used to annualize volatility
+PERIODS_PER_YEAR: Dict[str, float] = {
+    **{interval: TRADING_DAYS * SESSION_MINUTES / (step.total_seconds() / 60) for interval, step in INTRADAY_STEPS.items()},
+    "1d": TRADING_DAYS,
+    "5d": TRADING_DAYS / 5,
+    "1wk": 52,
+    "1mo": 12,
+}
+
+# Block length of the closed-form EMA; keeps beta ** -k well inside float64 range
+EMA_BLOCK = 64
+
+# Internal recursion state kept for incremental updates but not returned
+_STATE_COLUMNS = ('_avg_gain', '_avg_loss')
+
+
+def sma(x: np.ndarray, window: int) -> np.ndarray:
+    """Simple moving average, NaN until `window` values are available"""
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        csum = np.cumsum(np.insert(x, 0, 0.0))
+        out[window - 1:] = (csum[window:] - csum[:-window]) / window
+    return out
+
+
+def rolling_std(x: np.ndarray, window: int, ddof: int = 0) -> np.ndarray:
+    """Rolling standard deviation, NaN until `window` values are available"""
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        out[window - 1:] = sliding_window_view(x, window).std(axis=-1, ddof=ddof)
+    return out
+
+
+def ema_filter(x: np.ndarray, alpha: float, seed: float) -> np.ndarray:
+    """
+    Exponential smoothing y[t] = (1 - alpha) * y[t-1] + alpha * x[t], with y[-1] = seed.
+
+    The recursion is evaluated in closed form over blocks of EMA_BLOCK values:
+    y[t] = beta^(t+1) * (seed + alpha * sum_{i<=t} x[i] / beta^(i+1)), so each
+    block is a handful of array operations instead of a per-value loop.
+    """
+    out = np.empty(len(x))
+    beta = 1.0 - alpha
+    if beta == 0.0:
+        out[:] = x
+        return out
+    prev = seed
+    for start in range(0, len(x), EMA_BLOCK):
+        block = x[start:start + EMA_BLOCK]
+        powers = beta ** np.arange(1, len(block) + 1)
+        out[start:start + len(block)] = powers * (prev + alpha * np.cumsum(block / powers))
+        prev = out[start + len(block) - 1]
+    return out
+
+
+def _span_alpha(span: int) -> float:
+    return 2.0 / (span + 1.0)
+
+
+def _ema_tail(x: np.ndarray, alpha: float, prev: Optional[np.ndarray], start: int) -> np.ndarray:
+    """EMA of x[start:], continuing from prev[start - 1], or seeded with x[0] from scratch"""
+    seed = prev[start - 1] if start > 0 else x[0]
+    return ema_filter(x[start:], alpha, seed)
+
+
+def _window_tail(fn, x: np.ndarray, window: int, start: int, lookback: int = 0) -> np.ndarray:
+    """Evaluate a rolling function only over the rows from `start`, with the context it needs"""
+    context = x[max(0, start - window + 1 - lookback):]
+    return fn(context)[-(len(x) - start):]
+
+
+def _compute(close: np.ndarray, periods_per_year: float, prev: Optional[Dict[str, np.ndarray]],
+             start: int) -> Dict[str, np.ndarray]:
+    """
+    Compute every indicator for close[start:], keeping prev's values for rows before `start`.
+    """
+    n = len(close)
+    tail: Dict[str, np.ndarray] = {}
+
+    for window in SMA_WINDOWS:
+        tail[f'sma_{window}'] = _window_tail(lambda c, w=window: sma(c, w), close, window, start)
+    for span in EMA_SPANS:
+        key = f'ema_{span}'
+        tail[key] = _ema_tail(close, _span_alpha(span), prev and prev[key], start)
+
+    # RSI with Wilder smoothing of gains and losses, starting at the second bar
+    if n > 1:
+        first = max(start, 1)
+        delta = close[first:] - close[first - 1:-1]
+        gains, losses = np.clip(delta, 0, None), np.clip(-delta, 0, None)
+        alpha = 1.0 / RSI_PERIOD
+        if first > 1:
+            avg_gain = ema_filter(gains, alpha, prev['_avg_gain'][first - 1])
+            avg_loss = ema_filter(losses, alpha, prev['_avg_loss'][first - 1])
+        else:
+            avg_gain = ema_filter(gains, alpha, gains[0])
+            avg_loss = ema_filter(losses, alpha, losses[0])
+        pad = np.full(first - start, np.nan)
+        tail['_avg_gain'] = np.concatenate([pad, avg_gain])
+        tail['_avg_loss'] = np.concatenate([pad, avg_loss])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = 100.0 - 100.0 / (1.0 + tail['_avg_gain'] / tail['_avg_loss'])
+        tail['rsi'] = np.where(tail['_avg_loss'] == 0, 100.0, rsi)
+        tail['rsi'][:first - start] = np.nan
+    else:
+        tail['_avg_gain'] = tail['_avg_loss'] = tail['rsi'] = np.full(n - start, np.nan)
+
+    macd = tail[f'ema_{MACD_FAST}'] - tail[f'ema_{MACD_SLOW}']
+    full_macd = macd if start == 0 else np.concatenate([prev['macd'][:start], macd])
+    tail['macd'] = macd
+    tail['macd_signal'] = _ema_tail(full_macd, _span_alpha(MACD_SIGNAL), prev and prev['macd_signal'], start)
+    tail['macd_hist'] = macd - tail['macd_signal']
+
+    mid = tail[f'sma_{BOLLINGER_WINDOW}'] if BOLLINGER_WINDOW in SMA_WINDOWS else \
+        _window_tail(lambda c: sma(c, BOLLINGER_WINDOW), close, BOLLINGER_WINDOW, start)
+    band = BOLLINGER_STDS * _window_tail(lambda c: rolling_std(c, BOLLINGER_WINDOW), close, BOLLINGER_WINDOW, start)
+    tail['bb_mid'], tail['bb_upper'], tail['bb_lower'] = mid, mid + band, mid - band
+
+    def annualized_volatility(c: np.ndarray) -> np.ndarray:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = np.concatenate([[np.nan], np.diff(np.log(c))])
+        return rolling_std(returns, VOLATILITY_WINDOW, ddof=1) * math.sqrt(periods_per_year)
+
+    # Returns need one more close than the window
+    tail['volatility'] = _window_tail(annualized_volatility, close, VOLATILITY_WINDOW, start, lookback=1)
+
+    if start == 0:
+        return tail
+    return {key: np.concatenate([prev[key][:start], values]) for key, values in tail.items()}
+
+
+@dataclass
+class _SeriesState:
+    """Last computed series for a (ticker, interval), used for incremental updates"""
+    timestamps: np.ndarray
+    close: np.ndarray
+    arrays: Dict[str, np.ndarray]
+
+
+class IndicatorEngine:
+    """
+    Computes SMA, EMA, RSI, MACD, Bollinger bands and annualized volatility
+    over OHLCV frames.
+
+    Results are memoized per (ticker, interval, data version). When a frame
+    extends the one last computed for the same (ticker, interval), only the
+    new bars and the last previously seen bar, which may have been
+    incomplete, are computed.
+    """
+
+    def __init__(self, memo_entries: int = 256, state_entries: int = 1024):
+        self._memo = LRUCache(max_entries=memo_entries)
+        self._states = LRUCache(max_entries=state_entries)
+
+    @staticmethod
+    def _reusable_rows(state: _SeriesState, timestamps: np.ndarray, close: np.ndarray) -> int:
+        """Return how many leading rows of the previous result are still valid"""
+        # The last previously seen bar may have been in progress, so it is recomputed
+        rows = len(state.timestamps) - 1
+        if rows <= 0 or len(timestamps) <= rows:
+            return 0
+        if not np.array_equal(state.timestamps[:rows], timestamps[:rows]):
+            return 0
+        if not np.array_equal(state.close[:rows], close[:rows]):
+            return 0
+        return rows
+
+    def compute(self, ticker: str, interval: str, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Compute indicators for a frame.
+        Args:
+            ticker (str): Stock ticker symbol
+            interval (str): Data interval, used to annualize volatility
+            df (pd.DataFrame): Historical price data with a 'Close' column
+        Returns:
+            pd.DataFrame: One column per indicator, aligned with df's index
+        """
+        memo_key = (ticker, interval, frame_version(df))
+        result = self._memo.get(memo_key)
+        if result is not None:
+            return result
+
+        close = df['Close'].to_numpy(dtype=np.float64)
+        timestamps = df.index.values.astype('datetime64[ns]').view('int64')
+        state: Optional[_SeriesState] = self._states.get((ticker, interval))
+        start = self._reusable_rows(state, timestamps, close) if state is not None else 0
+
+        if len(close):
+            arrays = _compute(close, PERIODS_PER_YEAR.get(interval, TRADING_DAYS),
+                              state.arrays if start else None, start)
+        else:
+            arrays = {}
+        if start:
+            logger.debug(f"Updated indicators for {ticker} ({interval}) from bar {start} of {len(close)}")
+        self._states.set((ticker, interval), _SeriesState(timestamps, close, arrays))
+
+        result = pd.DataFrame(
+            {key: values for key, values in arrays.items() if key not in _STATE_COLUMNS},
+            index=df.index,
+        )
+        self._memo.set(memo_key, result)
+        return result
+
+    def summary(self, ticker: str, interval: str, df: pd.DataFrame) -> Dict[str, float]:
+        """
+        Return a compact numeric snapshot of the latest indicator values.
+        Args:
+            ticker (str): Stock ticker symbol
+            interval (str): Data interval
+            df (pd.DataFrame): Historical price data with a 'Close' column
+        Returns:
+            Dict[str, float]: Latest close, window change and indicator values; unavailable values are omitted
+        """
+        if df.empty:
+            return {}
+        indicators = self.compute(ticker, interval, df)
+        last = indicators.iloc[-1]
+        close = df['Close'].to_numpy(dtype=np.float64)
+        values = {
+            'close': close[-1],
+            'change_pct': (close[-1] / close[0] - 1.0) * 100.0,
+            **{key: last[key] for key in indicators.columns if key != 'bb_mid'},
+        }
+        band_width = last['bb_upper'] - last['bb_lower']
+        if band_width:
+            # Position within the Bollinger band: 0 at the lower band, 1 at the upper band
+            values['bb_percent_b'] = (close[-1] - last['bb_lower']) / band_width
+        return {key: round(float(value), 4) for key, value in values.items() if np.isfinite(value)}
+
+
+default_engine = IndicatorEngine()
@@ -0,0 +1,70 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+
+class LimiterFullError(Exception):
+    """Raised when no slot is free and the wait queue is full, or the wait timed out"""
+    pass
+
+
+class AsyncLimiter:
+    """
+    Caps the number of concurrent async operations.
+
+    Callers beyond the cap wait for a slot in a bounded queue; once the queue
+    is full further callers fail immediately instead of piling up. A limiter
+    belongs to the event loop it is first used on.
+    """
+
+    def __init__(self, max_concurrency: int, max_waiting: int):
+        """
+        Args:
+            max_concurrency (int): Operations allowed to run at once
+            max_waiting (int): Callers allowed to wait for a slot
+        """
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._active = 0
+        self._waiting = 0
+        self._stats = {'admitted': 0, 'rejected': 0, 'timed_out': 0}
+
+    @asynccontextmanager
+    async def slot(self, timeout: Optional[float] = None) -> AsyncIterator[None]:
+        """
+        Hold a slot for the duration of the block.
+        Args:
+            timeout (Optional[float]): Seconds to wait for a slot, or None to wait indefinitely
+        Raises:
+            LimiterFullError: If the wait queue is full or no slot freed up in time
+        """
+        # Admission counts callers rather than the semaphore, which a caller
+        # only takes after its first suspension
+        if self._active + self._waiting >= self.max_concurrency + self.max_waiting:
+            self._stats['rejected'] += 1
+            raise LimiterFullError(f"{self._active} running and {self._waiting} waiting")
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self._stats['timed_out'] += 1
+            raise LimiterFullError(f"No slot freed up within {timeout}s") from None
+        finally:
+            self._waiting -= 1
+
+        self._stats['admitted'] += 1
+        self._active += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Report limiter counters.
+        Returns:
+            Dict[str, int]: Admitted, rejected and timed-out callers, plus current active and waiting counts
+        """
+        return {**self._stats, 'active': self._active, 'waiting': self._waiting}
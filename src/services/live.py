@@ -0,0 +1,347 @@
+import asyncio
+import json
+import logging
+import threading
+import weakref
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from src.services.chart_options import PERIOD_INTERVAL_MAP
+from src.services.metrics import Sample, registry
+
+logger = logging.getLogger('stock_app')
+
+# Pushed series, keyed by the name used in the chart_data payload
+BAR_COLUMNS = {'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'}
+
+# Client reconnect delay sent in the first event, in milliseconds
+RECONNECT_MS = 5000
+
+
+def live_period(interval: str) -> str:
+    """Return the shortest period offered for an interval, the window a poller reads"""
+    for period, intervals in PERIOD_INTERVAL_MAP.items():
+        if interval in intervals:
+            return period
+    raise ValueError(f"Invalid interval '{interval}'")
+
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Format a server-sent event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def bars_payload(df: pd.DataFrame) -> dict:
+    """Epoch-millisecond timestamps and rounded OHLCV arrays of some bars, NaN as null"""
+    payload = {'t': df.index.values.astype('datetime64[ms]').view('int64').tolist()}
+    for key, column in BAR_COLUMNS.items():
+        if column in df.columns:
+            values = np.round(df[column].to_numpy(dtype=float), 4)
+            payload[key] = [None if np.isnan(v) else v for v in values.tolist()]
+    return payload
+
+
+def changed_bars(previous: Optional[pd.DataFrame], current: pd.DataFrame) -> pd.DataFrame:
+    """
+    Return the bars of `current` a viewer of `previous` has not seen: bars
+    after the last previous one, and that one again if it was revised (the
+    bar still in progress).
+    """
+    if previous is None or previous.empty:
+        return current
+    last = previous.index[-1]
+    tail = current[current.index >= last]
+    if len(tail) and tail.index[0] == last:
+        columns = [column for column in BAR_COLUMNS.values() if column in current.columns]
+        if tail.iloc[:1][columns].equals(previous.iloc[-1:][columns]):
+            tail = tail.iloc[1:]
+    return tail
+
+
+class QuoteSource(ABC):
+    """Where pollers read bars from. Subclasses implement fetch()."""
+
+    @abstractmethod
+    async def fetch(self, ticker: str, interval: str) -> pd.DataFrame:
+        """
+        Return the latest bars of a ticker, oldest first.
+        Raises:
+            Exception: Any error is reported to subscribers and the poll retried
+        """
+
+
+class StockDataQuoteSource(QuoteSource):
+    """
+    Bars through StockData, for the shortest period offered for the interval.
+    Polls within the cache TTL are cache hits, shared with every worker
+    process through the frame cache; upstream is only called when the
+    interval's bars can have changed.
+    """
+
+    async def fetch(self, ticker: str, interval: str) -> pd.DataFrame:
+        from src.services.yfinance_service import StockData
+
+        return await StockData(ticker, live_period(interval), interval).aget_historical_data()
+
+
+class Subscription:
+    """One viewer of a (ticker, interval) pair, with a bounded queue of pending events"""
+
+    def __init__(self, key: Tuple[str, str], since: Optional[int], queue_size: int):
+        self.key = key
+        self.since = since  # Epoch ms of the viewer's last bar; bars from there on are sent first
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.caught_up = False
+        self.closed = False
+
+    def offer(self, event: str) -> bool:
+        """Queue an event without waiting; False if the viewer has fallen QUEUE_SIZE events behind"""
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+
+class _Poller:
+    """Polls one (ticker, interval) pair while it has subscribers and fans new bars out to them"""
+
+    def __init__(self, hub: 'LiveHub', key: Tuple[str, str]):
+        self.hub = hub
+        self.key = key
+        self.subscribers: Set[Subscription] = set()
+        self.frame: Optional[pd.DataFrame] = None
+        self.failing = False
+        self.task = asyncio.get_running_loop().create_task(self._run(), name=f"live-poller:{key[0]}:{key[1]}")
+        self.stop_handle: Optional[asyncio.TimerHandle] = None
+
+    async def _run(self) -> None:
+        ticker, interval = self.key
+        while True:
+            self.hub.polls += 1
+            try:
+                frame = await self.hub.source.fetch(ticker, interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not self.failing:
+                    logger.warning(f"Live poll failed for {ticker} ({interval}): {e}")
+                    self.broadcast(sse_event({'error': str(e)}, event='error'))
+                self.failing = True
+            else:
+                self.failing = False
+                self.update(frame)
+            await asyncio.sleep(self.hub.poll_seconds)
+
+    def update(self, frame: pd.DataFrame) -> None:
+        """Send the bars that changed since the last poll; catch up subscribers waiting for a first frame"""
+        previous, self.frame = self.frame, frame
+        if previous is not None:
+            changed = changed_bars(previous, frame)
+            if len(changed):
+                # Serialized once for every subscriber
+                self.broadcast(sse_event(bars_payload(changed), event='bars'), caught_up_only=True)
+        for subscription in [s for s in self.subscribers if not s.caught_up]:
+            self.catch_up(subscription)
+
+    def catch_up(self, subscription: Subscription) -> None:
+        """Send a new subscriber the bars from its `since` on, or only the last bar without one"""
+        if self.frame is None:
+            return
+        if subscription.since is not None:
+            timestamps = self.frame.index.values.astype('datetime64[ms]').view('int64')
+            bars = self.frame[timestamps >= subscription.since]
+        else:
+            bars = self.frame.iloc[-1:]
+        subscription.caught_up = True
+        if len(bars):
+            self.deliver(subscription, sse_event(bars_payload(bars), event='bars'))
+
+    def broadcast(self, event: str, caught_up_only: bool = False) -> None:
+        for subscription in list(self.subscribers):
+            if subscription.caught_up or not caught_up_only:
+                self.deliver(subscription, event)
+
+    def deliver(self, subscription: Subscription, event: str) -> None:
+        """
+        Queue an event for one subscriber. A subscriber whose queue is full
+        is not read fast enough: rather than buffering without bound or
+        holding up the others, its queue is replaced by a single `resync`
+        event and the subscription ends, so the viewer reloads the chart.
+        """
+        if subscription.closed or subscription.offer(event):
+            return
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(sse_event({'reason': 'lagged'}, event='resync'))
+        subscription.closed = True
+        self.hub.resyncs += 1
+        logger.info(f"Live subscriber of {self.key[0]} ({self.key[1]}) fell behind; asked to resync")
+
+
+class LiveHub:
+    """
+    Live bar updates for many viewers with one upstream poller per
+    (ticker, interval) pair.
+
+    The first subscriber of a pair starts its poller; every later one is
+    only added to the poller's fan-out, so a thousand viewers of a symbol
+    cost one poll per POLL_SECONDS. Each poll's changes are serialized once
+    and queued for every subscriber. A subscriber keeps at most QUEUE_SIZE
+    events; one that falls further behind is told to resync rather than
+    slowing the others down or growing memory. When the last subscriber
+    leaves, the poller stops after LINGER_SECONDS, which absorbs page
+    reloads and reconnects.
+
+    A hub and its pollers belong to one event loop; see get_live_hub().
+    """
+
+    def __init__(self, source: QuoteSource, poll_seconds: float = 15.0, queue_size: int = 32,
+                 linger_seconds: float = 10.0, heartbeat_seconds: float = 15.0):
+        """
+        Args:
+            source (QuoteSource): Where pollers read bars from
+            poll_seconds (float): Seconds between polls of a pair
+            queue_size (int): Events a subscriber may fall behind before it is asked to resync
+            linger_seconds (float): Seconds a poller keeps running without subscribers
+            heartbeat_seconds (float): Seconds without events after which a keep-alive comment is sent
+        """
+        self.source = source
+        self.poll_seconds = poll_seconds
+        self.queue_size = queue_size
+        self.linger_seconds = linger_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self._pollers: Dict[Tuple[str, str], _Poller] = {}
+        self.polls = 0
+        self.resyncs = 0
+
+    def subscribe(self, ticker: str, interval: str, since: Optional[int] = None) -> Subscription:
+        """
+        Subscribe to the bars of a pair, starting its poller if needed.
+        Args:
+            ticker (str): Stock ticker symbol
+            interval (str): Data interval
+            since (Optional[int]): Epoch ms of the viewer's last bar; bars from there on are sent first
+        Returns:
+            Subscription: Read with events(), release with unsubscribe()
+        """
+        key = (ticker.upper(), interval)
+        poller = self._pollers.get(key)
+        if poller is None:
+            poller = self._pollers[key] = _Poller(self, key)
+            logger.info(f"Started live poller for {key[0]} ({interval})")
+        if poller.stop_handle is not None:
+            poller.stop_handle.cancel()
+            poller.stop_handle = None
+        subscription = Subscription(key, since, self.queue_size)
+        poller.subscribers.add(subscription)
+        poller.catch_up(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Remove a subscriber; its pair's poller stops LINGER_SECONDS after the last one leaves"""
+        subscription.closed = True
+        poller = self._pollers.get(subscription.key)
+        if poller is None:
+            return
+        poller.subscribers.discard(subscription)
+        if not poller.subscribers and poller.stop_handle is None:
+            loop = asyncio.get_running_loop()
+            poller.stop_handle = loop.call_later(self.linger_seconds, self._stop, poller)
+
+    def _stop(self, poller: _Poller) -> None:
+        if poller.subscribers or self._pollers.get(poller.key) is not poller:
+            return
+        del self._pollers[poller.key]
+        poller.task.cancel()
+        logger.info(f"Stopped live poller for {poller.key[0]} ({poller.key[1]})")
+
+    async def events(self, subscription: Subscription) -> AsyncIterator[str]:
+        """
+        Yield a subscription's events as server-sent event text, with
+        keep-alive comments while there are none. Ends after a resync.
+        """
+        yield f"retry: {RECONNECT_MS}\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), self.heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield event
+            if subscription.closed and subscription.queue.empty():
+                return
+
+    async def stream(self, ticker: str, interval: str, since: Optional[int] = None) -> AsyncIterator[str]:
+        """
+        Subscribe and yield the events until the client disconnects, which
+        cancels this generator under ASGI, or is asked to resync.
+        """
+        subscription = self.subscribe(ticker, interval, since)
+        try:
+            async for event in self.events(subscription):
+                yield event
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'pollers': len(self._pollers),
+            'subscribers': sum(len(poller.subscribers) for poller in self._pollers.values()),
+            'polls': self.polls,
+            'resyncs': self.resyncs,
+        }
+
+
+# One hub per event loop: pollers are tasks of the loop that serves their subscribers
+_hubs: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, LiveHub]' = weakref.WeakKeyDictionary()
+_hubs_lock = threading.Lock()
+_collector_added = False
+
+
+def get_live_hub() -> LiveHub:
+    """
+    Return the hub of the running event loop, created from
+    settings.STOCK_LIVE on first use. Under ASGI a worker process has one
+    loop and so one poller per pair for all of its connections.
+    """
+    global _collector_added
+    loop = asyncio.get_running_loop()
+    with _hubs_lock:
+        hub = _hubs.get(loop)
+        if hub is None:
+            config = settings.STOCK_LIVE
+            hub = _hubs[loop] = LiveHub(
+                import_string(config['SOURCE'])(),
+                poll_seconds=config['POLL_SECONDS'],
+                queue_size=config['QUEUE_SIZE'],
+                linger_seconds=config['LINGER_SECONDS'],
+                heartbeat_seconds=config['HEARTBEAT_SECONDS'],
+            )
+            if not _collector_added:
+                registry.add_collector(metric_samples)
+                _collector_added = True
+    return hub
+
+
+def metric_samples() -> List[Sample]:
+    """Report the stats() of every hub as samples for /metrics"""
+    totals = {'pollers': 0, 'subscribers': 0, 'polls': 0, 'resyncs': 0}
+    with _hubs_lock:
+        hubs = list(_hubs.values())
+    for hub in hubs:
+        for name, value in hub.stats().items():
+            totals[name] += value
+    return [
+        Sample('stock_app_live_pollers', 'gauge', "Live (ticker, interval) pollers running", totals['pollers']),
+        Sample('stock_app_live_subscribers', 'gauge', "Live update subscribers connected", totals['subscribers']),
+        Sample('stock_app_live_polls_total', 'counter', "Polls of the live quote source", totals['polls']),
+        Sample('stock_app_live_resyncs_total', 'counter', "Live subscribers asked to resync after falling behind",
+               totals['resyncs']),
+    ]
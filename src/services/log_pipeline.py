@@ -0,0 +1,119 @@
+import itertools
+import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional
+
+from src.services.metrics import registry
+
+LOG_RECORDS_DROPPED = registry.counter(
+    'stock_app_log_records_dropped_total', "Log records dropped because the log queue was full")
+
+# Records waiting for the logging thread before new ones are dropped
+DEFAULT_QUEUE_SIZE = 10000
+
+
+class QueuedRotatingFileHandler(QueueHandler):
+    """
+    Writes records to a rotating log file from a background thread.
+
+    The request thread only puts the record on a bounded queue. The message
+    is not formatted there: the file handler formats it on the listener
+    thread, so log arguments must not be mutated after the call. When the
+    queue is full the record is dropped and counted rather than blocking the
+    caller. Configured from settings.LOGGING like any handler class; the
+    formatter set on it is used for the file.
+    """
+
+    def __init__(self, filename: str, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, encoding: str = 'utf-8'):
+        """
+        Args:
+            filename (str): Log file path
+            max_bytes (int): Size at which the file is rotated
+            backup_count (int): Rotated files kept
+            queue_size (int): Records buffered for the logging thread
+            encoding (str): File encoding
+        """
+        super().__init__(queue.Queue(queue_size))
+        self.target = RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count,
+                                          encoding=encoding, delay=True)
+        self._listener: Optional[QueueListener] = None
+        self._listener_pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+        self._start_listener()
+
+    def _start_listener(self) -> None:
+        with self._start_lock:
+            # A forked worker inherits the queue but not the listener thread
+            if self._listener_pid != os.getpid():
+                self._listener = QueueListener(self.queue, self.target)
+                self._listener.start()
+                self._listener_pid = os.getpid()
+
+    def setFormatter(self, fmt: Optional[logging.Formatter]) -> None:
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Pass the record through unformatted; the file handler formats it on the logging thread"""
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self._listener_pid != os.getpid():
+            self._start_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+    def flush(self) -> None:
+        """Wait until the queued records are written"""
+        if self._listener is not None and self._listener_pid == os.getpid():
+            self.queue.join()
+        self.target.flush()
+
+    def close(self) -> None:
+        """Write out the queued records and stop the logging thread"""
+        with self._start_lock:
+            if self._listener is not None and self._listener_pid == os.getpid():
+                self._listener.stop()
+            self._listener = self._listener_pid = None
+        self.target.close()
+        super().close()
+
+
+def sampled(event: str) -> Dict[str, str]:
+    """
+    Tag a log call as a high-volume event thinned out by SamplingFilter:
+    ``logger.info("Cache hit for key: %s", key, extra=sampled('cache_hit'))``.
+    """
+    return {'sample_event': event}
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps one in every N records of each tagged event (see sampled()).
+    Untagged records and events without a rate always pass. The kept record
+    carries `sample_every`, the number of events it stands for.
+    """
+
+    def __init__(self, every: Optional[Dict[str, int]] = None):
+        """
+        Args:
+            every (Optional[Dict[str, int]]): Keep one record in this many, per event
+        """
+        super().__init__()
+        self.every = dict(every or {})
+        self._counters = {event: itertools.count() for event in self.every}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, 'sample_event', None)
+        counter = self._counters.get(event)
+        if counter is None:
+            return True
+        every = self.every[event]
+        record.sample_every = every
+        return next(counter) % every == 0
@@ -0,0 +1,85 @@
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+import pandas as pd
+
+from src.services.resample import INTRADAY_STEPS
+
+# Regular trading session of the exchange the app charts (NYSE/Nasdaq).
+# Exchange holidays are not modelled; they are treated as short-TTL trading days.
+EXCHANGE_TZ = 'America/New_York'
+SESSION_OPEN = time(9, 30)
+SESSION_CLOSE = time(16, 0)
+# Upstream keeps revising the last bars for a while after the close
+POST_CLOSE_SETTLE = timedelta(minutes=15)
+
+# Freshness of cached bars while the session is live, in seconds
+LIVE_INTRADAY_MAX_TTL = 300  # Intraday bars expire after one bar length, capped at this
+LIVE_DAILY_TTL = 600
+LIVE_COARSE_TTL = 3600  # Weekly and monthly bars
+MIN_TTL = 60
+
+
+def _now(now: Optional[pd.Timestamp]) -> pd.Timestamp:
+    if now is None:
+        return pd.Timestamp.now(tz=EXCHANGE_TZ)
+    return now.tz_convert(EXCHANGE_TZ) if now.tz is not None else now.tz_localize(EXCHANGE_TZ)
+
+
+def _session_time(day: date, at: time) -> pd.Timestamp:
+    return pd.Timestamp(datetime.combine(day, at)).tz_localize(EXCHANGE_TZ)
+
+
+def is_session_live(now: Optional[pd.Timestamp] = None) -> bool:
+    """
+    Return True while bars can still change: during the regular session and
+    shortly after the close.
+    Args:
+        now (Optional[pd.Timestamp]): Reference time, defaults to the current time
+    Returns:
+        bool: Whether the latest bars are still live
+    """
+    now = _now(now)
+    if now.dayofweek >= 5:
+        return False
+    day = now.date()
+    return _session_time(day, SESSION_OPEN) <= now < _session_time(day, SESSION_CLOSE) + POST_CLOSE_SETTLE
+
+
+def next_session_open(now: Optional[pd.Timestamp] = None) -> pd.Timestamp:
+    """
+    Return the start of the next regular session after `now`.
+    Args:
+        now (Optional[pd.Timestamp]): Reference time, defaults to the current time
+    Returns:
+        pd.Timestamp: Next session open in exchange time
+    """
+    now = _now(now)
+    day = now.date()
+    if now >= _session_time(day, SESSION_OPEN):
+        day += timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return _session_time(day, SESSION_OPEN)
+
+
+def cache_ttl(interval: str, now: Optional[pd.Timestamp] = None) -> int:
+    """
+    Return how long bars of an interval stay fresh in the cache.
+    Outside trading hours bars cannot change until the next session opens,
+    so they stay fresh until then. During the session the TTL follows the
+    bar length.
+    Args:
+        interval (str): Data interval
+        now (Optional[pd.Timestamp]): Reference time, defaults to the current time
+    Returns:
+        int: Freshness lifetime in seconds
+    """
+    now = _now(now)
+    if not is_session_live(now):
+        return max(int((next_session_open(now) - now).total_seconds()), MIN_TTL)
+    if interval in INTRADAY_STEPS:
+        return max(min(int(INTRADAY_STEPS[interval].total_seconds()), LIVE_INTRADAY_MAX_TTL), MIN_TTL)
+    if interval == "1d":
+        return LIVE_DAILY_TTL
+    return LIVE_COARSE_TTL
@@ -0,0 +1,290 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds; they span a frame cache hit up to a slow upstream call
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}" for labels, v in values]
+        return lines
+
+
+class Gauge(Counter):
+    """Value that goes up and down, e.g. requests in flight"""
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    @contextmanager
+    def track(self, *labels: str) -> Iterator[None]:
+        """Count the enclosed block as in progress"""
+        self.inc(*labels)
+        try:
+            yield
+        finally:
+            self.dec(*labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with optional labels. Observing costs one bisect
+    and a few additions under a lock, cheap enough for every request.
+    """
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # Per label set: [count per bucket (the last one is +Inf), sum]
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def count(self, *labels: str) -> int:
+        with self._lock:
+            series = self._series.get(labels)
+            return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((labels, (list(counts), total[0])) for labels, (counts, total) in self._series.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+@dataclass
+class Sample:
+    """A value reported by a collector"""
+    name: str
+    type: str  # "counter" or "gauge"
+    help: str
+    value: float
+    labels: Dict[str, str] = field(default_factory=dict)
+
+
+# Returns current values read from elsewhere, e.g. cache statistics
+Collector = Callable[[], List[Sample]]
+
+
+class MetricsRegistry:
+    """The metrics of one process, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._collectors: List[Collector] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, collector: Collector) -> None:
+        """Report the samples `collector` returns each time metrics are rendered"""
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        Render every metric and collected sample.
+        Returns:
+            str: Prometheus text exposition format, version 0.0.4
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+
+        families: Dict[str, List[Sample]] = {}
+        for collector in collectors:
+            for sample in collector():
+                families.setdefault(sample.name, []).append(sample)
+        for name, samples in families.items():
+            lines.append(f"# HELP {name} {samples[0].help}")
+            lines.append(f"# TYPE {name} {samples[0].type}")
+            for sample in samples:
+                labels = _format_labels(list(sample.labels), list(sample.labels.values()))
+                lines.append(f"{name}{labels} {_format_value(sample.value)}")
+        return "\n".join(lines) + "\n"
+
+
+def cache_samples(cache: str, stats: Dict[str, float]) -> List[Sample]:
+    """Lookup counters, hit ratio and size of an LRUCache (see LRUCache.stats()), as samples"""
+    return [
+        Sample('stock_app_cache_lookups_total', 'counter', "Cache lookups by result",
+               stats['hits'], {'cache': cache, 'result': 'hit'}),
+        Sample('stock_app_cache_lookups_total', 'counter', "Cache lookups by result",
+               stats['misses'], {'cache': cache, 'result': 'miss'}),
+        Sample('stock_app_cache_hit_ratio', 'gauge', "Share of cache lookups that were hits",
+               stats['hit_ratio'], {'cache': cache}),
+        Sample('stock_app_cache_entries', 'gauge', "Entries held by a cache", stats['entries'], {'cache': cache}),
+    ]
+
+
+# Services add their collectors when they are first created, so scraping
+# /metrics does not import or construct anything
+registry = MetricsRegistry()
+
+PHASE_SECONDS = registry.histogram(
+    'stock_app_phase_seconds', "Time spent in each phase of request handling", ('phase',))
+REQUEST_SECONDS = registry.histogram(
+    'stock_app_request_seconds', "Time to produce a response, per view and status class", ('view', 'status'))
+REQUESTS_IN_FLIGHT = registry.gauge(
+    'stock_app_requests_in_flight', "Requests being handled")
+UPSTREAM_SECONDS = registry.histogram(
+    'stock_app_upstream_seconds', "Duration of each upstream call attempt", ('upstream',))
+UPSTREAM_ERRORS = registry.counter(
+    'stock_app_upstream_errors_total', "Failed upstream calls by error type", ('upstream', 'error'))
+UPSTREAM_IN_FLIGHT = registry.gauge(
+    'stock_app_upstream_in_flight', "Upstream calls in progress", ('upstream',))
+
+
+class RequestTimings:
+    """Durations of the phases of one request, for the Server-Timing header"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def server_timing(self, total: float) -> str:
+        """Format the phases and the request's `total` seconds as a Server-Timing header value"""
+        entries = [f"{phase};dur={seconds * 1000:.1f}" for phase, seconds in self.phases.items()]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar('request_timings', default=None)
+
+
+@contextmanager
+def request_scope() -> Iterator[RequestTimings]:
+    """Collect the phase durations recorded while handling a request in this context"""
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def record_phase(phase: str, seconds: float) -> None:
+    """Record a phase duration in the histogram and, inside a request, in its timings"""
+    PHASE_SECONDS.observe(seconds, phase)
+    timings = _current.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """Time the enclosed block as `phase`, see record_phase()"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(phase, time.perf_counter() - started)
+
+
+def error_label(error: Exception) -> str:
+    """Label an upstream failure by HTTP status when the error carries one, else by type"""
+    status = getattr(error, 'status_code', None)
+    return f"http_{status}" if isinstance(status, int) else type(error).__name__
+
+
+@contextmanager
+def upstream_call(upstream: str) -> Iterator[None]:
+    """Time an upstream call, count it as in flight, and count its failure, see error_label()"""
+    started = time.perf_counter()
+    UPSTREAM_IN_FLIGHT.inc(upstream)
+    try:
+        yield
+    except Exception as e:
+        UPSTREAM_ERRORS.inc(upstream, error_label(e))
+        raise
+    finally:
+        UPSTREAM_IN_FLIGHT.dec(upstream)
+        UPSTREAM_SECONDS.observe(time.perf_counter() - started, upstream)
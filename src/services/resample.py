@@ -0,0 +1,106 @@
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+# Bar length of each intraday interval
+INTRADAY_STEPS: Dict[str, pd.Timedelta] = {
+    "1m": pd.Timedelta(minutes=1),
+    "2m": pd.Timedelta(minutes=2),
+    "5m": pd.Timedelta(minutes=5),
+    "15m": pd.Timedelta(minutes=15),
+    "30m": pd.Timedelta(minutes=30),
+    "60m": pd.Timedelta(minutes=60),
+    "90m": pd.Timedelta(minutes=90),
+    "1h": pd.Timedelta(hours=1),
+}
+
+# Calendar intervals that can be built from daily bars
+CALENDAR_INTERVALS = ("1wk", "1mo")
+
+# How each OHLCV column combines when bars are merged; other columns keep the last value
+AGGREGATIONS: Dict[str, str] = {
+    'Open': 'first',
+    'High': 'max',
+    'Low': 'min',
+    'Close': 'last',
+    'Volume': 'sum',
+    'Dividends': 'sum',
+    'Stock Splits': 'max',
+    'Capital Gains': 'sum',
+}
+
+
+def can_resample(source: str, target: str) -> bool:
+    """
+    Return True if bars of the `target` interval can be built from `source` bars.
+    Args:
+        source (str): Finer interval
+        target (str): Coarser interval
+    Returns:
+        bool: Whether every target bar is an exact union of source bars
+    """
+    if source in INTRADAY_STEPS and target in INTRADAY_STEPS:
+        source_step, target_step = INTRADAY_STEPS[source], INTRADAY_STEPS[target]
+        return source_step < target_step and target_step % source_step == pd.Timedelta(0)
+    return source == "1d" and target in CALENDAR_INTERVALS
+
+
+def resample_sources(target: str, candidates: List[str]) -> List[str]:
+    """Return the intervals in `candidates` that `target` can be built from, coarsest first"""
+    sources = [interval for interval in candidates if can_resample(interval, target)]
+    return sorted(sources, key=lambda interval: INTRADAY_STEPS.get(interval, pd.Timedelta(days=1)), reverse=True)
+
+
+def _session_bins(index: pd.DatetimeIndex, step: pd.Timedelta) -> np.ndarray:
+    """
+    Assign intraday bars to bins of length `step` anchored at the session open.
+    The open is taken as the earliest time of day in the data, so bins line up
+    with the exchange's bars (e.g. 9:30, 10:30, ... for hourly US equities).
+    """
+    timestamps = index.tz_localize(None) if index.tz is not None else index
+    ts = timestamps.values.astype('datetime64[ns]').view('int64')
+    days = timestamps.normalize().values.astype('datetime64[ns]').view('int64')
+    session_open = (ts - days).min()
+    step_ns = step.value
+    return days + session_open + ((ts - days - session_open) // step_ns) * step_ns
+
+
+def _calendar_bins(index: pd.DatetimeIndex, interval: str) -> np.ndarray:
+    """Assign daily bars to the week (starting Monday) or month they belong to"""
+    days = (index.tz_localize(None) if index.tz is not None else index).normalize()
+    if interval == "1wk":
+        starts = days - pd.to_timedelta(days.dayofweek, unit='D')
+    else:
+        starts = days - pd.to_timedelta(days.day - 1, unit='D')
+    return starts.values.astype('datetime64[ns]').view('int64')
+
+
+def resample_bars(df: pd.DataFrame, interval: str) -> pd.DataFrame:
+    """
+    Aggregate finer OHLCV bars into `interval` bars: first open, max high,
+    min low, last close and summed volume.
+    Args:
+        df (pd.DataFrame): Finer bars indexed by timestamp, in exchange time
+        interval (str): Target interval
+    Returns:
+        pd.DataFrame: Coarser bars, labelled by the start of each bar
+    """
+    if df.empty:
+        return df
+    if interval in INTRADAY_STEPS:
+        bins = _session_bins(df.index, INTRADAY_STEPS[interval])
+    elif interval in CALENDAR_INTERVALS:
+        bins = _calendar_bins(df.index, interval)
+    else:
+        raise ValueError(f"Cannot resample to interval '{interval}'")
+
+    spec = {column: AGGREGATIONS.get(column, 'last') for column in df.columns}
+    out = df.groupby(bins, sort=True).agg(spec)
+
+    labels = pd.to_datetime(out.index.values, unit='ns')
+    if df.index.tz is not None:
+        labels = labels.tz_localize(df.index.tz)
+    out.index = pd.DatetimeIndex(labels, name=df.index.name)
+    return out
+
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key into a single execution.
+
+    The first caller for a key runs the function; every caller that arrives
+    while it is in flight, from another thread or from an async task, waits
+    for and receives the same result or exception.
+    """
+
+    def __init__(self, executor: Optional[Executor] = None):
+        """
+        Args:
+            executor (Optional[Executor]): Runs background and async-initiated
+                calls; a new daemon thread is used per call if omitted
+        """
+        self._executor = executor
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+
+    def _claim(self, key: str) -> Tuple[Future, bool]:
+        """Return the in-flight future for a key, and whether the caller must run it"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            # A running future cannot be cancelled by one waiter on behalf of the others
+            future.set_running_or_notify_cancel()
+            self._calls[key] = future
+            return future, True
+
+    def _run(self, key: str, future: Future, fn: Callable[[], Any]) -> None:
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def _start(self, key: str, future: Future, fn: Callable[[], Any]) -> None:
+        """Run a leading call off the current thread"""
+        if self._executor is not None:
+            self._executor.submit(self._run, key, future, fn)
+        else:
+            threading.Thread(target=self._run, args=(key, future, fn), daemon=True).start()
+
+    def in_flight(self) -> int:
+        """Return the number of keys currently being computed"""
+        with self._lock:
+            return len(self._calls)
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Run `fn` for `key`, or wait for the call already in flight.
+        Args:
+            key (str): Deduplication key
+            fn (Callable[[], Any]): Function producing the value
+        Returns:
+            Any: The value produced by the leading call
+        """
+        future, leader = self._claim(key)
+        if leader:
+            self._run(key, future, fn)
+        return future.result()
+
+    def spawn(self, key: str, fn: Callable[[], Any]) -> bool:
+        """
+        Run `fn` for `key` in a background thread unless a call is already in flight.
+        Args:
+            key (str): Deduplication key
+            fn (Callable[[], Any]): Function to run
+        Returns:
+            bool: True if a new call was started
+        """
+        future, leader = self._claim(key)
+        if leader:
+            self._start(key, future, fn)
+        return leader
+
+    async def ado(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Async variant of do(). A leading call runs `fn` off the event loop,
+        so the loop is never blocked; it completes even if the
+        awaiting task is cancelled, so other waiters still get the result.
+        Args:
+            key (str): Deduplication key
+            fn (Callable[[], Any]): Blocking function producing the value
+        Returns:
+            Any: The value produced by the leading call
+        """
+        future, leader = self._claim(key)
+        if leader:
+            self._start(key, future, fn)
+        return await asyncio.wrap_future(future)
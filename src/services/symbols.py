@@ -0,0 +1,185 @@
+import csv
+import logging
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from heapq import nsmallest
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger('stock_app')
+
+# Sorts after every character that can follow a prefix, so bisecting for
+# prefix + _PREFIX_END finds the end of the range starting with prefix
+_PREFIX_END = '\uffff'
+_WORD = re.compile(r'[a-z0-9]+')
+# Yahoo Finance symbols of non-US listings end in an exchange suffix (VOD.L, SHOP.TO),
+# and the directory only lists US exchanges
+_EXCHANGE_SUFFIX = re.compile(r'\.[A-Z]{1,3}$')
+
+# A directory with fewer symbols than this is a partial list, such as the bundled
+# seed, and unknown tickers are not rejected against it; `manage.py update_symbols`
+# writes the full US listings, over 10,000 symbols
+FULL_DIRECTORY_SYMBOLS = 5000
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def _prefix_range(items: List[str], prefix: str) -> Tuple[int, int]:
+    """Positions [start, end) of the sorted `items` that start with `prefix`"""
+    return bisect_left(items, prefix), bisect_left(items, prefix + _PREFIX_END)
+
+
+class SymbolIndex:
+    """
+    Ticker symbols and security names held in sorted arrays.
+
+    Symbols are looked up and prefix-matched with a binary search on the
+    sorted symbol list. Names are matched by the prefix of any of their
+    words through a second sorted list of every name word, with the
+    position of its symbol alongside in an array. Both searches touch only
+    the matching range, so a lookup stays well under a millisecond for the
+    full exchange directory.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, str]]):
+        """
+        Args:
+            entries (Iterable[Tuple[str, str]]): (symbol, name) pairs; the first name of a repeated symbol is kept
+        """
+        names = {}
+        for symbol, name in entries:
+            symbol = symbol.strip().upper()
+            if symbol:
+                names.setdefault(symbol, name.strip())
+        self.symbols: List[str] = sorted(names)
+        self.names: List[str] = [names[symbol] for symbol in self.symbols]
+
+        words = sorted({(word, position) for position, name in enumerate(self.names) for word in _words(name)})
+        self._words: List[str] = [word for word, _ in words]
+        self._word_positions = array('I', (position for _, position in words))
+
+    @classmethod
+    def from_csv(cls, path: str) -> 'SymbolIndex':
+        """
+        Load a symbol directory with `symbol` and `name` columns, as written by `manage.py update_symbols`.
+        Args:
+            path (str): CSV file
+        Returns:
+            SymbolIndex: The index, empty if the file does not exist
+        """
+        try:
+            with open(path, newline='', encoding='utf-8') as f:
+                return cls((row['symbol'], row.get('name') or '') for row in csv.DictReader(f))
+        except FileNotFoundError:
+            logger.warning("Symbol directory %s not found; ticker symbols are not validated", path)
+            return cls(())
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    @property
+    def is_full(self) -> bool:
+        """Whether the index holds a full exchange directory rather than a partial list"""
+        return len(self.symbols) >= FULL_DIRECTORY_SYMBOLS
+
+    def __contains__(self, symbol: str) -> bool:
+        return self.name(symbol) is not None
+
+    def name(self, symbol: str) -> Optional[str]:
+        """Return the security name of a symbol, or None if it is not in the index"""
+        symbol = symbol.strip().upper()
+        position = bisect_left(self.symbols, symbol)
+        if position < len(self.symbols) and self.symbols[position] == symbol:
+            return self.names[position]
+        return None
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, str]]:
+        """
+        Find symbols for an autocomplete query. Symbols starting with the
+        query come first, shortest first, so an exact match leads; then
+        securities with a name word starting with each word of the query.
+        Args:
+            query (str): Symbol or name prefix typed by the user
+            limit (int): Maximum number of results
+        Returns:
+            List[Tuple[str, str]]: (symbol, name) pairs in ranking order
+        """
+        query = query.strip()
+        if not query or limit <= 0:
+            return []
+
+        start, end = _prefix_range(self.symbols, query.upper())
+        # Equal lengths keep their alphabetical order
+        positions = nsmallest(limit, range(start, end), key=lambda position: len(self.symbols[position]))
+
+        terms = _words(query)
+        if len(positions) < limit and terms:
+            # Scan the narrowest range of the query words and check the others per name
+            ranges = [(_prefix_range(self._words, term), term) for term in terms]
+            (start, end), first = min(ranges, key=lambda item: item[0][1] - item[0][0])
+            others = [term for term in terms if term != first]
+            seen = set(positions)
+            for position in self._word_positions[start:end]:
+                if position in seen:
+                    continue
+                seen.add(position)
+                if others:
+                    words = _words(self.names[position])
+                    if not all(any(word.startswith(term) for word in words) for term in others):
+                        continue
+                positions.append(position)
+                if len(positions) == limit:
+                    break
+
+        return [(self.symbols[position], self.names[position]) for position in positions]
+
+
+_index: Optional[SymbolIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_symbol_index() -> SymbolIndex:
+    """Return the process-wide index loaded from settings.STOCK_SYMBOLS['FILE'] on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                path = settings.STOCK_SYMBOLS['FILE']
+                _index = SymbolIndex.from_csv(path)
+                logger.info("Loaded %d symbols from %s", len(_index), os.path.basename(path))
+                if settings.STOCK_SYMBOLS['REJECT_UNKNOWN'] and not _index.is_full:
+                    logger.warning(
+                        "%s is a partial symbol directory; unknown tickers are passed upstream "
+                        "until `manage.py update_symbols` writes the full one", os.path.basename(path)
+                    )
+    return _index
+
+
+def is_known_symbol(symbol: str) -> bool:
+    """
+    Check a ticker before it is requested upstream. A ticker missing from
+    the directory is rejected once the full directory is loaded, unless
+    settings.STOCK_SYMBOLS['REJECT_UNKNOWN'] is turned off; against a
+    partial directory it is logged and passes, as do symbols with an
+    exchange suffix, which no directory lists.
+    Args:
+        symbol (str): Ticker symbol
+    Returns:
+        bool: False if the ticker should be rejected without calling upstream
+    """
+    symbol = symbol.strip().upper()
+    if _EXCHANGE_SUFFIX.search(symbol):
+        return True
+    index = get_symbol_index()
+    if symbol in index:
+        return True
+    if settings.STOCK_SYMBOLS['REJECT_UNKNOWN'] and index.is_full:
+        return False
+    logger.warning("Ticker %s is not in the symbol directory; requesting it upstream", symbol)
+    return True
@@ -0,0 +1,214 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+from src.services.app_config import get_watchlist
+from src.services.chart_options import PERIOD_INTERVAL_MAP
+from src.services.fetch_scheduler import Priority, TokenBucket
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+# The server imports this module at startup, so yfinance_service (and with it
+# pandas and yfinance) is only imported once a warmup pass runs
+if TYPE_CHECKING:
+    import pandas as pd
+    from src.services.yfinance_service import Downloader
+
+logger = logging.getLogger('stock_app')
+
+# What the chart form shows by default: each period with its first interval
+COMMON_COMBINATIONS: List[Tuple[str, str]] = [
+    (period, intervals[0]) for period, intervals in PERIOD_INTERVAL_MAP.items()
+]
+
+ALL_COMBINATIONS: List[Tuple[str, str]] = [
+    (period, interval) for period, intervals in PERIOD_INTERVAL_MAP.items() for interval in intervals
+]
+
+# Period/interval combinations prefetched in parallel
+WARMUP_WORKERS = 4
+
+
+@dataclass
+class WarmupReport:
+    """Outcome of one warmup pass"""
+    warmed: Dict[Tuple[str, str], List[str]] = field(default_factory=dict)  # Refetched tickers per combination
+    fresh: Dict[Tuple[str, str], List[str]] = field(default_factory=dict)  # Tickers that were still fresh
+    errors: Dict[Tuple[str, str], Dict[str, str]] = field(default_factory=dict)  # Failures per combination
+    upstream_calls: int = 0  # Upstream requests made, one per ticker downloaded plus throttled retries
+    elapsed: float = 0.0
+
+    @property
+    def warmed_count(self) -> int:
+        return sum(len(tickers) for tickers in self.warmed.values())
+
+    @property
+    def error_count(self) -> int:
+        return sum(len(errors) for errors in self.errors.values())
+
+
+def _pacer(bucket: TokenBucket) -> Callable[[], None]:
+    """
+    Return a function that blocks until the bucket has a token and takes it.
+    It runs before a download is queued, so waiting for the warmup's budget
+    never holds one of the fetch scheduler's workers.
+    """
+    def pace() -> None:
+        while (wait := bucket.try_acquire()) > 0:
+            time.sleep(wait)
+
+    return pace
+
+
+def _counted(downloader: 'Downloader', on_call: Callable[[], None]) -> 'Downloader':
+    """Wrap a downloader to count its calls, each one upstream request"""
+    def download(ticker: str, period: str, interval: str) -> 'pd.DataFrame':
+        on_call()
+        return downloader(ticker, period, interval)
+
+    return download
+
+
+def warm_up(tickers: Iterable[str], combinations: Optional[Iterable[Tuple[str, str]]] = None,
+            rate: Optional[float] = None, refresh_within: float = 0.0,
+            downloader: Optional['Downloader'] = None) -> WarmupReport:
+    """
+    Prefetch historical data for a watchlist into the cache.
+    Combinations are fetched in parallel with StockData.fetch_many at BATCH
+    priority, so page loads go first at the fetch scheduler.
+    Args:
+        tickers (Iterable[str]): Ticker symbols
+        combinations (Optional[Iterable[Tuple[str, str]]]): (period, interval) pairs, defaults to COMMON_COMBINATIONS
+        rate (Optional[float]): Tickers per second this warmup may download (one upstream request each),
+            on top of the scheduler's own limit
+        refresh_within (float): Also refetch entries that expire within this many seconds
+        downloader (Optional[Downloader]): Download function for one ticker, defaults to download_history
+    Returns:
+        WarmupReport: What was refetched, what was still fresh and what failed
+    """
+    from src.services.yfinance_service import StockData, download_history
+
+    tickers = list(tickers)
+    combinations = list(combinations or COMMON_COMBINATIONS)
+    report = WarmupReport()
+    pace = _pacer(TokenBucket(rate, 1)) if rate else None
+    lock = threading.Lock()
+
+    def count_call() -> None:
+        with lock:
+            report.upstream_calls += 1
+
+    counted = _counted(downloader or download_history, count_call)
+
+    def warm(combination: Tuple[str, str]) -> None:
+        period, interval = combination
+        result = StockData.fetch_many(tickers, period, interval, downloader=counted, pace=pace,
+                                      priority=Priority.BATCH, refresh_within=refresh_within)
+        with lock:
+            report.fresh[combination] = sorted(result.cached)
+            report.warmed[combination] = sorted(set(result.data) - set(result.cached))
+            if result.errors:
+                report.errors[combination] = {ticker: str(e) for ticker, e in result.errors.items()}
+
+    started = time.perf_counter()
+    if tickers:
+        with ThreadPoolExecutor(max_workers=WARMUP_WORKERS, thread_name_prefix='warmup') as pool:
+            list(pool.map(warm, combinations))
+    report.elapsed = time.perf_counter() - started
+
+    logger.info(
+        f"Warmup refetched {report.warmed_count} entries for {len(tickers)} tickers x "
+        f"{len(combinations)} combinations with {report.upstream_calls} upstream calls "
+        f"in {report.elapsed:.1f}s ({report.error_count} errors)"
+    )
+    return report
+
+
+class WarmupWorker(threading.Thread):
+    """
+    Background thread that keeps the watchlist warm: every `every` seconds
+    it refetches the entries that expire within `refresh_within` seconds,
+    so they are replaced before anyone sees them expire.
+
+    Every server process starts one, but with a `lock_path` only the
+    process holding an exclusive lock on that file runs passes; the others
+    stand by and try the lock each round, so one of them takes over when
+    that process exits. The caches being warmed are shared by the host,
+    so one warming process is enough.
+    """
+
+    def __init__(self, every: float, refresh_within: float, rate: Optional[float] = None,
+                 combinations: Optional[Iterable[Tuple[str, str]]] = None,
+                 tickers: Callable[[], List[str]] = get_watchlist, lock_path: Optional[str] = None):
+        super().__init__(name='cache-warmup', daemon=True)
+        self.every = every
+        self.refresh_within = refresh_within
+        self.rate = rate
+        self.combinations = list(combinations) if combinations else None
+        self.tickers = tickers
+        self.lock_path = lock_path
+        self._lock_file = None
+        self._stopped = threading.Event()
+
+    def acquire(self) -> bool:
+        """Return True if this process may warm: it holds the lock, or there is none to hold"""
+        if self.lock_path is None or fcntl is None:
+            return True
+        if self._lock_file is not None:
+            return True
+        os.makedirs(os.path.dirname(os.path.abspath(self.lock_path)), exist_ok=True)
+        lock_file = open(self.lock_path, 'a+')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # Held until the process exits, when the OS releases it for a standby
+        self._lock_file = lock_file
+        logger.info("Background warmup runs in process %d", os.getpid())
+        return True
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                if self.acquire():
+                    warm_up(self.tickers(), self.combinations, rate=self.rate, refresh_within=self.refresh_within)
+            except Exception as e:
+                logger.error(f"Warmup pass failed: {str(e)}")
+            self._stopped.wait(self.every)
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+_worker: Optional[WarmupWorker] = None
+_worker_lock = threading.Lock()
+
+
+def start_background_warmup() -> Optional[WarmupWorker]:
+    """
+    Start the in-process warmup worker if settings.STOCK_WARMUP enables it;
+    of the server processes sharing STOCK_WARMUP['LOCK_FILE'], one warms.
+    Returns:
+        Optional[WarmupWorker]: The running worker, or None if disabled
+    """
+    global _worker
+    config = settings.STOCK_WARMUP
+    if not config['BACKGROUND']:
+        return None
+    with _worker_lock:
+        if _worker is None:
+            _worker = WarmupWorker(every=config['EVERY'], refresh_within=config['AHEAD'], rate=config['RATE'],
+                                   lock_path=config.get('LOCK_FILE'))
+            _worker.start()
+            logger.info(f"Started background warmup every {config['EVERY']}s")
+    return _worker
@@ -127,31 +127,119 @@
 
 
 import yfinance as yf
-from typing import Dict, Literal, Optional, Any, List
-from datetime import datetime
+from yfinance.exceptions import YFRateLimitError
+from typing import Callable, Dict, Iterable, Optional, Any, List, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from functools import partial
+from dataclasses import dataclass, field
 import pandas as pd
 import logging
+import os
+import threading
+import time
 from django.core.cache import cache
+from src.services.bar_store import get_bar_store
+from src.services.chart_options import (
+    PERIOD_INTERVAL_MAP, VALID_INTERVALS, VALID_PERIODS, get_available_intervals, get_available_periods,
+)
+from src.services.fetch_scheduler import Priority, ThrottledError, get_fetch_scheduler
+from src.services.frame_cache import get_frame_cache
+from src.services.log_pipeline import sampled
+from src.services.market_hours import cache_ttl
+from src.services.metrics import timed, upstream_call
+from src.services.resample import resample_bars, resample_sources
+from src.services.single_flight import SingleFlight
 
 logger = logging.getLogger('stock_app')
 
-# Valid combinations of period and interval
-PERIOD_INTERVAL_MAP: Dict[str, List[str]] = {
-    "1d": ["1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h"],
-    "5d": ["5m", "15m", "30m", "60m", "90m", "1h"],
-    "1mo": ["30m", "60m", "90m", "1h", "1d"],
-    "3mo": ["60m", "1h", "1d"],
-    "6mo": ["1d"],
-    "1y": ["1d"],
-    "2y": ["1d", "5d", "1wk"],
-    "5y": ["1d", "1wk", "1mo"],
-    "10y": ["1d", "1wk", "1mo"],
-    "ytd": ["1d"],
-    "max": ["1d", "1wk", "1mo"]
+# Upstream downloads started by async callers and background refreshes run on
+# this pool, so slow fetches never block the event loop or a request thread
+UPSTREAM_FETCH_THREADS = 32
+
+# Concurrent cache misses for the same key share one upstream fetch
+_inflight = SingleFlight(ThreadPoolExecutor(max_workers=UPSTREAM_FETCH_THREADS, thread_name_prefix='stock-fetch'))
+
+# Lookback window of each period; "ytd" and "max" are handled in period_start()
+PERIOD_OFFSETS: Dict[str, pd.DateOffset] = {
+    "1d": pd.DateOffset(days=1),
+    "5d": pd.DateOffset(days=5),
+    "1mo": pd.DateOffset(months=1),
+    "3mo": pd.DateOffset(months=3),
+    "6mo": pd.DateOffset(months=6),
+    "1y": pd.DateOffset(years=1),
+    "2y": pd.DateOffset(years=2),
+    "5y": pd.DateOffset(years=5),
+    "10y": pd.DateOffset(years=10),
 }
 
-VALID_PERIODS = Literal["1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "10y", "ytd", "max"]
-VALID_INTERVALS = Literal["1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h", "1d", "5d", "1wk", "1mo"]
+# Intervals served from the on-disk bar store. Intraday history is limited
+# upstream and the windows are short, so those bars are always fetched whole.
+STORE_INTERVALS = ("1d", "5d", "1wk", "1mo")
+
+
+def period_start(period: str, now: Optional[pd.Timestamp] = None) -> Optional[pd.Timestamp]:
+    """
+    Return the first timestamp covered by a period.
+    Args:
+        period (str): Time period
+        now (Optional[pd.Timestamp]): Reference time, defaults to the current UTC time
+    Returns:
+        Optional[pd.Timestamp]: Start of the window, or None for "max"
+    """
+    now = now if now is not None else pd.Timestamp.now(tz='UTC')
+    if period == "max":
+        return None
+    if period == "ytd":
+        return pd.Timestamp(year=now.year, month=1, day=1, tz=now.tz)
+    return (now - PERIOD_OFFSETS[period]).normalize()
+
+
+_session: Optional[Any] = None
+_session_lock = threading.Lock()
+
+
+def upstream_session() -> Optional[Any]:
+    """
+    Return the HTTP session shared by every yfinance call, so connections
+    and cookies are reused. None lets yfinance create its own when
+    curl_cffi is not installed.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                try:
+                    from curl_cffi import requests as curl_requests
+                except ImportError:
+                    return None
+                _session = curl_requests.Session(impersonate="chrome")
+    return _session
+
+
+def scheduled_submit(fn: Callable[[], Any], priority: int, label: str) -> Future:
+    """
+    Queue an upstream call at the fetch scheduler, reporting yfinance rate
+    limiting so the scheduler backs off and retries it.
+    Args:
+        fn (Callable[[], Any]): Blocking upstream call
+        priority (int): Scheduling class, see Priority
+        label (str): Description used in logs
+    Returns:
+        Future: Resolves to the call's result or exception
+    """
+    def call() -> Any:
+        try:
+            with upstream_call('yfinance'):
+                return fn()
+        except YFRateLimitError as e:
+            raise ThrottledError(str(e)) from e
+
+    return get_fetch_scheduler().submit(call, priority, label)
+
+
+def scheduled_call(fn: Callable[[], Any], priority: int, label: str) -> Any:
+    """Run an upstream call through the fetch scheduler and wait for its result; see scheduled_submit()"""
+    return scheduled_submit(fn, priority, label).result()
 
 
 class StockDataError(Exception):
@@ -159,24 +247,52 @@ class StockDataError(Exception):
     pass
 
 
+@dataclass
+class FetchManyResult:
+    """Per-ticker outcome of StockData.fetch_many"""
+    data: Dict[str, Any] = field(default_factory=dict)  # Frames, or what `summarize` made of them
+    errors: Dict[str, StockDataError] = field(default_factory=dict)
+    cached: List[str] = field(default_factory=list)  # Tickers served from fresh cache entries
+
+
+# Downloads the bars of one ticker: (ticker, period, interval) -> frame, empty if upstream has none
+Downloader = Callable[[str, str, str], pd.DataFrame]
+
+
+def download_history(ticker: str, period: str, interval: str) -> pd.DataFrame:
+    """
+    Download bars for one ticker with a single yfinance request.
+    Yahoo Finance has no multi-ticker history endpoint (yf.download() makes
+    one request per ticker and hides per-ticker errors, rate limiting
+    included), so many tickers are fetched with one of these calls each.
+    Args:
+        ticker (str): Ticker symbol
+        period (str): Time period
+        interval (str): Data interval
+    Returns:
+        pd.DataFrame: Bars, empty only if upstream answered without any
+    Raises:
+        YFRateLimitError: If Yahoo Finance is throttling us
+        StockDataError: If yfinance recorded an error for the request, which it reports with an empty frame
+    """
+    stock = yf.Ticker(ticker, session=upstream_session())
+    df = stock.history(period=period, interval=interval)
+    # yfinance logs most failures and returns an empty frame; such a frame is not an answer to cache
+    error = getattr(getattr(stock, '_price_history', None), '_last_error', None)
+    if df.empty and error:
+        raise StockDataError(f"yfinance could not download '{ticker}': {error}")
+    return df
+
+
 class StockData:
-    CACHE_TIMEOUT = 300  # 5 minutes
+    STALE_TIMEOUT = 3600  # Seconds an expired entry may still be served while it is refreshed
+    LOCK_TIMEOUT = 30  # Max seconds a worker process holds the fetch lock for a key
+    LOCK_POLL_INTERVAL = 0.1  # Seconds between cache checks while another process fetches
+    NO_DATA_TIMEOUT = 300  # Seconds an upstream answer without data is remembered, so retries do not repeat it
     
-    @staticmethod
-    def get_available_periods() -> List[str]:
-        """Return list of valid time periods"""
-        return list(PERIOD_INTERVAL_MAP.keys())
-    
-    @staticmethod
-    def get_available_intervals(period: str) -> List[str]:
-        """
-        Return list of valid intervals for a given period.
-        Args:
-            period (str): Time period
-        Returns:
-            List[str]: Valid intervals for the period
-        """
-        return PERIOD_INTERVAL_MAP.get(period, [])
+    # Kept on the class for existing callers; see src/services/chart_options.py
+    get_available_periods = staticmethod(get_available_periods)
+    get_available_intervals = staticmethod(get_available_intervals)
     
     def __init__(self, ticker: str, period: VALID_PERIODS = "1d", interval: VALID_INTERVALS = "60m"):
         """
@@ -214,39 +330,341 @@ class StockData:
     
     def _get_cache_key(self) -> str:
         """Generate cache key for current request"""
-        return f"{self.ticker}_{self.period}_{self.interval}_{datetime.now().strftime('%Y%m%d')}"
+        return f"{self.ticker}_{self.period}_{self.interval}"
+
+    @staticmethod
+    def _cache_read(cache_key: str, min_fresh: float = 0.0) -> Tuple[Optional[pd.DataFrame], bool]:
+        """
+        Read a cache entry.
+        Args:
+            cache_key (str): Cache key
+            min_fresh (float): Treat entries that expire within this many seconds as stale
+        Returns:
+            Tuple[Optional[pd.DataFrame], bool]: Cached data (None on a miss) and whether it is stale
+        """
+        entry = get_frame_cache().get(cache_key)
+        if entry is None:
+            return None, False
+        data, fresh_until = entry
+        return data, time.time() + min_fresh >= fresh_until
+
+    @staticmethod
+    def _no_data_message(ticker: str, period: str, interval: str) -> str:
+        return f"No data available for ticker '{ticker}' with period '{period}' and interval '{interval}'."
+
+    @staticmethod
+    def _no_data_key(cache_key: str) -> str:
+        """Shared-cache key marking that upstream had no data for a cache key"""
+        return f"{cache_key}:nodata"
+
+    def _raise_if_no_data(self, cache_key: str) -> None:
+        """Raise StockDataError if upstream recently had no data for this request"""
+        if cache.get(self._no_data_key(cache_key)):
+            logger.info("Cached no-data answer for key: %s", cache_key)
+            raise StockDataError(self._no_data_message(self.ticker, self.period, self.interval))
+
+    def _cache_write(self, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Cache data for this request. The entry is fresh for an interval- and
+        market-hours-dependent TTL and may be served stale for STALE_TIMEOUT
+        seconds after that while it is refreshed.
+        Returns:
+            pd.DataFrame: The data as later cache hits will return it
+        """
+        ttl = cache_ttl(self.interval)
+        return get_frame_cache().set(self._get_cache_key(), data, time.time() + ttl, ttl + self.STALE_TIMEOUT)
     
     def get_historical_data(self) -> pd.DataFrame:
         """
         Get historical price data with specified interval.
-        Implements caching to reduce redundant API calls.
+        Implements caching to reduce redundant API calls. Stale entries are
+        served immediately while a single background refresh runs.
         Returns:
             pd.DataFrame: Historical price data
         Raises:
             StockDataError: If data fetch fails
         """
         cache_key = self._get_cache_key()
-        cached_data = cache.get(cache_key)
+        with timed('cache'):
+            cached_data, stale = self._cache_read(cache_key)
         
         if cached_data is not None:
-            logger.info(f"Cache hit for key: {cache_key}")
+            if stale:
+                self._revalidate(cache_key)
+                logger.info("Serving stale data for key: %s", cache_key)
+            else:
+                logger.info("Cache hit for key: %s", cache_key, extra=sampled('cache_hit'))
             return cached_data
         
         try:
-            stock = yf.Ticker(self.ticker)
-            self.data = stock.history(period=self.period, interval=self.interval)
-            
-            if self.data.empty:
-                raise StockDataError(f"No data available for ticker '{self.ticker}' with period '{self.period}' and interval '{self.interval}'.")
-                
-            cache.set(cache_key, self.data, self.CACHE_TIMEOUT)
-            logger.info(f"Fetched and cached data for ticker '{self.ticker}' with key: {cache_key}")
+            with timed('fetch'):
+                self.data = _inflight.do(cache_key, self._fetch_and_cache)
             return self.data
         
         except Exception as e:
-            logger.error(f"Error fetching historical data: {str(e)}")
+            logger.error("Error fetching historical data: %s", e)
             raise StockDataError(f"Failed to fetch historical data: {str(e)}")
+
+    async def aget_historical_data(self) -> pd.DataFrame:
+        """
+        Async variant of get_historical_data(). Cache hits are served on the
+        event loop; misses await the coalesced upstream fetch, which runs on
+        the shared fetch pool rather than on a thread per request.
+        Returns:
+            pd.DataFrame: Historical price data
+        Raises:
+            StockDataError: If data fetch fails
+        """
+        cache_key = self._get_cache_key()
+        with timed('cache'):
+            entry = await get_frame_cache().aget(cache_key)
+
+        if entry is not None:
+            cached_data, fresh_until = entry
+            if time.time() >= fresh_until:
+                self._revalidate(cache_key)
+                logger.info("Serving stale data for key: %s", cache_key)
+            else:
+                logger.info("Cache hit for key: %s", cache_key, extra=sampled('cache_hit'))
+            return cached_data
+
+        try:
+            with timed('fetch'):
+                self.data = await _inflight.ado(cache_key, self._fetch_and_cache)
+            return self.data
+
+        except Exception as e:
+            logger.error("Error fetching historical data: %s", e)
+            raise StockDataError(f"Failed to fetch historical data: {str(e)}")
+
+    async def aget_cached_data(self) -> Optional[pd.DataFrame]:
+        """
+        Return the cached data, fresh or stale, without fetching on a miss
+        or refreshing a stale entry; for context that is not worth an
+        upstream call.
+        Returns:
+            Optional[pd.DataFrame]: Cached data, or None if nothing is cached
+        """
+        entry = await get_frame_cache().aget(self._get_cache_key())
+        return None if entry is None else entry[0]
+
+    def _revalidate(self, cache_key: str) -> None:
+        """Refresh a stale entry in the background, unless a refresh is already running"""
+        def refresh() -> None:
+            try:
+                self._fetch_and_cache(wait=False, priority=Priority.REFRESH)
+            except Exception as e:
+                logger.warning("Background refresh failed for key %s: %s", cache_key, e)
+
+        _inflight.spawn(f"{cache_key}:refresh", refresh)
+
+    def _fetch_and_cache(self, wait: bool = True, priority: int = Priority.INTERACTIVE) -> Optional[pd.DataFrame]:
+        """
+        Fetch data for a cache miss and store it in the cache. Only one worker
+        process fetches a given key at a time: the others hold off on a lock
+        kept in the shared cache and pick up the result once it is cached.
+        The lock is only shared between processes when the default Django
+        cache is (Redis or Memcached); with the default LocMemCache it
+        coalesces fetches within a process, and each process fetches once.
+        Args:
+            wait (bool): Wait for another process holding the lock instead of returning None
+            priority (int): Scheduling class of the upstream call, see Priority
+        Returns:
+            Optional[pd.DataFrame]: Historical price data, or None if another
+                process is fetching and `wait` is False
+        Raises:
+            StockDataError: If no data is available, including when upstream
+                had none within the last NO_DATA_TIMEOUT seconds
+        """
+        cache_key = self._get_cache_key()
+        self._raise_if_no_data(cache_key)
+        lock_key = f"{cache_key}:lock"
+        locked = cache.add(lock_key, os.getpid(), self.LOCK_TIMEOUT)
+
+        if not locked:
+            if not wait:
+                return None
+            data = self._wait_for_cache(cache_key, lock_key)
+            if data is not None:
+                logger.info("Cache filled by another worker for key: %s", cache_key)
+                return data
+            self._raise_if_no_data(cache_key)
+
+        try:
+            data = self._resample_cached()
+            if data is None:
+                data = self._fetch(priority)
+
+            if data.empty:
+                cache.set(self._no_data_key(cache_key), True, self.NO_DATA_TIMEOUT)
+                raise StockDataError(self._no_data_message(self.ticker, self.period, self.interval))
+
+            data = self._cache_write(data)
+            logger.info("Fetched and cached data for ticker '%s' with key: %s", self.ticker, cache_key)
+            return data
+        finally:
+            if locked:
+                cache.delete(lock_key)
+
+    def _wait_for_cache(self, cache_key: str, lock_key: str) -> Optional[pd.DataFrame]:
+        """Wait for the process holding the fetch lock to fill the cache"""
+        deadline = time.monotonic() + self.LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            data, _ = self._cache_read(cache_key)
+            if data is not None:
+                return data
+            if cache.get(lock_key) is None:
+                # The holder finished without caching anything, e.g. on an upstream error
+                return self._cache_read(cache_key)[0]
+            time.sleep(self.LOCK_POLL_INTERVAL)
+        return None
     
+    def _resample_cached(self) -> Optional[pd.DataFrame]:
+        """
+        Build the requested bars from finer bars of the same window that are
+        already cached, avoiding an upstream call.
+        Returns:
+            Optional[pd.DataFrame]: Resampled bars, or None if no finer bars are cached
+        """
+        for source in resample_sources(self.interval, PERIOD_INTERVAL_MAP[self.period]):
+            finer, stale = self._cache_read(StockData(self.ticker, self.period, source)._get_cache_key())
+            if finer is not None and not stale and not finer.empty:
+                logger.info("Resampled %s bars to %s for '%s' (%s)", source, self.interval, self.ticker, self.period)
+                return resample_bars(finer, self.interval)
+        return None
+
+    def _download(self, priority: int = Priority.INTERACTIVE, **kwargs) -> pd.DataFrame:
+        """Download bars for this ticker and interval from yfinance, through the fetch scheduler"""
+        def download() -> pd.DataFrame:
+            stock = yf.Ticker(self.ticker, session=upstream_session())
+            return stock.history(interval=self.interval, **kwargs)
+
+        return scheduled_call(download, priority, f"{self.ticker} ({self.interval})")
+
+    def _fetch(self, priority: int = Priority.INTERACTIVE) -> pd.DataFrame:
+        """
+        Fetch bars for the requested window. For intervals kept in the bar
+        store only the bars newer than the last stored timestamp are
+        downloaded; the rest of the window is served from disk.
+        Args:
+            priority (int): Scheduling class of the upstream calls, see Priority
+        Returns:
+            pd.DataFrame: Historical price data
+        """
+        if self.interval not in STORE_INTERVALS:
+            return self._download(priority, period=self.period)
+
+        store = get_bar_store()
+        start = period_start(self.period)
+        coverage = store.coverage(self.ticker, self.interval)
+
+        if coverage is not None and coverage.covers(start):
+            # Refetch from the last stored bar, which may have been incomplete
+            tail = self._download(priority, start=coverage.last.strftime('%Y-%m-%d'))
+            store.append(self.ticker, self.interval, tail)
+            logger.info("Fetched %d new bars for '%s' (%s) on top of the bar store",
+                        len(tail), self.ticker, self.interval)
+        else:
+            full = self._download(priority, period=self.period)
+            if full.empty:
+                return full
+            self._store_window(full)
+
+        return store.read(self.ticker, self.interval, start=start)
+
+    def _store_window(self, df: pd.DataFrame) -> None:
+        """Save a freshly downloaded full-period window to the bar store"""
+        if self.interval not in STORE_INTERVALS or df.empty:
+            return
+        store = get_bar_store()
+        start = period_start(self.period)
+        coverage = store.coverage(self.ticker, self.interval)
+        if coverage is not None and coverage.covers(start):
+            store.append(self.ticker, self.interval, df)
+        else:
+            store.write(self.ticker, self.interval, df, covers_from=start)
+
+    @classmethod
+    def fetch_many(cls, tickers: Iterable[str], period: VALID_PERIODS = "1d", interval: VALID_INTERVALS = "60m",
+                   downloader: Optional[Downloader] = None, priority: int = Priority.BATCH,
+                   refresh_within: float = 0.0, pace: Optional[Callable[[], None]] = None,
+                   summarize: Optional[Callable[[pd.DataFrame], Any]] = None) -> FetchManyResult:
+        """
+        Fetch historical data for many tickers at once.
+        Tickers with fresh cache entries are served from it. A download for
+        each of the rest is queued at the fetch scheduler up front, so they
+        run as fast as its rate limit and concurrency allow; each takes one
+        token, and one that is throttled makes the scheduler back off and
+        retry it. Each result is cached under the same key
+        get_historical_data() uses.
+        Args:
+            tickers (Iterable[str]): Stock ticker symbols
+            period (VALID_PERIODS): Time period for data
+            interval (VALID_INTERVALS): Data interval
+            downloader (Optional[Downloader]): Download function for one ticker, defaults to download_history
+            priority (int): Scheduling class of the downloads, see Priority
+            refresh_within (float): Also refetch entries that expire within this many seconds
+            pace (Optional[Callable[[], None]]): Called before each download is queued; may block to
+                hold the caller to a rate budget of its own
+            summarize (Optional[Callable[[pd.DataFrame], Any]]): Applied to each frame as it is read or
+                downloaded, and kept in `data` instead of the frame; callers that only need a digest
+                of each frame then never hold more than one at a time
+        Returns:
+            FetchManyResult: Data per ticker, and the error for each ticker that failed
+        """
+        downloader = downloader or download_history
+        summarize = summarize or (lambda df: df)
+        result = FetchManyResult()
+        pending: Dict[str, 'StockData'] = {}
+
+        for ticker in tickers:
+            try:
+                stock = cls(ticker, period, interval)
+            except ValueError as e:
+                result.errors[str(ticker)] = StockDataError(str(e))
+                continue
+            cache_key = stock._get_cache_key()
+            cached_data, stale = cls._cache_read(cache_key, refresh_within)
+            if cached_data is not None and not stale:
+                result.data[stock.ticker] = summarize(cached_data)
+                result.cached.append(stock.ticker)
+            elif cache.get(cls._no_data_key(cache_key)):
+                result.errors[stock.ticker] = StockDataError(cls._no_data_message(stock.ticker, period, interval))
+            else:
+                pending[stock.ticker] = stock
+
+        futures: Dict[Future, str] = {}
+        for ticker in pending:
+            if pace is not None:
+                pace()
+            futures[scheduled_submit(partial(downloader, ticker, period, interval), priority,
+                                     f"{ticker} ({period}/{interval})")] = ticker
+        for future in as_completed(futures):
+            ticker = futures[future]
+            stock = pending.pop(ticker)
+            try:
+                df = future.result()
+            except Exception as e:
+                logger.error("Download failed for '%s' (%s/%s): %s", ticker, period, interval, e)
+                result.errors[ticker] = StockDataError(f"Failed to fetch historical data: {str(e)}")
+                continue
+            if df.empty:
+                # Only a completed download without bars is remembered; failures are retried next time
+                cache.set(cls._no_data_key(stock._get_cache_key()), True, cls.NO_DATA_TIMEOUT)
+                result.errors[ticker] = StockDataError(cls._no_data_message(ticker, period, interval))
+                continue
+            try:
+                stock._store_window(df)
+            except OSError as e:
+                logger.warning("Could not update bar store for '%s': %s", ticker, e)
+            result.data[ticker] = summarize(stock._cache_write(df))
+
+        logger.info(
+            "Fetched %d of %d tickers with %d downloads (%s/%s)",
+            len(result.data), len(result.data) + len(result.errors), len(futures), period, interval,
+        )
+        return result
+
     def get_stock_price(self) -> Optional[float]:
         """
         Get the latest closing stock price.
@@ -257,5 +675,5 @@ class StockData:
             hist = self.get_historical_data()
             return hist['Close'].iloc[-1] if not hist.empty else None
         except StockDataError as e:
-            logger.error(f"Stock data error: {str(e)}")
+            logger.error("Stock data error: %s", e)
             return None
\ No newline at end of file
@@ -0,0 +1,85 @@
+import logging
+from typing import Dict, Optional, Sequence
+
+import pandas as pd
+import plotly.express as px
+
+from src.services.chart_options import CHART_OVERLAYS
+from src.services.downsample import downsample_frame
+from src.services.frame_cache import frame_version
+from src.services.indicators import default_engine
+from src.services.log_pipeline import sampled
+from src.services.lru import LRUCache
+from src.services.metrics import cache_samples, registry
+
+logger = logging.getLogger('stock_app')
+
+# Rendered chart fragments kept per process; old data versions age out of the LRU
+CHART_CACHE_ENTRIES = 256
+
+_chart_cache = LRUCache(max_entries=CHART_CACHE_ENTRIES)
+registry.add_collector(lambda: cache_samples('chart', _chart_cache.stats()))
+
+
+def build_chart_html(df: pd.DataFrame, ticker: str, overlays: Sequence[str] = ()) -> str:
+    """
+    Build the Plotly line chart of closing prices as an HTML fragment.
+    plotly.js itself is not included; the page loads it once.
+    Indicator overlays are drawn from their columns in df.
+    """
+    fig = px.line(
+        df,
+        x=df.index,
+        y='Close',
+        title=f'{ticker.upper()} Stock Price',
+        template='plotly_white'
+    )
+
+    for overlay in overlays:
+        for column in CHART_OVERLAYS[overlay][1]:
+            fig.add_scatter(x=df.index, y=df[column], mode='lines', name=column.upper(), line={'width': 1})
+
+    fig.update_layout(
+        xaxis_title='Date',
+        yaxis_title='Price (USD)',
+        hovermode='x unified'
+    )
+
+    return fig.to_html(full_html=False, include_plotlyjs=False, config={'displayModeBar': True})
+
+
+def render_chart(df: pd.DataFrame, ticker: str, period: str, interval: str, points: Optional[int] = None,
+                 overlays: Sequence[str] = ()) -> str:
+    """
+    Return the chart fragment for a frame, reusing a previously rendered one
+    when the same view of the same data was requested before.
+    Args:
+        df (pd.DataFrame): Historical price data
+        ticker (str): Stock ticker symbol
+        period (str): Time period of the data
+        interval (str): Data interval
+        points (Optional[int]): Downsample the series to about this many points
+        overlays (Sequence[str]): Names of CHART_OVERLAYS to draw over the price
+    Returns:
+        str: HTML fragment of the chart
+    """
+    overlays = tuple(overlays)
+    key = (ticker, period, interval, points, overlays, frame_version(df))
+    graph_html = _chart_cache.get(key)
+    if graph_html is not None:
+        logger.debug("Chart cache hit for %s (%s/%s)", ticker, period, interval, extra=sampled('cache_hit'))
+        return graph_html
+
+    if overlays:
+        # Indicators are computed on the full series, then sampled with it
+        df = df.join(default_engine.compute(ticker, interval, df))
+    if points:
+        df = downsample_frame(df, 'Close', points)
+    graph_html = build_chart_html(df, ticker, overlays)
+    _chart_cache.set(key, graph_html)
+    return graph_html
+
+
+def chart_cache_stats() -> Dict[str, float]:
+    """Return hit/miss counters of the rendered-chart cache"""
+    return _chart_cache.stats()
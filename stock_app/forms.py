@@ -1,5 +1,46 @@
+from typing import List
+
 from django import forms
-from src.services.yfinance_service import StockData
+from src.services.chart_options import CHART_OVERLAYS, PERIOD_INTERVAL_MAP, get_available_intervals, get_available_periods
+from src.services.symbols import is_known_symbol
+
+
+def clean_ticker_symbol(ticker: str) -> str:
+    """Validate ticker format, check it against the symbol directory and upper-case it"""
+    if not ticker.replace('.', '').isalpha():
+        raise forms.ValidationError("Invalid ticker format. Only letters and periods are allowed.")
+    ticker = ticker.upper()
+    if not is_known_symbol(ticker):
+        raise forms.ValidationError(f"Unknown ticker symbol '{ticker}'.")
+    return ticker
+
+
+def clean_ticker_list(value: str, max_tickers: int, required: bool = False) -> List[str]:
+    """Split, upper-case and de-duplicate comma-separated tickers, and check them against the symbol directory"""
+    tickers = list(dict.fromkeys(ticker.strip().upper() for ticker in value.split(',') if ticker.strip()))
+    if required and not tickers:
+        raise forms.ValidationError("At least one ticker is required.")
+    if len(tickers) > max_tickers:
+        raise forms.ValidationError(f"At most {max_tickers} tickers are allowed.")
+    invalid = [ticker for ticker in tickers if not ticker.replace('.', '').isalpha()]
+    if invalid:
+        raise forms.ValidationError(f"Invalid ticker format: {', '.join(invalid)}")
+    unknown = [ticker for ticker in tickers if not is_known_symbol(ticker)]
+    if unknown:
+        raise forms.ValidationError(f"Unknown ticker symbols: {', '.join(unknown)}")
+    return tickers
+
+
+class IntervalForPeriodMixin:
+    """Form mixin rejecting an `interval` that is not offered for the `period`"""
+
+    def clean(self):
+        cleaned_data = super().clean()
+        period, interval = cleaned_data.get('period'), cleaned_data.get('interval')
+        if period and interval and interval not in get_available_intervals(period):
+            self.add_error('interval', f"Invalid interval '{interval}' for period '{period}'.")
+        return cleaned_data
+
 
 class StockForm(forms.Form):
     ticker = forms.CharField(
@@ -9,13 +50,15 @@ class StockForm(forms.Form):
         widget=forms.TextInput(attrs={
             'class': 'form-control',
             'placeholder': 'e.g., AAPL',
-            'pattern': '^[A-Za-z.]{1,10}$'
+            'pattern': '^[A-Za-z.]{1,10}$',
+            'list': 'ticker-options',  # Filled from the symbols endpoint as the user types
+            'autocomplete': 'off'
         })
     )
     
     period = forms.ChoiceField(
         label="Period",
-        choices=[(period, period) for period in StockData.get_available_periods()],
+        choices=[(period, period) for period in get_available_periods()],
         widget=forms.Select(attrs={'class': 'form-select'})
     )
     
@@ -25,27 +68,111 @@ class StockForm(forms.Form):
         widget=forms.Select(attrs={'class': 'form-select'})
     )
     
+    downsample = forms.BooleanField(
+        label="Downsample long series",
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+    
+    indicators = forms.MultipleChoiceField(
+        label="Indicators",
+        required=False,
+        choices=[(name, label) for name, (label, _) in CHART_OVERLAYS.items()],
+        widget=forms.CheckboxSelectMultiple(attrs={'class': 'form-check-input'})
+    )
+    
+    chart_width = forms.IntegerField(
+        required=False,
+        min_value=1,
+        widget=forms.HiddenInput()  # Set by the page to the chart container width in pixels
+    )
+    
     def __init__(self, *args, **kwargs):
         super(StockForm, self).__init__(*args, **kwargs)
         if 'period' in self.data:
             try:
                 period = self.data.get('period')
                 self.fields['interval'].choices = [
-                    (interval, interval) for interval in StockData.get_available_intervals(period)
+                    (interval, interval) for interval in get_available_intervals(period)
                 ]
             except (ValueError, TypeError):
                 self.fields['interval'].choices = []
         elif self.initial.get('period'):
             period = self.initial.get('period')
             self.fields['interval'].choices = [
-                (interval, interval) for interval in StockData.get_available_intervals(period)
+                (interval, interval) for interval in get_available_intervals(period)
             ]
         else:
             self.fields['interval'].choices = []
     
     def clean_ticker(self):
-        """Validate ticker format"""
-        ticker = self.cleaned_data['ticker']
-        if not ticker.replace('.', '').isalpha():
-            raise forms.ValidationError("Invalid ticker format. Only letters and periods are allowed.")
-        return ticker.upper()
\ No newline at end of file
+        """Validate ticker format and check it against the symbol directory"""
+        return clean_ticker_symbol(self.cleaned_data['ticker'])
+
+
+class AnalyticsForm(IntervalForPeriodMixin, forms.Form):
+    """Query of the cross-asset analytics endpoint"""
+    MAX_TICKERS = 500
+
+    tickers = forms.CharField(required=False)  # Comma-separated; the watchlist when empty
+    period = forms.ChoiceField(choices=[(period, period) for period in get_available_periods()])
+    interval = forms.CharField()
+    covariance = forms.BooleanField(required=False)
+
+    def clean_tickers(self):
+        """Split, upper-case and de-duplicate the tickers, and check them against the symbol directory"""
+        return clean_ticker_list(self.cleaned_data['tickers'], self.MAX_TICKERS)
+
+
+class BacktestForm(IntervalForPeriodMixin, forms.Form):
+    """Query of the backtest endpoint"""
+    MAX_TOP = 50
+
+    ticker = forms.CharField(max_length=10)
+    period = forms.ChoiceField(choices=[(period, period) for period in get_available_periods()])
+    interval = forms.CharField()
+    strategy = forms.CharField(required=False)  # Strategy or preset name; config.yaml `trading_strategy` when empty
+    params = forms.CharField(required=False)  # Semicolon-separated name=values, e.g. "fast=10:50:10;slow=200"
+    sweep = forms.BooleanField(required=False)  # Also sweep the strategy's default parameter grid
+    top = forms.IntegerField(required=False, min_value=1, max_value=MAX_TOP)
+
+    def clean_ticker(self):
+        """Validate ticker format and check it against the symbol directory"""
+        return clean_ticker_symbol(self.cleaned_data['ticker'])
+
+    def clean_params(self):
+        """Split into fixed parameters and a sweep grid"""
+        from src.services.backtest import parse_params
+
+        value = self.cleaned_data['params']
+        try:
+            return parse_params([item for item in value.split(';') if item.strip()])
+        except ValueError as e:
+            raise forms.ValidationError(f"Invalid parameters: {e}")
+
+
+class LiveForm(forms.Form):
+    """Query of the live updates stream"""
+    ticker = forms.CharField(max_length=10)
+    interval = forms.ChoiceField(
+        choices=[(interval, interval) for interval in dict.fromkeys(sum(PERIOD_INTERVAL_MAP.values(), []))]
+    )
+    since = forms.IntegerField(required=False)  # Epoch ms of the viewer's last bar
+
+    def clean_ticker(self):
+        """Validate ticker format and check it against the symbol directory"""
+        return clean_ticker_symbol(self.cleaned_data['ticker'])
+
+
+class ExportForm(IntervalForPeriodMixin, forms.Form):
+    """Query of the export endpoint"""
+    MAX_TICKERS = 100
+
+    tickers = forms.CharField()  # Comma-separated
+    period = forms.ChoiceField(choices=[(period, period) for period in get_available_periods()])
+    interval = forms.CharField()
+    format = forms.ChoiceField(choices=[('csv', 'CSV'), ('parquet', 'Parquet')], required=False)
+
+    def clean_tickers(self):
+        """Split, upper-case and de-duplicate the tickers, and check them against the symbol directory"""
+        return clean_ticker_list(self.cleaned_data['tickers'], self.MAX_TICKERS, required=True)
@@ -0,0 +1,66 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from src.services.app_config import get_watchlist
+from src.services.backtest import (
+    STAT_NAMES, STRATEGIES, STRATEGY_PRESETS, BacktestError, backtest_ticker, parse_params,
+)
+from src.services.yfinance_service import StockDataError
+
+
+class Command(BaseCommand):
+    help = (
+        "Backtest a trading strategy on a ticker's history, or sweep its parameters across the process pool "
+        "(settings.STOCK_BACKTEST['WORKERS']). The strategy defaults to config.yaml `trading_strategy`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ticker', help="Ticker to backtest (default: the first watchlist ticker)")
+        parser.add_argument('--period', default='10y', help="History to use (default: %(default)s)")
+        parser.add_argument('--interval', default='1d', help="Bar interval (default: %(default)s)")
+        parser.add_argument('--strategy', choices=sorted(STRATEGIES) + sorted(STRATEGY_PRESETS),
+                            help="Strategy or preset (default: config.yaml `trading_strategy`)")
+        parser.add_argument('--param', action='append', default=[], metavar='NAME=VALUES',
+                            help="Parameter value, list (10,20,50) or inclusive range (5:100:5); "
+                                 "several values are swept. Repeatable.")
+        parser.add_argument('--sweep', action='store_true', help="Sweep the strategy's default parameter grid")
+        parser.add_argument('--top', type=int, default=10, help="Results to show (default: %(default)s)")
+        parser.add_argument('--workers', type=int, help="Sweep processes (default: settings.STOCK_BACKTEST)")
+        parser.add_argument('--json', action='store_true', help="Print the report, with equity curves, as JSON")
+
+    def handle(self, *args, **options):
+        ticker = options['ticker'] or next(iter(get_watchlist()), None)
+        if not ticker:
+            raise CommandError("No ticker given: pass --ticker or set `watchlist` in config.yaml")
+        try:
+            params, grid = parse_params(options['param'])
+        except ValueError as e:
+            raise CommandError(f"Invalid --param: {e}")
+        if options['workers'] is not None:
+            settings.STOCK_BACKTEST['WORKERS'] = max(1, options['workers'])
+
+        try:
+            report = backtest_ticker(ticker.upper(), options['period'], options['interval'],
+                                     strategy=options['strategy'], params=params, grid=grid,
+                                     sweep_defaults=options['sweep'], top=max(1, options['top']))
+        except (BacktestError, StockDataError) as e:
+            raise CommandError(str(e))
+
+        if options['json']:
+            self.stdout.write(json.dumps(report.to_dict()))
+            return
+        self._print_report(report)
+
+    def _print_report(self, report):
+        self.stdout.write(
+            f"{report.strategy} on {report.ticker} ({report.period}/{report.interval}, {len(report.timestamps)} bars): "
+            f"{report.combinations} combinations in {report.elapsed:.2f}s"
+        )
+        header = f"  {'params':32}" + ''.join(f"{name:>14}" for name in STAT_NAMES)
+        self.stdout.write(header)
+        rows = [(', '.join(f"{k}={v}" for k, v in r.params.items()), r.stats) for r in report.results]
+        rows.append(('buy and hold', report.benchmark.stats))
+        for label, stats in rows:
+            self.stdout.write(f"  {label:32}" + ''.join(f"{stats[name]:14.4g}" for name in STAT_NAMES))
@@ -0,0 +1,76 @@
+import os
+import sys
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from src.services.app_config import get_watchlist
+from src.services.export import FORMATS, ExportError, plan_export
+from src.services.yfinance_service import StockDataError
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the bars of one or more tickers (default: the watchlist) as CSV or Parquet. "
+        "The file is written as it is serialized, so memory use does not grow with the number of rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickers', help="Comma-separated tickers to export instead of the watchlist")
+        parser.add_argument('--period', default='max', help="History to export (default: %(default)s)")
+        parser.add_argument('--interval', default='1d', help="Bar interval (default: %(default)s)")
+        parser.add_argument('--format', choices=sorted(FORMATS),
+                            help="File format (default: from the --output extension, else csv)")
+        parser.add_argument('--output', default='-', help="File to write, or - for standard output (CSV only)")
+
+    def handle(self, *args, **options):
+        if options['tickers']:
+            tickers = [ticker.strip().upper() for ticker in options['tickers'].split(',') if ticker.strip()]
+        else:
+            tickers = get_watchlist()
+        if not tickers:
+            raise CommandError("No tickers to export: set `watchlist` in config.yaml or pass --tickers")
+
+        output = options['output']
+        export_format = options['format'] or ('parquet' if output.endswith('.parquet') else 'csv')
+        if output == '-' and export_format != 'csv':
+            raise CommandError("Parquet is binary; pass --output")
+
+        try:
+            plan = plan_export(tickers, options['period'], options['interval'], export_format)
+        except ExportError as e:
+            raise CommandError(str(e))
+        for ticker, message in sorted(plan.errors.items()):
+            self.stderr.write(f"  skipped {ticker}: {message}")
+
+        try:
+            if output == '-':
+                written = self._write(plan, sys.stdout.buffer)
+            else:
+                # Write next to the target and rename, so a failed export never leaves a partial file
+                directory = os.path.dirname(os.path.abspath(output))
+                fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=f'.{export_format}')
+                try:
+                    with os.fdopen(fd, 'wb') as f:
+                        written = self._write(plan, f)
+                    os.replace(tmp_path, output)
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+        except (ExportError, StockDataError) as e:
+            raise CommandError(f"Export failed: {e}")
+
+        if output != '-':
+            self.stdout.write(self.style.SUCCESS(
+                f"Wrote {len(plan.tickers)} tickers ({options['period']}/{options['interval']}), "
+                f"{written} bytes to {output}"
+            ))
+
+    @staticmethod
+    def _write(plan, f) -> int:
+        written = 0
+        for piece in plan.chunks():
+            f.write(piece)
+            written += len(piece)
+        f.flush()
+        return written
@@ -0,0 +1,80 @@
+import csv
+import io
+import os
+import tempfile
+import urllib.request
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from src.services.symbols import SymbolIndex
+
+# Daily symbol directories of NASDAQ Trader: Nasdaq listings, and NYSE, NYSE American, NYSE Arca and Cboe listings
+NASDAQ_LISTED_URL = 'https://www.nasdaqtrader.com/dynamic/SymDir/nasdaqlisted.txt'
+OTHER_LISTED_URL = 'https://www.nasdaqtrader.com/dynamic/SymDir/otherlisted.txt'
+
+
+def parse_directory(text: str, symbol_column: str):
+    """
+    Yield (symbol, name) from a pipe-delimited NASDAQ Trader directory, skipping
+    test issues and symbols the ticker form would not accept (e.g. preferred
+    shares and warrants with '$' or '=' in the symbol).
+    """
+    lines = [line for line in text.splitlines() if line and not line.startswith('File Creation Time')]
+    for row in csv.DictReader(io.StringIO('\n'.join(lines)), delimiter='|'):
+        symbol = (row.get(symbol_column) or '').strip()
+        if row.get('Test Issue') == 'Y' or not symbol.replace('.', '').isalpha() or len(symbol) > 10:
+            continue
+        yield symbol, (row.get('Security Name') or '').strip()
+
+
+class Command(BaseCommand):
+    help = (
+        "Download the listed symbols of the US exchanges from NASDAQ Trader and write them as the "
+        "symbol directory behind ticker autocomplete and validation (settings.STOCK_SYMBOLS['FILE']). "
+        "Running workers load the new file when they restart. Unknown tickers are only rejected "
+        "against a full directory, so run this (with --if-partial) on deploy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.STOCK_SYMBOLS['FILE'],
+                            help="CSV file to write (default: %(default)s)")
+        parser.add_argument('--timeout', type=float, default=30, help="Seconds to wait for each download")
+        parser.add_argument('--if-partial', action='store_true',
+                            help="Only download when the current file is not a full directory; for deploy scripts")
+
+    def handle(self, *args, **options):
+        if options['if_partial']:
+            current = SymbolIndex.from_csv(options['output'])
+            if current.is_full:
+                self.stdout.write(f"{options['output']} already lists {len(current)} symbols; not updating")
+                return
+
+        entries = []
+        for url, symbol_column in ((NASDAQ_LISTED_URL, 'Symbol'), (OTHER_LISTED_URL, 'ACT Symbol')):
+            try:
+                with urllib.request.urlopen(url, timeout=options['timeout']) as response:
+                    text = response.read().decode('utf-8', errors='replace')
+            except OSError as e:
+                raise CommandError(f"Could not download {url}: {e}")
+            found = list(parse_directory(text, symbol_column))
+            self.stdout.write(f"  {len(found):6d} symbols from {url}")
+            entries += found
+        if not entries:
+            raise CommandError("The downloaded directories list no symbols; keeping the current file")
+
+        index = SymbolIndex(entries)
+        output = options['output']
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        # Write next to the target and rename, so a worker never loads a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output)), suffix='.csv')
+        try:
+            with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f, lineterminator='\n')
+                writer.writerow(['symbol', 'name'])
+                writer.writerows(zip(index.symbols, index.names))
+            os.replace(tmp_path, output)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(index)} symbols to {output}"))
@@ -0,0 +1,61 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from src.services.app_config import get_watchlist
+from src.services.warmup import ALL_COMBINATIONS, COMMON_COMBINATIONS, warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        "Prefetch historical data for the watchlist (config.yaml `watchlist`, or `yfinance_ticker`) "
+        "into the shared frame cache and bar store, so the first page loads after a deploy are cache hits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickers', help="Comma-separated tickers to warm instead of the watchlist")
+        parser.add_argument('--all-intervals', action='store_true',
+                            help="Warm every period/interval combination, not only each period's default interval")
+        parser.add_argument('--rate', type=float, default=settings.STOCK_WARMUP['RATE'],
+                            help="Upstream calls per second this command may start (default: %(default)s)")
+        parser.add_argument('--ahead', type=float, default=0,
+                            help="Also refetch entries that expire within this many seconds")
+        parser.add_argument('--loop', type=float, metavar='SECONDS',
+                            help="Keep running, starting a pass every SECONDS")
+
+    def handle(self, *args, **options):
+        if options['tickers']:
+            tickers = [ticker.strip().upper() for ticker in options['tickers'].split(',') if ticker.strip()]
+        else:
+            tickers = get_watchlist()
+        if not tickers:
+            raise CommandError("No tickers to warm: set `watchlist` in config.yaml or pass --tickers")
+
+        combinations = ALL_COMBINATIONS if options['all_intervals'] else COMMON_COMBINATIONS
+        self.stdout.write(f"Warming {len(tickers)} tickers x {len(combinations)} period/interval combinations")
+
+        while True:
+            report = warm_up(tickers, combinations, rate=options['rate'], refresh_within=options['ahead'])
+            self._print_report(report)
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
+
+    def _print_report(self, report):
+        for (period, interval), warmed in sorted(report.warmed.items()):
+            fresh = report.fresh.get((period, interval), [])
+            errors = report.errors.get((period, interval), {})
+            self.stdout.write(
+                f"  {period:>4}/{interval:<4} warmed {len(warmed):3d}  fresh {len(fresh):3d}  errors {len(errors):3d}"
+            )
+            for ticker, message in sorted(errors.items()):
+                self.stderr.write(f"    {ticker}: {message}")
+        summary = (
+            f"Warmed {report.warmed_count} entries with {report.upstream_calls} upstream calls "
+            f"in {report.elapsed:.1f}s"
+        )
+        if report.error_count:
+            self.stdout.write(self.style.WARNING(f"{summary}; {report.error_count} failed"))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
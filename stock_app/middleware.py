@@ -0,0 +1,47 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from src.services.metrics import REQUEST_SECONDS, REQUESTS_IN_FLIGHT, RequestTimings, request_scope
+
+
+class RequestTimingMiddleware:
+    """
+    Times every request and the phases recorded while handling it (cache,
+    upstream fetch, chart building, template rendering, ...), feeding the
+    histograms served by /metrics. With STOCK_METRICS['SERVER_TIMING'] the
+    phases are also sent in a Server-Timing header. For streamed responses
+    the time is measured up to the start of the stream.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = settings.STOCK_METRICS['SERVER_TIMING']
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with REQUESTS_IN_FLIGHT.track(), request_scope() as timings:
+            response = self.get_response(request)
+            self._finish(request, response, timings)
+        return response
+
+    async def __acall__(self, request):
+        with REQUESTS_IN_FLIGHT.track(), request_scope() as timings:
+            response = await self.get_response(request)
+            self._finish(request, response, timings)
+        return response
+
+    def _finish(self, request, response, timings: RequestTimings) -> None:
+        total = time.perf_counter() - timings.started
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match is not None else 'unmatched'
+        REQUEST_SECONDS.observe(total, view, f"{response.status_code // 100}xx")
+        if self.server_timing:
+            response['Server-Timing'] = timings.server_timing(total)
@@ -1,17 +1,185 @@
+import asyncio
 import logging
+import random
+import re
+import threading
+import time
+import weakref
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple, TypeVar
+import httpx
 from django.conf import settings
 from mistralai import Mistral
+from mistralai.models import SDKError
+from src.services.limiter import AsyncLimiter, LimiterFullError
+from src.services.log_pipeline import sampled
+from src.services.lru import LRUCache
+from src.services.metrics import (
+    UPSTREAM_ERRORS, Sample, cache_samples, error_label, record_phase, registry, timed, upstream_call,
+)
 
 logger = logging.getLogger('stock_app')
 
+# Punctuation that ends a question without changing it ("buy AAPL?" and "buy AAPL");
+# punctuation inside the message can carry meaning ("AAPL > MSFT", "1.5%") and is kept
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+_WHITESPACE = re.compile(r"\s+")
+# Significant digits of the indicator values in a response cache key, so answers are reused
+# while the latest bar moves within a few percent during market hours
+INDICATOR_KEY_DIGITS = 2
+
+
+T = TypeVar('T')
+
+
+def normalize_message(message: str) -> str:
+    """Normalize a chat message for cache lookups: case, whitespace and trailing punctuation are ignored"""
+    return _TRAILING_PUNCTUATION.sub('', _WHITESPACE.sub(' ', message.casefold()).strip())
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limiting and server errors are worth retrying; other client errors are not"""
+    return isinstance(error, SDKError) and (error.status_code == 429 or error.status_code >= 500)
+
+
+class _LoopResources(NamedTuple):
+    """Async SDK client over a pooled HTTP connection, and the limiter guarding it"""
+    client: Mistral
+    limiter: AsyncLimiter
+
 
 class MistralAIClient:
     def __init__(self):
         self.api_key = settings.MISTRAL_API_KEY
         self.model_name = settings.MISTRAL_MODEL_NAME
-        self.client = Mistral(api_key=self.api_key)  # Initialize the client as per Mistral AI's documentation
+        # Initialize the client as per Mistral AI's documentation; server_url is
+        # only set to point the client at a local or proxy endpoint
+        self.client = Mistral(api_key=self.api_key, server_url=settings.MISTRAL_SERVER_URL)
+        # Answers to equivalent questions about the same chart are reused
+        cache_config = settings.MISTRAL_RESPONSE_CACHE
+        self.response_cache = LRUCache(max_entries=cache_config['MAX_ENTRIES'], ttl=cache_config['TTL'])
+        self.limits = settings.MISTRAL_CLIENT
+        # HTTP pools and semaphores belong to an event loop, so the async path keeps one set per loop
+        self._loop_resources: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopResources]' = \
+            weakref.WeakKeyDictionary()
+
+    def _cache_key(self, message: str, ticker: str, period: str, interval: str,
+                   indicators: Optional[Dict[str, float]] = None) -> Tuple:
+        """Key a response by the normalized question, the chart selection, the rounded data it saw and the model"""
+        context = tuple(sorted(
+            (name, float(f"{value:.{INDICATOR_KEY_DIGITS}g}")) for name, value in (indicators or {}).items()
+        ))
+        return (normalize_message(message), ticker.strip().upper(), period, interval, context, self.model_name)
+
+    def cache_stats(self) -> Dict[str, float]:
+        """Return hit/miss counters of the response cache"""
+        return self.response_cache.stats()
+
+    def concurrency_stats(self) -> Dict[str, int]:
+        """Return limiter counters of the async path, summed over event loops"""
+        totals: Dict[str, int] = {}
+        for resources in list(self._loop_resources.values()):
+            for key, value in resources.limiter.stats().items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def metric_samples(self) -> List[Sample]:
+        """Report the response cache and the concurrency limiter as samples for /metrics"""
+        samples = cache_samples('mistral_response', self.cache_stats())
+        chat = self.concurrency_stats()
+        for state in ('active', 'waiting'):
+            samples.append(Sample('stock_app_mistral_calls', 'gauge', "Mistral AI calls holding or waiting for a slot",
+                                  chat.get(state, 0), {'state': state}))
+        for outcome in ('admitted', 'rejected', 'timed_out'):
+            samples.append(Sample('stock_app_mistral_admissions_total', 'counter',
+                                  "Mistral AI calls by concurrency limiter outcome",
+                                  chat.get(outcome, 0), {'outcome': outcome}))
+        return samples
+
+    def _async_resources(self) -> _LoopResources:
+        """Return the pooled async client and limiter of the running event loop"""
+        loop = asyncio.get_running_loop()
+        resources = self._loop_resources.get(loop)
+        if resources is None:
+            http_client = httpx.AsyncClient(
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=self.limits['POOL_CONNECTIONS'],
+                    max_keepalive_connections=self.limits['POOL_CONNECTIONS'],
+                ),
+            )
+            resources = _LoopResources(
+                client=Mistral(api_key=self.api_key, server_url=settings.MISTRAL_SERVER_URL,
+                               async_client=http_client),
+                limiter=AsyncLimiter(self.limits['MAX_CONCURRENCY'], self.limits['MAX_WAITING']),
+            )
+            self._loop_resources[loop] = resources
+        return resources
+
+    def _retry_delay(self, attempt: int, error: SDKError) -> float:
+        """Exponential backoff with full jitter, but never sooner than the server's Retry-After"""
+        ceiling = min(self.limits['RETRY_BACKOFF_MAX'], self.limits['RETRY_BACKOFF'] * 2 ** attempt)
+        delay = random.uniform(0, ceiling)
+        try:
+            retry_after = float(error.raw_response.headers.get('retry-after'))
+        except (AttributeError, TypeError, ValueError):
+            retry_after = None
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.limits['RETRY_BACKOFF_MAX']))
+        return delay
 
-    def get_response(self, message: str, ticker: str, period: str, interval: str) -> str:
+    async def _call_with_retries(self, call: Callable[[], Awaitable[T]]) -> T:
+        """
+        Await an upstream call with the per-call timeout, retrying 429 and 5xx responses.
+        Raises:
+            asyncio.TimeoutError: If an attempt takes longer than the timeout
+            SDKError: If the last attempt failed or the error is not retryable
+        """
+        attempt = 0
+        while True:
+            try:
+                with upstream_call('mistral'):
+                    return await asyncio.wait_for(call(), self.limits['TIMEOUT'])
+            except SDKError as e:
+                if not is_retryable(e) or attempt >= self.limits['MAX_RETRIES']:
+                    raise
+                delay = self._retry_delay(attempt, e)
+                attempt += 1
+                logger.warning(f"Mistral AI returned {e.status_code}; retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def _with_idle_timeout(self, events: AsyncIterator[T]) -> AsyncIterator[T]:
+        """Iterate a stream, failing if no event arrives within TIMEOUT"""
+        iterator = events.__aiter__()
+        while True:
+            try:
+                event = await asyncio.wait_for(iterator.__anext__(), self.limits['TIMEOUT'])
+            except StopAsyncIteration:
+                return
+            yield event
+
+    @staticmethod
+    def _build_messages(message: str, ticker: str, period: str, interval: str,
+                        indicators: Optional[Dict[str, float]] = None) -> List[Dict[str, str]]:
+        """Construct the user message with comprehensive context"""
+        data_context = ""
+        if indicators:
+            values = ", ".join(f"{name}={value:g}" for name, value in indicators.items())
+            data_context = f"Latest values over the selected window: {values}. "
+        user_content = (
+            f"You are a financial advisor specializing in stock market strategies. "
+            f"The user has selected the stock ticker '{ticker}' with a period of '{period}' and an interval of '{interval}'. "
+            f"{data_context}"
+            f"Based on the following message, provide a strategic analysis or advice: \"{message}\""
+        )
+        return [
+            {
+                "role": "user",
+                "content": user_content,
+            },
+        ]
+
+    def get_response(self, message: str, ticker: str, period: str, interval: str,
+                     indicators: Optional[Dict[str, float]] = None) -> str:
         """
         Get a response from Mistral AI based on the user's message, selected stock ticker, period, and interval.
 
@@ -20,33 +188,170 @@ class MistralAIClient:
             ticker (str): The selected stock ticker symbol.
             period (str): The selected period (e.g., '1d', '5d', '1mo').
             interval (str): The selected interval (e.g., '1m', '5m', '1h').
+            indicators (Optional[Dict[str, float]]): Latest indicator values of the chart, if available.
 
         Returns:
             str: The AI's generated response.
         """
-        try:
-            # Construct the user message with comprehensive context
-            user_content = (
-                f"You are a financial advisor specializing in stock market strategies. "
-                f"The user has selected the stock ticker '{ticker}' with a period of '{period}' and an interval of '{interval}'. "
-                f"Based on the following message, provide a strategic analysis or advice: \"{message}\""
-            )
+        cache_key = self._cache_key(message, ticker, period, interval, indicators)
+        cached_text = self.response_cache.get(cache_key)
+        if cached_text is not None:
+            logger.info("Mistral AI response cache hit for %s (%s/%s)", ticker, period, interval,
+                        extra=sampled('cache_hit'))
+            return cached_text
 
+        try:
             # Call the chat completion API
-            chat_response = self.client.chat.complete(
-                model=self.model_name,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": user_content,
-                    },
-                ]
-            )
+            with timed('mistral'), upstream_call('mistral'):
+                chat_response = self.client.chat.complete(
+                    model=self.model_name,
+                    messages=self._build_messages(message, ticker, period, interval, indicators)
+                )
 
             # Extract AI's response
             ai_text = chat_response.choices[0].message.content.strip()
+            self.response_cache.set(cache_key, ai_text)
             return ai_text
 
         except Exception as e:
             logger.error(f"Error communicating with Mistral AI: {e}")
-            raise
\ No newline at end of file
+            raise
+
+    async def aget_response(self, message: str, ticker: str, period: str, interval: str,
+                            indicators: Optional[Dict[str, float]] = None) -> str:
+        """
+        Async variant of get_response() over a pooled connection.
+
+        At most MAX_CONCURRENCY calls run upstream at once; further callers wait
+        in a bounded queue. Each attempt is bounded by TIMEOUT, and 429 and 5xx
+        responses are retried with jittered backoff.
+
+        Args:
+            message (str): The user's input message.
+            ticker (str): The selected stock ticker symbol.
+            period (str): The selected period (e.g., '1d', '5d', '1mo').
+            interval (str): The selected interval (e.g., '1m', '5m', '1h').
+            indicators (Optional[Dict[str, float]]): Latest indicator values of the chart, if available.
+
+        Returns:
+            str: The AI's generated response.
+
+        Raises:
+            LimiterFullError: If too many calls are already queued or none finished in time.
+            asyncio.TimeoutError: If the upstream call timed out.
+        """
+        cache_key = self._cache_key(message, ticker, period, interval, indicators)
+        cached_text = self.response_cache.get(cache_key)
+        if cached_text is not None:
+            logger.info("Mistral AI response cache hit for %s (%s/%s)", ticker, period, interval,
+                        extra=sampled('cache_hit'))
+            return cached_text
+
+        client, limiter = self._async_resources()
+        try:
+            # Includes the wait for a concurrency slot and any retries
+            with timed('mistral'):
+                async with limiter.slot(self.limits['QUEUE_TIMEOUT']):
+                    chat_response = await self._call_with_retries(lambda: client.chat.complete_async(
+                        model=self.model_name,
+                        messages=self._build_messages(message, ticker, period, interval, indicators)
+                    ))
+
+            ai_text = chat_response.choices[0].message.content.strip()
+            self.response_cache.set(cache_key, ai_text)
+            return ai_text
+
+        except LimiterFullError as e:
+            logger.warning(f"Mistral AI call rejected: {e}")
+            raise
+
+        except Exception as e:
+            logger.error(f"Error communicating with Mistral AI: {e!r}")
+            raise
+
+    async def stream_response(self, message: str, ticker: str, period: str, interval: str,
+                              indicators: Optional[Dict[str, float]] = None) -> AsyncIterator[str]:
+        """
+        Stream a response from Mistral AI token by token.
+
+        The upstream stream is closed as soon as the consumer stops iterating,
+        e.g. when the task is cancelled because the browser disconnected, so
+        abandoned generations are not paid for. A stream holds a concurrency
+        slot until it ends; opening it is retried like aget_response(), and
+        TIMEOUT also bounds the wait for each token.
+
+        Args:
+            message (str): The user's input message.
+            ticker (str): The selected stock ticker symbol.
+            period (str): The selected period (e.g., '1d', '5d', '1mo').
+            interval (str): The selected interval (e.g., '1m', '5m', '1h').
+            indicators (Optional[Dict[str, float]]): Latest indicator values of the chart, if available.
+
+        Yields:
+            str: Text fragments of the AI's response as they arrive.
+        """
+        cache_key = self._cache_key(message, ticker, period, interval, indicators)
+        cached_text = self.response_cache.get(cache_key)
+        if cached_text is not None:
+            logger.info("Mistral AI response cache hit for %s (%s/%s)", ticker, period, interval,
+                        extra=sampled('cache_hit'))
+            yield cached_text
+            return
+
+        client, limiter = self._async_resources()
+        started = time.perf_counter()
+        first_token_at = None
+        opened = completed = False
+        parts = []
+        try:
+            async with limiter.slot(self.limits['QUEUE_TIMEOUT']):
+                response = await self._call_with_retries(lambda: client.chat.stream_async(
+                    model=self.model_name,
+                    messages=self._build_messages(message, ticker, period, interval, indicators)
+                ))
+                opened = True
+                async with response as events:
+                    async for event in self._with_idle_timeout(events):
+                        delta = event.data.choices[0].delta.content if event.data.choices else None
+                        if not isinstance(delta, str) or not delta:
+                            continue
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                            record_phase('mistral_first_token', first_token_at - started)
+                            logger.info(f"Mistral AI time to first token: {(first_token_at - started) * 1000:.0f} ms")
+                        parts.append(delta)
+                        yield delta
+            completed = True
+            record_phase('mistral_stream', time.perf_counter() - started)
+            # Only complete answers are cached
+            self.response_cache.set(cache_key, ''.join(parts).strip())
+
+        except LimiterFullError as e:
+            logger.warning(f"Mistral AI stream rejected: {e}")
+            raise
+
+        except Exception as e:
+            if opened:
+                # Failures while opening the stream are counted per attempt
+                UPSTREAM_ERRORS.inc('mistral', error_label(e))
+            logger.error(f"Error streaming from Mistral AI: {e!r}")
+            raise
+
+        finally:
+            if not completed:
+                logger.info(f"Mistral AI stream closed early after {time.perf_counter() - started:.2f}s")
+
+
+_client: Optional[MistralAIClient] = None
+_client_lock = threading.Lock()
+
+
+def get_mistral_client() -> MistralAIClient:
+    """Return the process-wide client, created on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MistralAIClient()
+                registry.add_collector(_client.metric_samples)
+    return _client
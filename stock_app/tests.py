@@ -1,3 +1,946 @@
 # tests.py
-from django.test import TestCase
-# Create your tests here
\ No newline at end of file
+import asyncio
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+from django.test import AsyncClient, SimpleTestCase, override_settings
+from mistralai.models import SDKError
+
+from benchmarks.fake_mistral import ANSWER, FakeMistralServer
+from benchmarks.fake_quotes import FakeQuotes
+from benchmarks.fake_yahoo import FakeYahoo, fake_bars
+from src.services import bar_store, fetch_scheduler, frame_cache, symbols, yfinance_service
+from src.services.analytics import CrossAssetAnalytics
+from src.services.backtest import STAT_NAMES, STRATEGIES, BacktestError, backtest_ticker, expand_grid, sweep
+from src.services.export import parse_range, plan_export
+from src.services.fetch_scheduler import FetchScheduler, Priority, ThrottledError
+from src.services.frame_cache import FLOAT32_TOLERANCE, TieredFrameCache, decode_frame, encode_frame
+from src.services.limiter import LimiterFullError
+from src.services.live import LiveHub
+from src.services.resample import resample_bars
+from src.services.symbols import FULL_DIRECTORY_SYMBOLS, SymbolIndex, is_known_symbol
+from src.services.warmup import WarmupWorker
+from src.services.yfinance_service import StockData, StockDataError
+from stock_app import mistral_ai
+from stock_app.views import _chat_event_stream, _indicator_summary
+
+
+class OfflineStockDataMixin:
+    """
+    Run StockData against benchmarks.fake_yahoo, with a frame cache, bar
+    store and fetch scheduler of the test's own.
+    """
+
+    def setUp(self):
+        super().setUp()
+        scratch = tempfile.mkdtemp(prefix='stock-test-')
+        self.addCleanup(shutil.rmtree, scratch, ignore_errors=True)
+        overrides = override_settings(
+            STOCK_FRAME_CACHE=dict(settings.STOCK_FRAME_CACHE, L2_DIR=os.path.join(scratch, 'frames')),
+            STOCK_BAR_STORE_DIR=os.path.join(scratch, 'bars'),
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        self.scheduler = FetchScheduler(rate=1000, burst=1000, max_concurrency=4, backoff=0.05, backoff_max=0.2)
+        self.yahoo = FakeYahoo(latency=0)
+        for target, name, value in ((frame_cache, '_default_cache', None), (bar_store, '_default_store', None),
+                                    (fetch_scheduler, '_scheduler', self.scheduler),
+                                    (yfinance_service, 'yf', self.yahoo)):
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+
+class FetchManyTests(OfflineStockDataMixin, SimpleTestCase):
+    """StockData.fetch_many with a stub downloader"""
+
+    def setUp(self):
+        super().setUp()
+        self.downloads = []
+        self.failing = set()
+        self.empty = set()
+
+    def downloader(self, ticker, period, interval):
+        self.downloads.append(ticker)
+        if ticker in self.failing:
+            raise StockDataError(f"yfinance could not download '{ticker}': timed out")
+        if ticker in self.empty:
+            return pd.DataFrame()
+        end = pd.Timestamp.now(tz='UTC').normalize()
+        return fake_bars(ticker, interval, end - pd.Timedelta(days=30), end)
+
+    def test_downloads_each_ticker_once_and_caches_it(self):
+        tickers = ['AAPL', 'MSFT', 'GOOGL']
+        result = StockData.fetch_many(tickers, '1mo', '1d', downloader=self.downloader)
+        self.assertEqual(sorted(self.downloads), sorted(tickers))
+        self.assertEqual(sorted(result.data), sorted(tickers))
+        self.assertEqual(result.errors, {})
+        self.assertTrue(all(len(df) for df in result.data.values()))
+
+        again = StockData.fetch_many(tickers, '1mo', '1d', downloader=self.downloader)
+        self.assertEqual(len(self.downloads), len(tickers))
+        self.assertEqual(sorted(again.cached), sorted(tickers))
+        pd.testing.assert_frame_equal(again.data['AAPL'], result.data['AAPL'])
+        # The same cache entry single-ticker reads use
+        pd.testing.assert_frame_equal(StockData('MSFT', '1mo', '1d').get_historical_data(), result.data['MSFT'])
+        self.assertEqual(self.yahoo.calls, 0)
+
+    def test_failed_ticker_does_not_fail_the_others_and_is_retried(self):
+        self.failing.add('MSFT')
+        result = StockData.fetch_many(['AAPL', 'MSFT', 'GOOGL'], '1mo', '1d', downloader=self.downloader)
+        self.assertEqual(sorted(result.data), ['AAPL', 'GOOGL'])
+        self.assertEqual(list(result.errors), ['MSFT'])
+        self.assertIsInstance(result.errors['MSFT'], StockDataError)
+
+        self.failing.clear()
+        result = StockData.fetch_many(['MSFT'], '1mo', '1d', downloader=self.downloader)
+        self.assertEqual(self.downloads.count('MSFT'), 2)
+        self.assertIn('MSFT', result.data)
+
+    def test_ticker_without_bars_is_not_downloaded_again(self):
+        self.empty.add('MSFT')
+        result = StockData.fetch_many(['AAPL', 'MSFT'], '1mo', '1d', downloader=self.downloader)
+        self.assertIn('MSFT', result.errors)
+
+        result = StockData.fetch_many(['AAPL', 'MSFT'], '1mo', '1d', downloader=self.downloader)
+        self.assertEqual(self.downloads.count('MSFT'), 1)
+        self.assertIn('MSFT', result.errors)
+        self.assertEqual(result.cached, ['AAPL'])
+
+    def test_invalid_request_is_reported_per_ticker(self):
+        result = StockData.fetch_many(['AAPL', ''], '1mo', '1d', downloader=self.downloader)
+        self.assertEqual(list(result.data), ['AAPL'])
+        self.assertEqual(list(result.errors), [''])
+        self.assertEqual(self.downloads, ['AAPL'])
+
+
+def fixture_bars(text: str) -> pd.DataFrame:
+    """OHLCV bars from CSV text, timestamps in exchange time as yfinance returns them"""
+    df = pd.read_csv(io.StringIO(text), index_col=0)
+    df.index = pd.DatetimeIndex(pd.to_datetime(df.index).tz_localize('America/New_York').as_unit('ns'), name='Datetime')
+    return df.astype(float)
+
+
+# One-minute bars of two sessions; the second only opens
+BARS_1M = """Datetime,Open,High,Low,Close,Volume
+2024-03-04 09:30,100.00,100.50,99.80,100.20,1000
+2024-03-04 09:31,100.20,100.40,100.00,100.10,800
+2024-03-04 09:32,100.10,100.90,100.05,100.80,1200
+2024-03-04 09:33,100.80,101.00,100.60,100.70,900
+2024-03-04 09:34,100.70,100.75,100.30,100.40,700
+2024-03-04 09:35,100.40,100.60,100.10,100.50,600
+2024-03-04 09:36,100.50,100.55,99.90,100.00,1100
+2024-03-04 09:37,100.00,100.30,99.95,100.25,500
+2024-03-04 09:38,100.25,100.45,100.20,100.40,400
+2024-03-04 09:39,100.40,100.70,100.35,100.65,950
+2024-03-05 09:30,101.00,101.20,100.90,101.10,300
+2024-03-05 09:31,101.10,101.30,101.00,101.25,200
+"""
+# The five-minute bars upstream returns for the same minutes
+BARS_5M = """Datetime,Open,High,Low,Close,Volume
+2024-03-04 09:30,100.00,101.00,99.80,100.40,4600
+2024-03-04 09:35,100.40,100.70,99.90,100.65,3550
+2024-03-05 09:30,101.00,101.30,100.90,101.25,500
+"""
+BARS_30M = """Datetime,Open,High,Low,Close,Volume
+2024-03-04 09:30,100.00,101.00,99.50,100.50,10000
+2024-03-04 10:00,100.50,102.00,100.20,101.80,8000
+2024-03-04 10:30,101.80,101.90,100.90,101.00,6000
+2024-03-04 11:00,101.00,101.40,100.70,101.30,5000
+"""
+# Hourly bars of US equities start on the half hour, at the open
+BARS_60M = """Datetime,Open,High,Low,Close,Volume
+2024-03-04 09:30,100.00,102.00,99.50,101.80,18000
+2024-03-04 10:30,101.80,101.90,100.70,101.30,11000
+"""
+# Daily bars across a week and a month boundary
+BARS_1D = """Datetime,Open,High,Low,Close,Volume
+2024-02-27,180.0,182.0,179.0,181.0,100
+2024-02-28,181.0,183.5,180.5,183.0,110
+2024-02-29,183.0,184.0,181.0,181.5,120
+2024-03-01,181.5,182.0,178.0,179.0,130
+2024-03-04,179.0,180.0,176.5,177.0,140
+2024-03-05,177.0,179.5,176.8,179.2,150
+"""
+BARS_1WK = """Datetime,Open,High,Low,Close,Volume
+2024-02-26,180.0,184.0,178.0,179.0,460
+2024-03-04,179.0,180.0,176.5,179.2,290
+"""
+BARS_1MO = """Datetime,Open,High,Low,Close,Volume
+2024-02-01,180.0,184.0,179.0,181.5,330
+2024-03-01,181.5,182.0,176.5,179.2,420
+"""
+
+
+class ResampleTests(SimpleTestCase):
+    """resample_bars against the coarser bars upstream returns for the same data"""
+
+    def assertResamplesTo(self, fine: str, interval: str, coarse: str):
+        pd.testing.assert_frame_equal(resample_bars(fixture_bars(fine), interval), fixture_bars(coarse))
+
+    def test_minutes_to_five_minutes(self):
+        self.assertResamplesTo(BARS_1M, '5m', BARS_5M)
+
+    def test_half_hours_to_hours_anchored_at_the_open(self):
+        self.assertResamplesTo(BARS_30M, '60m', BARS_60M)
+        self.assertResamplesTo(BARS_30M, '1h', BARS_60M)
+
+    def test_days_to_weeks_and_months(self):
+        self.assertResamplesTo(BARS_1D, '1wk', BARS_1WK)
+        self.assertResamplesTo(BARS_1D, '1mo', BARS_1MO)
+
+    def test_empty_and_unsupported(self):
+        empty = fixture_bars(BARS_1M).iloc[:0]
+        self.assertTrue(resample_bars(empty, '5m').empty)
+        with self.assertRaises(ValueError):
+            resample_bars(fixture_bars(BARS_1D), '1d')
+
+
+class ResampleCachedTests(OfflineStockDataMixin, SimpleTestCase):
+    """Coarser intervals built from cached finer bars instead of downloaded"""
+
+    def test_coarser_interval_is_built_from_cached_bars(self):
+        fine = fixture_bars(BARS_1M)
+        result = StockData.fetch_many(['AAPL'], '1d', '1m', downloader=lambda ticker, period, interval: fine)
+        self.assertEqual(result.errors, {})
+
+        df = StockData('AAPL', '1d', '5m').get_historical_data()
+        self.assertEqual(self.yahoo.calls, 0)
+        expected = fixture_bars(BARS_5M)
+        pd.testing.assert_frame_equal(df[expected.columns], expected, check_dtype=False, rtol=1e-6)
+
+
+def parse_events(text: str) -> list:
+    """(event, data) pairs of a server-sent event stream, comments and retry fields left out"""
+    events = []
+    for block in text.split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line and not line.startswith(':'))
+        if 'data' in fields:
+            events.append((fields.get('event', 'message'), json.loads(fields['data'])))
+    return events
+
+
+class FakeMistralMixin:
+    """
+    Point the Mistral client at a benchmarks.fake_mistral server; subclasses
+    set `server_options`.
+    """
+    server_options = {}
+
+    def setUp(self):
+        super().setUp()
+        self.server = FakeMistralServer(**self.server_options).start()
+        self.addCleanup(self.server.stop)
+        overrides = override_settings(MISTRAL_SERVER_URL=self.server.url, MISTRAL_API_KEY='offline')
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        patcher = mock.patch.object(mistral_ai, '_client', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class ChatStreamTests(FakeMistralMixin, OfflineStockDataMixin, SimpleTestCase):
+    """chat_with_ai streaming tokens as server-sent events"""
+    server_options = {'first_token_delay': 0, 'token_delay': 0.01}
+    fields = {'message': 'Should I buy?', 'ticker': 'AAPL', 'period': '1mo', 'interval': '1d', 'stream': '1'}
+
+    async def ask(self, **fields):
+        response = await AsyncClient().post('/chat/', dict(self.fields, **fields))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return response
+
+    async def test_tokens_are_streamed_then_done(self):
+        response = await self.ask()
+        events = parse_events(b''.join([chunk async for chunk in response.streaming_content]).decode())
+        tokens = [data['token'] for event, data in events if event == 'message']
+        self.assertGreater(len(tokens), 1)
+        self.assertEqual(''.join(tokens).strip(), ANSWER)
+        self.assertEqual(events[-1], ('done', {}))
+        self.assertEqual(self.server.requests, 1)
+
+    async def test_equivalent_question_is_answered_from_cache(self):
+        response = await self.ask()
+        b''.join([chunk async for chunk in response.streaming_content])
+
+        response = await self.ask(message='  should i BUY ')
+        events = parse_events(b''.join([chunk async for chunk in response.streaming_content]).decode())
+        self.assertEqual(events, [('message', {'token': ANSWER}), ('done', {})])
+        self.assertEqual(self.server.requests, 1)
+
+    async def test_upstream_error_ends_the_stream_with_an_error_event(self):
+        self.server.status = 400
+        response = await self.ask()
+        events = parse_events(b''.join([chunk async for chunk in response.streaming_content]).decode())
+        self.assertEqual([event for event, _ in events], ['error'])
+
+    async def test_indicator_context_never_fetches(self):
+        self.assertIsNone(await _indicator_summary('AAPL', '1mo', '1d'))
+        response = await self.ask()
+        b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(self.yahoo.calls, 0)
+
+        await StockData('AAPL', '1mo', '1d').aget_historical_data()  # The chart being asked about
+        summary = await _indicator_summary('AAPL', '1mo', '1d')
+        self.assertIn('close', summary)
+        self.assertEqual(self.yahoo.calls, 1)
+
+    async def test_disconnect_closes_the_upstream_stream(self):
+        self.server.token_delay = 0.05
+        # The view's event stream, closed the way the ASGI handler does when the browser goes away
+        stream = _chat_event_stream('Should I hold?', 'AAPL', '1mo', '1d')
+        for _ in range(3):
+            await stream.__anext__()
+        await stream.aclose()
+        for _ in range(100):
+            if self.server.abandoned_streams:
+                break
+            await asyncio.sleep(0.05)
+        self.assertEqual(self.server.abandoned_streams, 1)
+
+
+class MistralClientTests(FakeMistralMixin, SimpleTestCase):
+    """The async Mistral client's retries, concurrency limit and timeouts against a fake model server"""
+    server_options = {'first_token_delay': 0, 'token_delay': 0}
+    selection = ('AAPL', '1mo', '1d')
+
+    def mistral(self, **limits) -> mistral_ai.MistralAIClient:
+        client = mistral_ai.MistralAIClient()
+        client.limits = dict(client.limits, RETRY_BACKOFF=0.01, **limits)
+        return client
+
+    def test_cache_key_rounds_indicator_values(self):
+        client = self.mistral()
+        key = client._cache_key('Should I buy?', *self.selection, {'close': 187.23, 'rsi_14': 56.31})
+        self.assertEqual(key, client._cache_key('Should I buy?', *self.selection, {'close': 188.9, 'rsi_14': 55.7}))
+        self.assertNotEqual(key, client._cache_key('Should I buy?', *self.selection, {'close': 187.23, 'rsi_14': 71.0}))
+
+    async def test_rate_limited_call_is_retried(self):
+        self.server.status, self.server.error_count = 429, 2
+        answer = await self.mistral().aget_response('Should I buy?', *self.selection)
+        self.assertEqual(answer, ANSWER)
+        self.assertEqual(self.server.requests, 3)
+
+    async def test_retry_waits_for_retry_after(self):
+        self.server.status, self.server.error_count, self.server.retry_after = 429, 1, 0.3
+        started = time.perf_counter()
+        await self.mistral().aget_response('Should I buy?', *self.selection)
+        self.assertGreaterEqual(time.perf_counter() - started, 0.3)
+        self.assertEqual(self.server.requests, 2)
+
+    async def test_gives_up_after_max_retries(self):
+        self.server.status = 503
+        with self.assertRaises(SDKError):
+            await self.mistral(MAX_RETRIES=2).aget_response('Should I buy?', *self.selection)
+        self.assertEqual(self.server.requests, 3)
+
+    async def test_client_error_is_not_retried(self):
+        self.server.status = 400
+        with self.assertRaises(SDKError):
+            await self.mistral().aget_response('Should I buy?', *self.selection)
+        self.assertEqual(self.server.requests, 1)
+
+    async def test_concurrent_calls_are_capped(self):
+        self.server.first_token_delay = 0.1
+        client = self.mistral(MAX_CONCURRENCY=2, MAX_WAITING=10)
+        answers = await asyncio.gather(*(client.aget_response(f"Question {i}", *self.selection) for i in range(6)))
+        self.assertEqual(answers, [ANSWER] * 6)
+        self.assertEqual(self.server.max_in_flight, 2)
+        self.assertEqual(client.concurrency_stats()['admitted'], 6)
+
+    async def test_callers_beyond_the_queue_are_rejected(self):
+        self.server.first_token_delay = 0.2
+        client = self.mistral(MAX_CONCURRENCY=1, MAX_WAITING=1)
+        results = await asyncio.gather(*(client.aget_response(f"Question {i}", *self.selection) for i in range(4)),
+                                       return_exceptions=True)
+        self.assertEqual(results.count(ANSWER), 2)
+        self.assertEqual(sum(isinstance(result, LimiterFullError) for result in results), 2)
+        self.assertEqual(self.server.requests, 2)
+
+    async def test_slow_call_times_out(self):
+        self.server.first_token_delay = 0.5
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.mistral(TIMEOUT=0.1).aget_response('Should I buy?', *self.selection)
+
+
+class FetchSchedulerTests(SimpleTestCase):
+    """FetchScheduler's rate limit, priorities and backoff on throttling"""
+
+    def scheduler(self, **options) -> FetchScheduler:
+        options = dict({'rate': 1000, 'burst': 1000, 'max_concurrency': 2, 'backoff': 0.1, 'backoff_max': 0.1},
+                       **options)
+        return FetchScheduler(**options)
+
+    def test_throttled_call_backs_off_and_is_retried(self):
+        scheduler = self.scheduler()
+        attempts = []
+
+        def call():
+            attempts.append(time.monotonic())
+            if len(attempts) == 1:
+                raise ThrottledError("429 Too Many Requests")
+            return 'bars'
+
+        self.assertEqual(scheduler.run(call), 'bars')
+        self.assertEqual(len(attempts), 2)
+        self.assertGreaterEqual(attempts[1] - attempts[0], 0.05)
+        stats = scheduler.stats()
+        self.assertEqual((stats['throttled'], stats['retried'], stats['completed']), (1, 1, 1))
+        # Halved on the 429, then partly recovered by the successful retry
+        self.assertLess(stats['rate'], 1000)
+
+    def test_gives_up_after_max_retries(self):
+        scheduler = self.scheduler(max_retries=2, backoff=0.01, backoff_max=0.01)
+        attempts = []
+
+        def call():
+            attempts.append(1)
+            raise ThrottledError("429 Too Many Requests")
+
+        with self.assertRaises(ThrottledError):
+            scheduler.run(call)
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(scheduler.stats()['failed'], 1)
+
+    def test_interactive_calls_overtake_queued_batch_calls(self):
+        scheduler = self.scheduler(max_concurrency=1)
+        started = threading.Event()
+        release = threading.Event()
+        order = []
+
+        def blocker():
+            started.set()
+            release.wait(5)
+
+        scheduler.submit(blocker, Priority.BATCH)
+        started.wait(5)
+        futures = [scheduler.submit(lambda i=i: order.append(f"batch-{i}"), Priority.BATCH) for i in range(3)]
+        futures.append(scheduler.submit(lambda: order.append('refresh'), Priority.REFRESH))
+        futures.append(scheduler.submit(lambda: order.append('interactive'), Priority.INTERACTIVE))
+        release.set()
+        for future in futures:
+            future.result(5)
+        self.assertEqual(order, ['interactive', 'refresh', 'batch-0', 'batch-1', 'batch-2'])
+
+    def test_calls_start_at_the_configured_rate(self):
+        scheduler = self.scheduler(rate=20, burst=1)
+        started = time.monotonic()
+        for future in [scheduler.submit(lambda: None) for _ in range(11)]:
+            future.result(5)
+        # The first call takes the only token; the other ten wait 1/20 s each
+        self.assertGreaterEqual(time.monotonic() - started, 0.45)
+
+
+class ScheduledFetchTests(OfflineStockDataMixin, SimpleTestCase):
+    """StockData downloads through the fetch scheduler against a rate-limited upstream"""
+
+    def test_fetch_many_takes_one_token_per_ticker_and_retries_after_429(self):
+        self.yahoo.rate_limit = 5
+        self.scheduler.max_retries = 50
+        tickers = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'META', 'NVDA', 'TSLA', 'JPM', 'V', 'WMT']
+        result = StockData.fetch_many(tickers, '1mo', '1d')
+
+        self.assertEqual(result.errors, {})
+        self.assertEqual(sorted(result.data), sorted(tickers))
+        self.assertGreater(self.yahoo.throttled, 0)
+        stats = self.scheduler.stats()
+        self.assertEqual(stats['submitted'], len(tickers))
+        self.assertEqual(stats['completed'], len(tickers))
+        # Every upstream call took a token, and every 429 became a backoff and a retry
+        self.assertEqual(self.yahoo.calls, len(tickers) + self.yahoo.throttled)
+        self.assertEqual(stats['throttled'], self.yahoo.throttled)
+        self.assertEqual(stats['retried'], self.yahoo.throttled)
+
+    def test_single_ticker_rate_limit_becomes_a_retry(self):
+        self.yahoo.rate_limit = 0
+        self.scheduler.max_retries = 50
+        threading.Timer(0.3, setattr, (self.yahoo, 'rate_limit', None)).start()
+        df = StockData('AAPL', '1mo', '1d').get_historical_data()
+        self.assertFalse(df.empty)
+        self.assertGreater(self.scheduler.stats()['retried'], 0)
+
+
+@override_settings(STOCK_LIVE=dict(settings.STOCK_LIVE, SOURCE='benchmarks.fake_quotes.FakeQuotes', POLL_SECONDS=0.02,
+                                   QUEUE_SIZE=4, LINGER_SECONDS=0.05, HEARTBEAT_SECONDS=1))
+class LiveHubTests(SimpleTestCase):
+    """Live bar updates fanned out from one poller per symbol, fed by benchmarks.fake_quotes"""
+    POLL = 0.02
+
+    def hub(self) -> LiveHub:
+        return LiveHub(FakeQuotes(), poll_seconds=self.POLL, queue_size=4, linger_seconds=0.05, heartbeat_seconds=1)
+
+    @staticmethod
+    async def read_bars(stream, count: int) -> list:
+        """Read `count` bars events from a stream, then disconnect"""
+        bars = []
+        async for event in stream:
+            if event.startswith('event: bars'):
+                bars.append(parse_events(event)[0][1])
+                if len(bars) == count:
+                    break
+        await stream.aclose()
+        return bars
+
+    async def test_viewers_of_a_symbol_share_one_poller(self):
+        hub = self.hub()
+        viewers = [hub.stream('AAPL', '1m') for _ in range(50)] + [hub.stream('msft', '1m') for _ in range(5)]
+        reading = [asyncio.create_task(self.read_bars(stream, 5)) for stream in viewers]
+        await asyncio.sleep(self.POLL)
+        self.assertEqual(hub.stats()['pollers'], 2)
+        self.assertEqual(hub.stats()['subscribers'], 55)
+
+        received = await asyncio.gather(*reading)
+        self.assertTrue(all(len(bars) == 5 for bars in received))
+        # One fetch per poll for all 50 viewers of AAPL, not one per viewer
+        self.assertLessEqual(hub.source.fetches[('AAPL', '1m')], hub.polls)
+        self.assertLess(hub.source.fetches[('AAPL', '1m')], 50)
+        self.assertEqual(set(hub.source.fetches), {('AAPL', '1m'), ('MSFT', '1m')})
+
+    async def test_new_viewer_catches_up_from_since(self):
+        hub = self.hub()
+        first = (await self.read_bars(hub.stream('AAPL', '1m'), 1))[0]
+        self.assertEqual(len(first['t']), 1)
+
+        since = first['t'][0] - 2 * 60_000  # Two minute bars before the last one
+        catch_up = (await self.read_bars(hub.stream('AAPL', '1m', since), 1))[0]
+        self.assertEqual(catch_up['t'][0], since)
+        self.assertGreaterEqual(len(catch_up['t']), 3)
+
+    async def test_slow_viewer_is_asked_to_resync_without_holding_up_the_others(self):
+        hub = self.hub()
+        slow = hub.subscribe('AAPL', '1m')
+        fast = asyncio.create_task(self.read_bars(hub.stream('AAPL', '1m'), 10))
+        self.assertEqual(len(await fast), 10)
+
+        events = [event async for event in hub.events(slow)]
+        self.assertEqual(parse_events(events[-1]), [('resync', {'reason': 'lagged'})])
+        self.assertEqual(len(events), 2)  # The retry field, then only the resync
+        self.assertEqual(hub.resyncs, 1)
+        hub.unsubscribe(slow)
+
+    async def test_poller_stops_after_the_last_viewer_leaves(self):
+        hub = self.hub()
+        await asyncio.gather(*(self.read_bars(hub.stream('AAPL', '1m'), 2) for _ in range(3)))
+        self.assertEqual(hub.stats()['subscribers'], 0)
+
+        await asyncio.sleep(0.05 + self.POLL * 3)
+        self.assertEqual(hub.stats()['pollers'], 0)
+        fetches = hub.source.fetches[('AAPL', '1m')]
+        await asyncio.sleep(self.POLL * 3)
+        self.assertEqual(hub.source.fetches[('AAPL', '1m')], fetches)
+
+    async def test_view_streams_under_asgi(self):
+        response = await AsyncClient().get('/live/', {'ticker': 'aapl', 'interval': '1m'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        self.assertEqual(await stream.__anext__(), b'retry: 5000\n\n')
+        self.assertTrue((await stream.__anext__()).startswith(b'event: bars'))
+        await stream.aclose()
+
+    def test_view_is_unavailable_under_wsgi(self):
+        response = self.client.get('/live/', {'ticker': 'AAPL', 'interval': '1m'})
+        self.assertEqual(response.status_code, 501)
+        self.assertNotContains(self.client.get('/'), 'var liveUpdates = true')
+
+
+class CrossAssetAnalyticsTests(OfflineStockDataMixin, SimpleTestCase):
+    """Memoized cross-asset statistics and the errors reported with them"""
+
+    def setUp(self):
+        super().setUp()
+        download = yfinance_service.download_history
+
+        def downloader(ticker, period, interval):
+            if ticker == 'BOGUS':
+                raise StockDataError(f"yfinance could not download '{ticker}': not found")
+            return download(ticker, period, interval)
+
+        patcher = mock.patch.object(yfinance_service, 'download_history', downloader)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_errors_belong_to_the_request_not_the_memo(self):
+        analytics = CrossAssetAnalytics()
+        with_bogus = analytics.analyze(['AAPL', 'MSFT', 'BOGUS'], '1mo', '1d')
+        self.assertEqual(with_bogus.tickers, ['AAPL', 'MSFT'])
+        self.assertEqual(list(with_bogus.errors), ['BOGUS'])
+
+        without = analytics.analyze(['AAPL', 'MSFT'], '1mo', '1d')
+        self.assertEqual(without.errors, {})
+        self.assertEqual(analytics.cache_stats()['hits'], 1)  # The statistics themselves are reused
+        self.assertNotIn(b'BOGUS', without.payload()[0])
+        self.assertNotEqual(without.payload()[1], with_bogus.payload()[1])
+        self.assertIn(b'BOGUS', analytics.analyze(['AAPL', 'MSFT', 'BOGUS'], '1mo', '1d').payload()[0])
+        self.assertEqual(list(with_bogus.errors), ['BOGUS'])
+
+
+class SymbolValidationTests(OfflineStockDataMixin, SimpleTestCase):
+    """Unknown tickers against a full and a partial symbol directory"""
+
+    def use_directory(self, entries):
+        patcher = mock.patch.object(symbols, '_index', SymbolIndex(entries))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def full_directory(self):
+        # Every four-letter symbol from AAAA onwards, plus the tickers under test
+        letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+        filler = (a + b + c + d for a in letters for b in letters for c in letters for d in letters)
+        entries = [(symbol, f'{symbol} Corp') for symbol, _ in zip(filler, range(FULL_DIRECTORY_SYMBOLS))]
+        return entries + [('AAPL', 'Apple Inc.'), ('MSFT', 'Microsoft Corporation')]
+
+    def test_full_directory_rejects_unknown_tickers(self):
+        self.use_directory(self.full_directory())
+        self.assertTrue(symbols.get_symbol_index().is_full)
+        self.assertTrue(is_known_symbol('aapl'))
+        self.assertFalse(is_known_symbol('APPL'))
+        self.assertTrue(is_known_symbol('VOD.L'))  # Exchange suffixes are never listed
+
+        response = self.client.get('/analytics/', {'tickers': 'AAPL,APPL', 'period': '1mo', 'interval': '1d'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('APPL', response.content.decode())
+        self.assertEqual(self.yahoo.calls, 0)
+
+    @override_settings(STOCK_SYMBOLS={**settings.STOCK_SYMBOLS, 'REJECT_UNKNOWN': False})
+    def test_rejection_can_be_turned_off(self):
+        self.use_directory(self.full_directory())
+        self.assertTrue(is_known_symbol('APPL'))
+
+    def test_partial_directory_passes_unknown_tickers(self):
+        self.use_directory([('AAPL', 'Apple Inc.'), ('MSFT', 'Microsoft Corporation')])
+        with self.assertLogs('stock_app', 'WARNING'):
+            self.assertTrue(is_known_symbol('APPL'))
+
+        response = self.client.get('/analytics/', {'tickers': 'AAPL,APPL', 'period': '1mo', 'interval': '1d'})
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(self.yahoo.calls, 0)
+
+
+class ExportTests(OfflineStockDataMixin, SimpleTestCase):
+    """Streamed exports, their recorded size and resumed byte ranges"""
+    query = {'tickers': 'AAPL,MSFT', 'period': '1mo', 'interval': '1d'}
+
+    async def download(self, **headers):
+        response = await AsyncClient().get('/export/', self.query, headers=headers)
+        if response.streaming:
+            return response, b''.join([chunk async for chunk in response.streaming_content])
+        return response, response.content
+
+    async def test_length_is_only_sent_once_a_full_download_recorded_it(self):
+        first, body = await self.download()
+        self.assertEqual(first.status_code, 200)
+        self.assertFalse(first.has_header('Content-Length'))
+        self.assertTrue(body.startswith(b'ticker,timestamp,open,high,low,close,volume\n'))
+
+        second, again = await self.download()
+        self.assertEqual(again, body)
+        self.assertEqual(second['Content-Length'], str(len(body)))
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    async def test_range_is_ignored_until_the_size_is_known(self):
+        response, body = await self.download(Range='bytes=10-99')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Content-Range'))
+
+    async def test_ranges_match_the_full_body(self):
+        _, body = await self.download()
+        for header, expected in (('bytes=10-99', body[10:100]), ('bytes=-20', body[-20:]),
+                                 (f'bytes={len(body) - 5}-', body[-5:])):
+            response, part = await self.download(Range=header)
+            self.assertEqual(response.status_code, 206, header)
+            self.assertEqual(part, expected, header)
+            self.assertEqual(response['Content-Length'], str(len(expected)))
+        self.assertEqual(response['Content-Range'], f'bytes {len(body) - 5}-{len(body) - 1}/{len(body)}')
+
+    async def test_unsatisfiable_range(self):
+        _, body = await self.download()
+        response, _ = await self.download(Range=f'bytes={len(body)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(body)}')
+
+    async def test_if_range_mismatch_sends_everything(self):
+        first, body = await self.download()
+        response, again = await self.download(Range='bytes=10-99', If_Range='"an-older-export"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(again, body)
+
+        response, part = await self.download(Range='bytes=10-99', If_Range=first['ETag'])
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(part, body[10:100])
+
+    def test_plan_keeps_versions_not_frames(self):
+        plan = plan_export(['AAPL', 'MSFT'], '1mo', '1d')
+        self.assertEqual(plan.tickers, ['AAPL', 'MSFT'])
+        for ticker in plan.tickers:
+            df = StockData(ticker, '1mo', '1d').get_historical_data()
+            self.assertEqual(plan.versions[ticker], frame_cache.frame_version(df))
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 100))
+        self.assertEqual(parse_range('bytes=900-', 1000), (900, 1000))
+        self.assertEqual(parse_range('bytes=900-5000', 1000), (900, 1000))
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 1000))
+        self.assertEqual(parse_range('bytes=-5000', 1000), (0, 1000))
+        # Several ranges and other units may be answered with the whole representation
+        self.assertIsNone(parse_range('bytes=0-9,20-29', 1000))
+        self.assertIsNone(parse_range('items=0-9', 1000))
+        for header in ('bytes=-0', 'bytes=1000-', 'bytes=50-10', 'bytes=a-b'):
+            with self.assertRaises(ValueError, msg=header):
+                parse_range(header, 1000)
+
+
+class FrameCacheTests(SimpleTestCase):
+    """Frame encoding and the two cache tiers"""
+
+    def setUp(self):
+        super().setUp()
+        self.l2_dir = tempfile.mkdtemp(prefix='frame-cache-test-')
+        self.addCleanup(shutil.rmtree, self.l2_dir, ignore_errors=True)
+        index = pd.date_range('2024-01-02 14:30', periods=500, freq='min', tz='UTC', name='Datetime')
+        close = 100 + pd.Series(range(500), dtype=float).to_numpy() / 100
+        self.frame = pd.DataFrame({
+            'Open': close, 'High': close + 0.5, 'Low': close - 0.5, 'Close': close,
+            'Volume': pd.Series(range(500), dtype='int64').to_numpy() * 1000,
+            'Dividends': 0.0, 'Stock Splits': 0.0,
+        }, index=pd.DatetimeIndex(index.tz_convert('America/New_York').as_unit('ns'), freq=None))
+
+    def test_round_trip_narrows_floats_and_drops_sparse_columns(self):
+        payload = encode_frame(self.frame)
+        decoded = decode_frame(payload)
+        pd.testing.assert_frame_equal(decoded, self.frame, check_exact=False, atol=FLOAT32_TOLERANCE, rtol=0)
+        self.assertEqual(decoded.index.tz, self.frame.index.tz)
+        # float32 prices, narrowed volume and no sparse columns: well under the float64 size
+        self.assertLess(len(zlib.decompress(payload[1:])), self.frame.memory_usage(index=True).sum() / 2)
+
+        # float32 is not precise enough for a column of this magnitude, which stays float64
+        large = self.frame.assign(Close=self.frame['Close'] * 10_000 + 0.001)
+        pd.testing.assert_series_equal(decode_frame(encode_frame(large))['Close'], large['Close'], check_exact=True)
+
+    def test_frames_with_text_columns_are_not_pickled(self):
+        frame = pd.DataFrame({'Symbol': ['AAPL', 'MSFT'], 'Price': [1.5, 2.5]})
+        payload = encode_frame(frame)
+        self.assertNotIn(b'pickle', payload)
+        pd.testing.assert_frame_equal(decode_frame(payload), frame)
+
+        with self.assertRaises(ValueError):
+            decode_frame(b'P' + zlib.compress(b'legacy pickled frame'))
+
+    def test_unreadable_l2_files_are_misses(self):
+        TieredFrameCache(1 << 20, self.l2_dir, 1 << 30).set('AAPL', self.frame, time.time() + 60, 60)
+        (path,) = [os.path.join(self.l2_dir, name) for name in os.listdir(self.l2_dir)]
+        with open(path, 'rb') as fh:
+            blob = fh.read()
+        for truncated in (blob[:4], blob[:40]):
+            with open(path, 'wb') as fh:
+                fh.write(truncated)
+            with self.assertLogs('stock_app', 'WARNING'):
+                self.assertIsNone(TieredFrameCache(1 << 20, self.l2_dir, 1 << 30).get('AAPL'))
+
+    def test_l1_evicts_least_recently_used(self):
+        nbytes = int(self.frame.memory_usage(index=True, deep=True).sum())
+        frames = TieredFrameCache(nbytes * 2, None, 0)
+        for key in ('A', 'B'):
+            frames.set(key, self.frame, time.time() + 60, 60)
+        self.assertIsNotNone(frames.get('A'))  # B is now the least recently used
+        frames.set('C', self.frame, time.time() + 60, 60)
+        self.assertIsNone(frames.get('B'))
+        self.assertIsNotNone(frames.get('A'))
+        self.assertLessEqual(frames.stats()['l1_bytes'], nbytes * 2)
+
+    def test_l2_hits_are_promoted_to_l1(self):
+        writer = TieredFrameCache(1 << 20, self.l2_dir, 1 << 30)
+        stored = writer.set('AAPL', self.frame, time.time() + 60, 60)
+
+        reader = TieredFrameCache(1 << 20, self.l2_dir, 1 << 30)  # Another worker, with an empty L1
+        df, _ = reader.get('AAPL')
+        pd.testing.assert_frame_equal(df, stored)
+        self.assertIs(reader.get('AAPL')[0], df)
+        stats = reader.stats()
+        self.assertEqual((stats['l2_hits'], stats['l1_hits'], stats['l1_entries']), (1, 1, 1))
+
+
+class ChartDataTests(OfflineStockDataMixin, SimpleTestCase):
+    """Conditional requests for chart data"""
+    query = {'ticker': 'AAPL', 'period': '1mo', 'interval': '1d'}
+
+    async def test_matching_etag_is_not_modified(self):
+        client = AsyncClient()
+        response = await client.get('/chart_data/', self.query)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        again = await client.get('/chart_data/', self.query, headers={'If-None-Match': etag})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b'')
+        self.assertEqual(self.yahoo.calls, 1)
+
+    async def test_etag_follows_the_data(self):
+        client = AsyncClient()
+        etag = (await client.get('/chart_data/', self.query))['ETag']
+
+        stock = StockData('AAPL', '1mo', '1d')
+        df = stock.get_historical_data()
+        before = frame_cache.frame_version(df)
+        updated = stock._cache_write(df.assign(Close=df['Close'] * 1.01))
+        self.assertNotEqual(frame_cache.frame_version(updated), before)
+
+        response = await client.get('/chart_data/', self.query, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertTrue(json.loads(response.content))
+
+
+def reference_positions(close: np.ndarray, strategy: str, params: dict) -> list:
+    """Positions of one parameter combination, decided bar by bar"""
+    positions, held = [], 0.0
+    gain = loss = None
+    for t in range(len(close)):
+        if strategy == 'sma_crossover':
+            fast, slow = params['fast'], params['slow']
+            held = float(t + 1 >= slow and close[t - fast + 1:t + 1].mean() > close[t - slow + 1:t + 1].mean())
+        elif strategy == 'momentum':
+            held = float(t >= params['lookback'] and close[t] > close[t - params['lookback']])
+        elif strategy == 'rsi_reversion' and t > 0:
+            change = close[t] - close[t - 1]
+            if gain is None:
+                gain, loss = max(change, 0.0), max(-change, 0.0)
+            alpha = 1.0 / params['period']
+            gain = (1 - alpha) * gain + alpha * max(change, 0.0)
+            loss = (1 - alpha) * loss + alpha * max(-change, 0.0)
+            rsi = 100.0 if loss == 0 else 100.0 - 100.0 / (1.0 + gain / loss)
+            if rsi < params['lower']:
+                held = 1.0
+            elif rsi > params['upper']:
+                held = 0.0
+        elif strategy == 'buy_and_hold':
+            held = 1.0
+        positions.append(held)
+    return positions
+
+
+def reference_stats(close: np.ndarray, positions: list, periods_per_year: float, cost: float) -> dict:
+    """Statistics of one run, simulated bar by bar: a position earns the next bar's return"""
+    equity, peak, drawdown, trades, returns = 1.0, 1.0, 0.0, 0, []
+    for t in range(1, len(close)):
+        held, before = positions[t - 1], positions[t - 2] if t > 1 else 0.0
+        if held != before:
+            trades += 1
+        returns.append(held * (close[t] / close[t - 1] - 1) - abs(held - before) * cost)
+        equity *= 1 + returns[-1]
+        peak = max(peak, equity)
+        drawdown = max(drawdown, 1 - equity / peak)
+    std = np.std(returns, ddof=1)
+    return {
+        'total_return': equity - 1,
+        'volatility': std * periods_per_year ** 0.5,
+        'sharpe': np.mean(returns) / std * periods_per_year ** 0.5 if std > 0 else np.nan,
+        'max_drawdown': drawdown,
+        'trades': trades,
+        'exposure': np.mean(positions[:-1]),
+    }
+
+
+class BacktestTests(OfflineStockDataMixin, SimpleTestCase):
+    """Vectorized sweeps against a bar-by-bar reference, and sweep limits"""
+
+    def test_sweep_matches_reference_loop(self):
+        close = 100 * np.exp(np.cumsum(np.random.default_rng(7).normal(0, 0.02, 300)))
+        grids = {
+            'sma_crossover': {'fast': [5, 10, 20], 'slow': [30, 50]},
+            'momentum': {'lookback': [1, 10, 60]},
+            'rsi_reversion': {'period': [7, 14], 'lower': [30, 40], 'upper': [60, 70]},
+            'buy_and_hold': {},
+        }
+        for strategy, grid in grids.items():
+            combos = expand_grid(strategy, grid)
+            stats = sweep(close, strategy, combos, 252, 0.001)
+            for combo, row in zip(combos, stats):
+                got = dict(zip(STAT_NAMES, row))
+                expected = reference_stats(close, reference_positions(close, strategy, combo), 252, 0.001)
+                for name, value in expected.items():
+                    np.testing.assert_allclose(got[name], value, rtol=1e-9, atol=1e-12,
+                                               err_msg=f"{strategy} {combo} {name}")
+        self.assertEqual(set(grids), set(STRATEGIES))
+
+    @override_settings(STOCK_BACKTEST={**settings.STOCK_BACKTEST, 'MAX_COMBINATIONS': 10, 'WORKERS': 1})
+    def test_max_combinations_is_enforced_before_loading_data(self):
+        with self.assertRaisesMessage(BacktestError, 'at most 10'):
+            backtest_ticker('AAPL', '1y', '1d', 'sma_crossover', grid={'fast': [5, 10, 15], 'slow': [20, 30, 40, 50]})
+        response = self.client.get('/backtest/', {'ticker': 'AAPL', 'period': '1y', 'interval': '1d',
+                                                  'strategy': 'momentum', 'params': 'lookback=5:60:5'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.yahoo.calls, 0)
+
+        report = backtest_ticker('AAPL', '1y', '1d', 'sma_crossover', grid={'fast': [5, 10], 'slow': [20, 30, 40]})
+        self.assertEqual(report.combinations, 6)
+
+
+class BarStoreTests(OfflineStockDataMixin, SimpleTestCase):
+    """Stored daily bars and the tail fetches on top of them"""
+
+    def test_overlapping_tail_replaces_stored_bars(self):
+        store = bar_store.get_bar_store()
+        index = pd.date_range('2024-01-01', periods=10, freq='D', tz='America/New_York', name='Date').as_unit('ns')
+        stored = pd.DataFrame({'Close': np.arange(10, dtype=float), 'Volume': np.arange(10) * 100}, index=index)
+        store.write('AAPL', '1d', stored, covers_from=index[0])
+
+        # Overlaps the last three stored bars and repeats its own last bar
+        tail_index = pd.date_range('2024-01-08', periods=5, freq='D', tz='America/New_York', name='Date')
+        tail = pd.DataFrame({'Close': [70.5, 80.5, 90.5, 100.0, 110.0], 'Volume': [1, 2, 3, 4, 5]},
+                            index=tail_index.as_unit('ns'))
+        store.append('AAPL', '1d', pd.concat([tail, tail.iloc[-1:].assign(Close=111.0)]))
+
+        merged = store.read('AAPL', '1d')
+        self.assertTrue(merged.index.is_unique and merged.index.is_monotonic_increasing)
+        self.assertEqual(len(merged), 12)
+        self.assertEqual(merged['Close'].tolist(), list(range(7)) + [70.5, 80.5, 90.5, 100.0, 111.0])
+        self.assertEqual(merged['Volume'].dtype, stored['Volume'].dtype)
+        self.assertEqual(store.coverage('AAPL', '1d').rows, 12)
+
+    def test_reads_come_from_the_store(self):
+        with mock.patch.object(StockData, '_download', autospec=True, side_effect=StockData._download) as download:
+            first = StockData('AAPL', '1y', '1d').get_historical_data()
+            self.assertEqual(download.call_args.kwargs, {'period': '1y'})
+
+            again = StockData('AAPL', '1y', '1d').get_historical_data()
+            self.assertEqual(self.yahoo.calls, 1)  # A frame cache hit
+            pd.testing.assert_frame_equal(again, first)
+
+            # Another worker, or the entry expired: only the bars since the last stored one are downloaded
+            frame_cache._default_cache.clear()
+            shorter = StockData('AAPL', '6mo', '1d').get_historical_data()
+            self.assertEqual(self.yahoo.calls, 2)
+            self.assertEqual(list(download.call_args.kwargs), ['start'])
+            pd.testing.assert_frame_equal(shorter, first[first.index >= shorter.index[0]])
+
+
+class WarmupWorkerTests(SimpleTestCase):
+    """Background warmup in one server process per host"""
+
+    def test_one_process_holds_the_warmup_lock(self):
+        lock_path = os.path.join(tempfile.mkdtemp(prefix='warmup-test-'), 'var', 'warmup.lock')
+        self.addCleanup(shutil.rmtree, os.path.dirname(os.path.dirname(lock_path)), ignore_errors=True)
+        leader, standby = (WarmupWorker(every=30, refresh_within=60, lock_path=lock_path) for _ in range(2))
+
+        self.assertTrue(leader.acquire())
+        self.assertTrue(leader.acquire())
+        self.assertFalse(standby.acquire())
+
+        leader._lock_file.close()  # What the OS does when the leading process exits
+        self.assertTrue(standby.acquire())
+        standby._lock_file.close()
@@ -1,53 +1,99 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.middleware.gzip import re_accepts_gzip
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
 from django.views.decorators.csrf import csrf_protect
+from django.views.decorators.gzip import gzip_page
 from django.views.decorators.http import require_GET
-import plotly.express as px
-from .forms import StockForm
-from src.services.yfinance_service import StockData, StockDataError
-from .mistral_ai import MistralAIClient  # Import the utility class
+from functools import lru_cache
+from .forms import AnalyticsForm, BacktestForm, ExportForm, LiveForm, StockForm
+from src.services.chart_options import CHART_OVERLAYS, get_available_intervals
+from src.services.limiter import LimiterFullError
+from src.services.log_pipeline import sampled
+from src.services.metrics import registry as metrics_registry, timed
+from src.services.symbols import get_symbol_index, is_known_symbol
 import logging
 import asyncio
+import hashlib
+import json
+import threading
+
+# pandas, plotly, yfinance and the Mistral SDK take seconds to import, so the
+# views that need them import them on first use (see the function bodies),
+# and get_intervals never loads them at all. Imports after the first are a
+# dictionary lookup.
 
 logger = logging.getLogger('stock_app')
 
-# Initialize Mistral AI client
-mistral_client = MistralAIClient()
+# Chart points used when downsampling without a known chart width
+DEFAULT_CHART_POINTS = 1000
+
+# Series sent by chart_data, keyed by the name used in the JSON payload
+SERIES_COLUMNS = {'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'}
+
+# Results returned by symbol_search: default and maximum
+SYMBOL_SEARCH_LIMIT = 10
+SYMBOL_SEARCH_MAX_LIMIT = 50
+
+# Shown when the chat is over capacity or the model did not answer in time
+CHAT_BUSY_MESSAGE = 'The assistant is busy right now. Please try again in a moment.'
+CHAT_TIMEOUT_MESSAGE = 'The assistant took too long to answer. Please try again.'
+
+
+@lru_cache(maxsize=1)
+def plotly_js_url() -> str:
+    """plotly.js is loaded once by the page from the CDN instead of being inlined in every chart"""
+    from plotly.offline import get_plotlyjs_version
+    return f"https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"
+
+
+def live_updates_available(request) -> bool:
+    """
+    Whether /live/ can stream to this client: only when served by the ASGI
+    handler. Under WSGI (e.g. runserver) Django collects an async streaming
+    response into a list before sending any of it, so an endless stream
+    would hold a worker thread forever, and each request runs on its own
+    event loop, so viewers could not share a poller.
+    """
+    return isinstance(request, ASGIRequest)
 
 
-def stock_view(request):
+async def stock_view(request):
     """
     Handle the stock visualization form and generate Plotly graphs.
+    Data is loaded through the async StockData API, so a slow upstream
+    fetch does not hold a worker thread.
     """
     graph_html = None
     form = StockForm(request.POST or None)
 
     if request.method == 'POST' and form.is_valid():
+        from src.services.yfinance_service import StockData, StockDataError
+        from .charts import render_chart
+
         ticker = form.cleaned_data['ticker']
         period = form.cleaned_data['period']
         interval = form.cleaned_data['interval']
 
-        logger.info(f"Processing request for {ticker} with {period} period and {interval} interval")
+        logger.info("Processing request for %s with %s period and %s interval", ticker, period, interval)
 
         try:
             stock = StockData(ticker, period, interval)
-            df = stock.get_historical_data()
-
-            fig = px.line(
-                df,
-                x=df.index,
-                y='Close',
-                title=f'{ticker.upper()} Stock Price',
-                template='plotly_white'
-            )
+            df = await stock.aget_historical_data()
 
-            fig.update_layout(
-                xaxis_title='Date',
-                yaxis_title='Price (USD)',
-                hovermode='x unified'
-            )
+            points = None
+            if form.cleaned_data.get('downsample'):
+                # About one point per horizontal pixel of the chart
+                points = form.cleaned_data.get('chart_width') or DEFAULT_CHART_POINTS
+
+            overlays = form.cleaned_data.get('indicators') or ()
 
-            graph_html = fig.to_html(full_html=False, config={'displayModeBar': True})
+            # Figure construction is CPU-bound; keep it off the event loop
+            with timed('chart'):
+                graph_html = await asyncio.to_thread(render_chart, df, ticker, period, interval, points, overlays)
 
         except StockDataError as e:
             logger.error(f"Stock data error: {str(e)}")
@@ -60,13 +106,332 @@ def stock_view(request):
     context = {
         'form': form,
         'graph_html': graph_html,
+        'plotly_js_url': plotly_js_url(),
+        'live_updates': live_updates_available(request),
     }
 
-    return render(request, 'stock_app/stock.html', context)
+    with timed('template'):
+        return render(request, 'stock_app/stock.html', context)
+
+
+def _rounded_values(series) -> list:
+    """Round a series for JSON, mapping NaN to null"""
+    import numpy as np
+    values = np.round(series.to_numpy(dtype=float), 4)
+    return [None if np.isnan(v) else v for v in values.tolist()]
+
+
+def _series_payload(df, ticker: str, period: str, interval: str, overlays=()) -> bytes:
+    """
+    Serialize chart series as compact JSON: epoch-millisecond timestamps plus
+    OHLCV arrays, and the columns of any requested indicator overlays.
+    """
+    payload = {
+        'ticker': ticker,
+        'period': period,
+        'interval': interval,
+        't': df.index.values.astype('datetime64[ms]').view('int64').tolist(),
+    }
+    for key, column in SERIES_COLUMNS.items():
+        if column in df.columns:
+            payload[key] = _rounded_values(df[column])
+    if overlays:
+        payload['indicators'] = {
+            column: _rounded_values(df[column])
+            for overlay in overlays for column in CHART_OVERLAYS[overlay][1]
+        }
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+
+@require_GET
+@gzip_page
+async def chart_data(request):
+    """
+    Handle AJAX GET requests for the data behind a stock chart.
+    Expects 'ticker', 'period' and 'interval' in the query string, plus the
+    optional 'downsample', 'chart_width' and 'indicators'. The response carries a
+    content-based ETag, so a client holding the same data gets a 304.
+    """
+    form = StockForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'error': form.errors.get_json_data()}, status=400)
+
+    from src.services.downsample import downsample_frame
+    from src.services.indicators import default_engine as indicator_engine
+    from src.services.yfinance_service import StockData, StockDataError
+
+    ticker = form.cleaned_data['ticker']
+    period = form.cleaned_data['period']
+    interval = form.cleaned_data['interval']
+
+    try:
+        df = await StockData(ticker, period, interval).aget_historical_data()
+    except StockDataError as e:
+        logger.error(f"Stock data error: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=502)
+
+    overlays = form.cleaned_data.get('indicators') or ()
+    if overlays:
+        # Indicators are computed on the full series, then sampled with it
+        with timed('indicators'):
+            df = df.join(await asyncio.to_thread(indicator_engine.compute, ticker, interval, df))
+
+    with timed('serialize'):
+        if form.cleaned_data.get('downsample'):
+            points = form.cleaned_data.get('chart_width') or DEFAULT_CHART_POINTS
+            df = downsample_frame(df, 'Close', points)
+
+        body = _series_payload(df, ticker, period, interval, overlays)
+    etag = quote_etag(hashlib.sha1(body).hexdigest())
+
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    # Clients may keep the data but must revalidate it with the ETag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@require_GET
+async def analytics(request):
+    """
+    Handle AJAX GET requests for returns, volatility and the correlation
+    matrix across a set of tickers, for a heatmap.
+    Expects 'period' and 'interval', and optionally 'tickers' (comma-separated,
+    the watchlist by default) and a truthy 'covariance' to include the
+    annualized covariance matrix. Tickers without data are listed under
+    'errors'. The response carries a content-based ETag like chart_data, and
+    is compressed once per result rather than by gzip_page on every request.
+    """
+    form = AnalyticsForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'error': form.errors.get_json_data()}, status=400)
+
+    from src.services.analytics import default_analytics
+    from src.services.app_config import get_watchlist
+
+    tickers = form.cleaned_data['tickers'] or get_watchlist()
+    if not tickers:
+        return JsonResponse({'error': "No tickers given and no watchlist configured."}, status=400)
+    period = form.cleaned_data['period']
+    interval = form.cleaned_data['interval']
+
+    # Cache reads, alignment and the matrix products are CPU-bound; keep them off the event loop
+    stats = await asyncio.to_thread(default_analytics.analyze, tickers, period, interval)
+    if not stats.tickers:
+        return JsonResponse({'error': "No data available for the requested tickers.", 'errors': stats.errors},
+                            status=502)
+
+    covariance = form.cleaned_data['covariance']
+    with timed('serialize'):
+        body, digest = await asyncio.to_thread(stats.payload, covariance)
+    gzipped = re_accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    # Weak, as gzip_page would make it, so it matches either encoding of the same data
+    etag = 'W/' + quote_etag(digest)
+
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        patch_vary_headers(not_modified, ('Accept-Encoding',))
+        return not_modified
+
+    if gzipped:
+        with timed('serialize'):
+            body = await asyncio.to_thread(stats.gzipped_payload, covariance)
+    response = HttpResponse(body, content_type='application/json')
+    if gzipped:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 @require_GET
-def get_intervals(request):
+@gzip_page
+async def backtest(request):
+    """
+    Handle AJAX GET requests to backtest a strategy on a ticker, or sweep
+    its parameters. Expects 'ticker', 'period' and 'interval'; optionally
+    'strategy' (config.yaml `trading_strategy` by default), 'params' as
+    semicolon-separated name=values (a parameter with several values is
+    swept), a truthy 'sweep' to sweep the strategy's default grid, and
+    'top'. Returns the best results by Sharpe ratio, buy and hold, and
+    their equity curves.
+    """
+    form = BacktestForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'error': form.errors.get_json_data()}, status=400)
+
+    from src.services.backtest import BacktestError, backtest_ticker
+    from src.services.yfinance_service import StockDataError
+
+    params, grid = form.cleaned_data['params']
+    try:
+        # Simulation is CPU-bound and a sweep waits on the process pool; keep both off the event loop
+        with timed('backtest'):
+            report = await asyncio.to_thread(
+                backtest_ticker, form.cleaned_data['ticker'], form.cleaned_data['period'],
+                form.cleaned_data['interval'], strategy=form.cleaned_data['strategy'] or None,
+                params=params, grid=grid, sweep_defaults=form.cleaned_data['sweep'],
+                top=form.cleaned_data['top'] or 10,
+            )
+    except BacktestError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except StockDataError as e:
+        logger.error(f"Stock data error: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=502)
+    return JsonResponse(report.to_dict())
+
+
+class _ExportStream:
+    """
+    Relay the pieces of an export, each serialized on a worker thread so the
+    event loop is never blocked. An error cuts the download short, which the
+    client sees as incomplete and can resume. The export is closed when the
+    response is done (Django calls close()) or the client goes away (the
+    iteration is cancelled), on a thread of its own, as finishing it to
+    record its size for the resume may take a while.
+    """
+
+    def __init__(self, plan, start: int, end=None):
+        self.plan = plan
+        self._chunks = plan.chunks(start, end)
+        # A piece may still be serializing when the client goes away; close only after it
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _next(self):
+        with self._lock:
+            return next(self._chunks, None)
+
+    async def __aiter__(self):
+        from src.services.export import ExportError
+        from src.services.yfinance_service import StockDataError
+
+        try:
+            while True:
+                piece = await asyncio.to_thread(self._next)
+                if piece is None:
+                    return
+                if piece:
+                    yield piece
+        except (ExportError, StockDataError) as e:
+            logger.error(f"Export of {self.plan.filename} stopped: {e}")
+        finally:
+            self.close()
+
+    def _close(self):
+        with self._lock:
+            self._chunks.close()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        threading.Thread(target=self._close, name='export-close', daemon=True).start()
+
+
+@require_GET
+async def export_data(request):
+    """
+    Handle GET requests to download the bars of one or more tickers as CSV
+    or Parquet. Expects 'tickers' (comma-separated), 'period' and
+    'interval', and optionally 'format' ('csv' by default). The file is
+    streamed as it is serialized, so memory use does not grow with its
+    size. It carries a strong ETag of the underlying data and honours
+    single byte ranges with If-Range once the size of the export is known
+    (recorded by any earlier download of the same data, even one cut
+    short), so interrupted downloads resume.
+    Tickers without data are left out and named in X-Export-Skipped.
+    """
+    form = ExportForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'error': form.errors.get_json_data()}, status=400)
+
+    from src.services.export import FORMATS, ExportError, parse_range, plan_export
+
+    export_format = form.cleaned_data['format'] or 'csv'
+    try:
+        with timed('fetch'):
+            plan = await asyncio.to_thread(plan_export, form.cleaned_data['tickers'], form.cleaned_data['period'],
+                                           form.cleaned_data['interval'], export_format)
+    except ExportError as e:
+        return JsonResponse({'error': str(e)}, status=502)
+
+    etag = quote_etag(plan.etag)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    size = plan.known_size()
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    # A range is only valid for the representation the client already has part of. Until
+    # an export of this data has recorded its size the range is ignored and everything sent
+    if range_header and size is not None and (if_range is None or if_range == etag):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range is not None:
+        start, end = byte_range
+        response = StreamingHttpResponse(_ExportStream(plan, start, end), status=206,
+                                         content_type=FORMATS[export_format])
+        response['Content-Range'] = f'bytes {start}-{end - 1}/{size}'
+        response['Content-Length'] = str(end - start)
+    else:
+        # With a known size the length is promised, so the data must not change underneath
+        response = StreamingHttpResponse(_ExportStream(plan, 0, size), content_type=FORMATS[export_format])
+        if size is not None:
+            response['Content-Length'] = str(size)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Content-Disposition'] = f'attachment; filename="{plan.filename}"'
+    if plan.errors:
+        response['X-Export-Skipped'] = ','.join(sorted(plan.errors))
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@require_GET
+async def live_prices(request):
+    """
+    Stream new bars of a ticker and interval as server-sent events, so an
+    open chart stays current without resubmitting the form. Expects
+    'ticker' and 'interval', and optionally 'since', the epoch-millisecond
+    timestamp of the chart's last bar: bars from there on are sent first.
+    Events are 'bars' (chart_data arrays; a bar with the timestamp of the
+    chart's last one replaces it), 'error', and 'resync' when the client
+    fell behind and should reload the chart. All viewers of a pair share one
+    upstream poller, see src.services.live.LiveHub. Answers 501 when not
+    served by the ASGI handler; see live_updates_available().
+    """
+    if not live_updates_available(request):
+        return JsonResponse({'error': 'Live updates require the ASGI server.'}, status=501)
+
+    form = LiveForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'error': form.errors.get_json_data()}, status=400)
+
+    from src.services.live import get_live_hub
+
+    stream = get_live_hub().stream(form.cleaned_data['ticker'], form.cleaned_data['interval'],
+                                   form.cleaned_data['since'])
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Disable proxy buffering so events flush immediately
+    return response
+
+
+@require_GET
+async def get_intervals(request):
     """
     Handle AJAX GET requests to fetch available intervals based on the selected period.
     Expects a 'period' parameter in the query string.
@@ -78,9 +443,9 @@ def get_intervals(request):
     
     try:
         # Fetch intervals based on the period
-        intervals = StockData.get_available_intervals(period)  # This should return a list of interval strings
+        intervals = get_available_intervals(period)  # This should return a list of interval strings
         
-        logger.debug(f"Fetched intervals for period '{period}': {intervals}")
+        logger.debug("Fetched intervals for period '%s': %s", period, intervals, extra=sampled('intervals'))
         return JsonResponse({'intervals': intervals}, status=200)
     
     except Exception as e:
@@ -88,11 +453,88 @@ def get_intervals(request):
         return JsonResponse({'error': 'Failed to fetch intervals.'}, status=500)
 
 
+@require_GET
+def symbol_search(request):
+    """
+    Handle AJAX GET requests for ticker autocomplete.
+    Expects the typed text as 'q' and an optional 'limit'. Matches symbols
+    by prefix, then security names by word prefix, from the local symbol
+    directory; no upstream call is made.
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(int(request.GET.get('limit', SYMBOL_SEARCH_LIMIT)), SYMBOL_SEARCH_MAX_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': "Invalid 'limit' parameter."}, status=400)
+
+    results = [
+        {'symbol': symbol, 'name': name}
+        for symbol, name in get_symbol_index().search(query, limit)
+    ]
+    response = JsonResponse({'results': results})
+    # The directory only changes with a deploy or `manage.py update_symbols`
+    patch_cache_control(response, public=True, max_age=3600)
+    return response
+
+
+def _sse_event(data: dict, event: str = None) -> str:
+    """Format a server-sent event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+async def _indicator_summary(ticker: str, period: str, interval: str):
+    """
+    Return the latest indicator values for the chart selection, or None if
+    its data is not cached or cannot be read; the chat then answers without
+    them. Only the frame cache is read, which the chart the question is
+    about has just filled, so a chat message never waits on an upstream fetch.
+    """
+    from src.services.indicators import default_engine as indicator_engine
+    from src.services.yfinance_service import StockData
+
+    try:
+        df = await StockData(ticker, period, interval).aget_cached_data()
+        if df is None:
+            return None
+        with timed('indicators'):
+            return await asyncio.to_thread(indicator_engine.summary, ticker, interval, df)
+    except Exception as e:
+        logger.warning(f"No indicator summary for {ticker} ({period}/{interval}): {e}")
+        return None
+
+
+async def _chat_event_stream(user_message: str, ticker: str, period: str, interval: str, indicators=None):
+    """
+    Relay Mistral AI tokens as server-sent events. If the client disconnects
+    the ASGI handler cancels this generator, which closes the upstream stream.
+    """
+    from .mistral_ai import get_mistral_client
+
+    try:
+        async for token in get_mistral_client().stream_response(user_message, ticker, period, interval, indicators):
+            yield _sse_event({'token': token})
+        yield _sse_event({}, event='done')
+
+    except LimiterFullError:
+        yield _sse_event({'error': CHAT_BUSY_MESSAGE}, event='error')
+
+    except asyncio.TimeoutError:
+        yield _sse_event({'error': CHAT_TIMEOUT_MESSAGE}, event='error')
+
+    except Exception as e:
+        logger.error(f"Error in chat_with_ai stream: {e}")
+        yield _sse_event({'error': 'Failed to process your request.'}, event='error')
+
+
 @csrf_protect
 async def chat_with_ai(request):
     """
     Handle AJAX POST requests to chat with Mistral AI asynchronously.
     Expects 'message', 'ticker', 'period', and 'interval' in POST data.
+    With a truthy 'stream' field the response is streamed as server-sent
+    events carrying the tokens as they are generated. The latest indicator
+    values of the selected chart are passed to the model as context.
     """
     if request.method == 'POST':
         user_message = request.POST.get('message')
@@ -103,15 +545,52 @@ async def chat_with_ai(request):
         if not user_message or not selected_ticker or not period or not interval:
             return JsonResponse({'error': 'Invalid data provided.'}, status=400)
 
+        selected_ticker = selected_ticker.strip().upper()
+        if not is_known_symbol(selected_ticker):
+            return JsonResponse({'error': f"Unknown ticker symbol '{selected_ticker}'."}, status=400)
+
+        indicators = await _indicator_summary(selected_ticker, period, interval)
+
+        if request.POST.get('stream'):
+            response = StreamingHttpResponse(
+                _chat_event_stream(user_message, selected_ticker, period, interval, indicators),
+                content_type='text/event-stream'
+            )
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'  # Disable proxy buffering so tokens flush immediately
+            return response
+
         try:
-            # Use asyncio to run the synchronous get_response method in a thread
-            ai_response = await asyncio.to_thread(
-                mistral_client.get_response, user_message, selected_ticker, period, interval
+            # Native async call over the pooled client; no executor thread is held while waiting
+            from .mistral_ai import get_mistral_client
+            ai_response = await get_mistral_client().aget_response(
+                user_message, selected_ticker, period, interval, indicators
             )
             return JsonResponse({'response': ai_response})
 
+        except LimiterFullError:
+            response = JsonResponse({'error': CHAT_BUSY_MESSAGE}, status=503)
+            response['Retry-After'] = '1'
+            return response
+
+        except asyncio.TimeoutError:
+            return JsonResponse({'error': CHAT_TIMEOUT_MESSAGE}, status=504)
+
         except Exception as e:
             logger.error(f"Error in chat_with_ai view: {e}")
             return JsonResponse({'error': 'Failed to process your request.'}, status=500)
 
-    return JsonResponse({'error': 'Invalid request method.'}, status=405)
\ No newline at end of file
+    return JsonResponse({'error': 'Invalid request method.'}, status=405)
+
+
+@require_GET
+def metrics(request):
+    """
+    Serve request timings, upstream call metrics, cache hit ratios and
+    in-flight gauges of this process in the Prometheus text format.
+    Restricted to STOCK_METRICS['ALLOWED_IPS'] when that is set.
+    """
+    allowed = settings.STOCK_METRICS['ALLOWED_IPS']
+    if allowed and request.META.get('REMOTE_ADDR') not in allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')